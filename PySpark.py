@@ -1,11 +1,20 @@
-import re
-from pyspark.sql import SparkSession
+import re, argparse
+from pyspark.sql import SparkSession, DataFrame, Column
 from pyspark.sql.functions import *
+from pyspark.sql.types import StructType, StructField, StringType
 
-# spark-submit --packages com.databricks:spark-xml_2.12:0.15.0 --master local PySpark.py
+# spark-submit --packages com.databricks:spark-xml_2.12:0.15.0 --master local[*] --driver-memory 4g PySpark.py --dump enwiki-20230820-pages-articles-multistream.xml
+# The driver JVM is already running when the session is created, so its memory can only be set with spark-submit --driver-memory
 
 infobox_regex = r"\n\|(.*?)=(.*)"
-dump_file = "E:\\VINF_data\\enwiki-20230820-pages-articles-multistream.xml"
+
+# Only the title and the text of a page are parsed from the dump
+page_schema = StructType([
+	StructField("title", StringType()),
+	StructField("revision", StructType([
+		StructField("text", StructType([StructField("_VALUE", StringType())]))
+	]))
+])
 
 def load_gazetteer(path="src_code/gazetteer.txt") -> list[str]:
 	"""
@@ -31,6 +40,8 @@ def clean_text(data: list[str]) -> list[str]:
 
     This function takes a list of text strings and performs several cleaning operations. It strips whitespace, removes special characters and HTML tags, and replaces multiple spaces with a single space.
 
+    It is only used as the Python UDF baseline of the benchmark; the job itself runs `clean_column`.
+
     Parameters:
     data (list[str]): A list of strings to be cleaned.
 
@@ -46,39 +57,155 @@ def clean_text(data: list[str]) -> list[str]:
 		new_data.append(new_text)
 	return new_data
 
-def create_session() -> SparkSession:
+def clean_column(column: Column) -> Column:
+	"""
+    Cleans every string of an array column the same way as `clean_text`, with built-in functions that run in the JVM.
+
+    Parameters:
+    column (Column): An array of strings.
+
+    Returns:
+    Column: The array of cleaned strings.
+    """
+	return transform(column, lambda item: regexp_replace(
+		regexp_replace(
+			regexp_replace(regexp_replace(item, r"(?U)^\s+|\s+$", ""), r"[\[\]\{\}\=]|<.*?>", ""),
+			r"\|", " "),
+		r" +", " "))
+
+def create_session(master=None, config=None) -> SparkSession:
 	"""
     Creates and returns a new SparkSession.
 
-    This function initializes and returns a SparkSession with a specified application name. It is intended for use in a Spark application for processing large datasets.
+    This function initializes and returns a SparkSession with a specified application name. It is intended for use in a Spark application for processing large datasets. Repeated infobox keys keep their last value in the 'infobox' map, as they did in the dict index_wiki.py used to build.
+
+    Parameters:
+    master (str, optional): The master URL, e.g. 'local[*]' to use all cores. Defaults to None, which keeps the one given to spark-submit.
+    config (dict, optional): Further Spark properties, e.g. {'spark.executor.memory': '8g'}. Properties of the driver JVM such as 'spark.driver.memory' have no effect here and must be given to spark-submit. Defaults to None.
 
     Returns:
     SparkSession: A newly created SparkSession.
     """
-	spark_sess = SparkSession.builder.appName("regex_wiki").getOrCreate()
+	builder = SparkSession.builder.appName("regex_wiki").config("spark.sql.mapKeyDedupPolicy", "LAST_WIN")
+	if master is not None:
+		builder = builder.master(master)
+	for key, value in (config or {}).items():
+		builder = builder.config(key, value)
+	spark_sess = builder.getOrCreate()
 	return spark_sess
 
-# Load gazetteer and init spark
-gazetteer = load_gazetteer()
-spark = create_session()
-clean_data = udf(clean_text, ArrayType(StringType()))
+def read_dump(spark: SparkSession, path: str) -> DataFrame:
+	"""
+    Reads the title and text of the pages of a Wikipedia XML dump with spark-xml.
+
+    The explicit `page_schema` spares the schema inference pass over the dump and lets spark-xml skip all other elements of a page.
+
+    Parameters:
+    spark (SparkSession): The session.
+    path (str): The uncompressed XML dump.
+
+    Returns:
+    DataFrame: 'title' and 'text' of every page.
+    """
+	df = spark.read.format("com.databricks.spark.xml").options(rootTag="mediawiki", rowTag="page", encoding="ISO-8859-1").schema(page_schema).load(path)
+	return df.select("title", col("revision.text._VALUE").alias("text"))
+
+def gazetteer_frame(spark: SparkSession, gazetteer: list[str]) -> DataFrame:
+	"""
+    Creates a DataFrame of the gazetteer titles to join the pages with.
+
+    Parameters:
+    spark (SparkSession): The session.
+    gazetteer (list[str]): The titles.
 
-# Load XML file
-df = spark.read.format("com.databricks.spark.xml").options(rootTag="mediawiki", rowTag="page", encoding="ISO-8859-1").load(dump_file)
-df = df.filter(col("title").isin(gazetteer))
+    Returns:
+    DataFrame: One 'title' per row, without repetitions.
+    """
+	return spark.createDataFrame([(title,) for title in sorted(set(gazetteer))], "title string")
 
-# Extract infobox keys and values
-extracted_df = df.withColumns({"reg_key": regexp_extract_all('revision.text._VALUE', lit(infobox_regex), 1),
-							   "reg_value": regexp_extract_all('revision.text._VALUE', lit(infobox_regex), 2)})
+def extract_fields(df: DataFrame, gaz_df: DataFrame, partitions=None) -> DataFrame:
+	"""
+    Keeps the gazetteer pages and extracts the raw infobox keys and values of their text.
 
-# Filter results
-ne_df = extracted_df.filter(size(col("reg_key")) > 0)
-mod_df = ne_df.withColumns({"mod_key": clean_data(ne_df.reg_key),
-							"mod_val": clean_data(ne_df.reg_value)})
-final_data = mod_df.select("title", "mod_key", "mod_val")
+    The pages are filtered with a left semi join against the broadcast gazetteer, so the title list is not inlined into the plan, and the surviving pages are hash partitioned by title before the regex extraction to spread it over all cores.
 
-# Write results to file
-final_data.write.mode("overwrite").json("spark_output")
+    Parameters:
+    df (DataFrame): The 'title' and 'text' of the pages of the dump.
+    gaz_df (DataFrame): The titles to keep.
+    partitions (int, optional): Number of partitions of the gazetteer pages. Defaults to None, which uses spark.sql.shuffle.partitions.
 
-# End spark session
-spark.stop()
+    Returns:
+    DataFrame: 'title', 'reg_key' and 'reg_value' of the pages with at least one infobox field.
+    """
+	df = df.join(broadcast(gaz_df), "title", "left_semi")
+	df = df.repartition(partitions, "title") if partitions else df.repartition("title")
+	extracted_df = df.withColumns({"reg_key": regexp_extract_all("text", lit(infobox_regex), 1),
+								   "reg_value": regexp_extract_all("text", lit(infobox_regex), 2)})
+	return extracted_df.filter(size(col("reg_key")) > 0).select("title", "reg_key", "reg_value")
+
+def clean_fields(ne_df: DataFrame, native=True) -> DataFrame:
+	"""
+    Cleans the infobox keys and values and zips them into the 'infobox' map column in one projection.
+
+    Parameters:
+    ne_df (DataFrame): The result of `extract_fields`.
+    native (bool, optional): Whether to clean with built-in functions (`clean_column`) instead of the Python UDF (`clean_text`). Defaults to True.
+
+    Returns:
+    DataFrame: 'title' and 'infobox'.
+    """
+	if native:
+		keys, values = clean_column(col("reg_key")), clean_column(col("reg_value"))
+	else:
+		clean_data = udf(clean_text, ArrayType(StringType()))
+		keys, values = clean_data(col("reg_key")), clean_data(col("reg_value"))
+	return ne_df.select("title", map_from_arrays(keys, values).alias("infobox"))
+
+def write_output(final_data: DataFrame, parquet_path: str, json_path: str) -> None:
+	"""
+    Writes the infoboxes as Parquet partitioned by the first character of the title, and as the JSON lines index_wiki.py reads.
+
+    The JSON is written from the Parquet output, so the dump is only processed once.
+
+    Parameters:
+    final_data (DataFrame): 'title' and 'infobox'.
+    parquet_path (str): The Parquet output directory.
+    json_path (str): The JSON output directory.
+
+    Returns:
+    None: This function does not return anything.
+    """
+	initial = regexp_replace(upper(substring("title", 1, 1)), "[^A-Z0-9]", "_")
+	final_data.withColumn("initial", initial).write.mode("overwrite").partitionBy("initial").parquet(parquet_path)
+	final_data.sparkSession.read.parquet(parquet_path).select("title", "infobox").write.mode("overwrite").json(json_path)
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Extracts the infoboxes of the gazetteer pages from a Wikipedia XML dump.")
+	arg_parser.add_argument("--dump", required=True, help="the uncompressed pages-articles XML dump")
+	arg_parser.add_argument("--gazetteer", default="src_code/gazetteer.txt", help="file with the titles to extract")
+	arg_parser.add_argument("--output", default="spark_output", help="JSON output directory")
+	arg_parser.add_argument("--parquet", default="spark_output_parquet", help="Parquet output directory")
+	arg_parser.add_argument("--master", default=None, help="master URL, e.g. local[*] (default: the one given to spark-submit)")
+	arg_parser.add_argument("--executor-memory", default=None, help="memory per executor, e.g. 8g")
+	arg_parser.add_argument("--executor-cores", default=None, help="cores per executor")
+	arg_parser.add_argument("--partitions", type=int, default=None, help="number of partitions of the gazetteer pages (default: spark.sql.shuffle.partitions)")
+	args = arg_parser.parse_args()
+
+	config = {}
+	for key, value in (("spark.executor.memory", args.executor_memory), ("spark.executor.cores", args.executor_cores)):
+		if value is not None:
+			config[key] = value
+
+	# Load gazetteer and init spark
+	spark = create_session(args.master, config)
+	gaz_df = gazetteer_frame(spark, load_gazetteer(args.gazetteer))
+
+	# Load XML file, extract and clean infobox keys and values
+	final_data = clean_fields(extract_fields(read_dump(spark, args.dump), gaz_df, args.partitions))
+
+	# Write results to file
+	write_output(final_data, args.parquet, args.output)
+
+	# End spark session
+	spark.stop()
@@ -0,0 +1,75 @@
+import re, time, argparse
+from src_code.gazetteer_matcher import GazetteerMatcher, load_matcher
+from src_code.html_extract import parse_page
+from src_code.page_store import PageStore
+
+"""
+Throughput benchmark of entity tagging with the gazetteer matcher over the crawled pages in the page store.
+
+The 'before' numbers come from tagging with one compiled, case-insensitive whole-word regex per gazetteer name, the straightforward alternative; it is timed on the first `--baseline-limit` pages only, as it is orders of magnitude slower. Both variants see the same page text, already extracted in memory, so only tagging is timed. The time to build the automaton is compared with the time to load its pickle.
+
+Usage:
+python bench_gazetteer.py [--store store] [--gazetteer src_code/gazetteer.txt] [--limit 2000] [--baseline-limit 50] [--repeat 3]
+"""
+
+
+def load_texts(store_path: str, limit: int) -> list[str]:
+	"""
+	Loads the text of up to `limit` crawled pages.
+	"""
+	texts = []
+	for _, txt_file in PageStore(store_path):
+		if len(texts) == limit:
+			break
+		texts.append("".join(parse_page(txt_file).text))
+	return texts
+
+
+def regex_tagger(names: list[str]):
+	"""
+	Returns a function tagging a text with one regex per name.
+	"""
+	patterns = [(name, re.compile(r"(?<!\w)" + re.escape(name) + r"(?!\w)", re.IGNORECASE)) for name in names if name != ""]
+	def tag(text: str) -> list[str]:
+		return [name for name, pattern in patterns if pattern.search(text)]
+	return tag
+
+
+def run(name: str, tag, texts: list[str], repeat: int) -> None:
+	"""
+	Times `tag` over all texts and prints the best of `repeat` rounds.
+	"""
+	best = None
+	for _ in range(repeat):
+		num_entities = 0
+		start = time.perf_counter()
+		for text in texts:
+			num_entities += len(tag(text))
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	size = sum(len(text) for text in texts)
+	print(f"{name}: {len(texts)} pages, {num_entities} entities in {best:.3f} s -> {len(texts) / best:.1f} pages/s, {size / best / 1e6:.2f} M chars/s")
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Benchmarks gazetteer entity tagging over saved pages.")
+	arg_parser.add_argument("--store", default="store", help="directory of the page store")
+	arg_parser.add_argument("--gazetteer", default="src_code/gazetteer.txt", help="gazetteer file")
+	arg_parser.add_argument("--limit", type=int, default=2000, help="maximum number of pages to load")
+	arg_parser.add_argument("--baseline-limit", type=int, default=50, help="number of pages tagged with regexes")
+	arg_parser.add_argument("--repeat", type=int, default=3, help="number of timed rounds")
+	args = arg_parser.parse_args()
+
+	with open(args.gazetteer, "r", encoding="utf-8") as gaz_file:
+		names = [line.rstrip("\n") for line in gaz_file]
+	start = time.perf_counter()
+	matcher = GazetteerMatcher(names)
+	print(f"build: {len(matcher)} names, {len(matcher.goto)} states in {time.perf_counter() - start:.3f} s")
+	load_matcher(args.gazetteer)
+	start = time.perf_counter()
+	load_matcher(args.gazetteer)
+	print(f"load pickle: {time.perf_counter() - start:.3f} s")
+
+	texts = load_texts(args.store, args.limit)
+	run("before", regex_tagger(names), texts[:args.baseline_limit], 1)
+	run("after", matcher.find, texts, args.repeat)
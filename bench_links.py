@@ -0,0 +1,79 @@
+import re, time, argparse
+from link_extractor import LinkExtractor
+from src_code.page_store import PageStore
+
+"""
+Micro-benchmark of link extraction over the crawled pages in the page store.
+
+The 'before' numbers come from a copy of the regex code that `Crawler.run_crawler` used until the `LinkExtractor` replaced it: two uncompiled `re.findall` calls per page and a recompiled exclusion regex per link. Both variants see the same pages, already loaded in memory, so only extraction is timed.
+
+Usage:
+python bench_links.py [--store store] [--limit 2000] [--repeat 3]
+"""
+
+url_regex = r"(https):\/\/([\w_-]+(?:(?:\.[\w_-]+)+))([\w.,@?^=%&:\/~+#-]*[\w@?^=%&\/~+#-])"
+relative_url_regex = r"href=\"(/.*?)\""
+
+
+def legacy_extract(web_url: str, content: str) -> list[str]:
+	"""
+	Extracts links the way the crawler did before the `LinkExtractor`.
+
+	Parameters:
+	web_url (str): The URL of the page.
+	content (str): The page content.
+
+	Returns:
+	list[str]: The formatted links, with repetitions.
+	"""
+	links = []
+	for page_url in re.findall(relative_url_regex, content):
+		root = re.findall(r"(https://.*?)/", web_url)[0]
+		str_url = root + page_url
+		if not re.compile(r'\.png|\.jpg|\.jpeg|\.gif|\.svg|\.pdf|\.docx').search(str_url):
+			links.append(str_url)
+	for url_tuple in re.findall(url_regex, content):
+		str_url = url_tuple[0] + "://" + ''.join(url_tuple[1:])
+		if not re.compile(r'\.png|\.jpg|\.jpeg|\.gif|\.svg|\.pdf|\.docx').search(str_url):
+			links.append(str_url)
+	return links
+
+
+def load_pages(store_path: str, limit: int) -> list[tuple]:
+	"""
+	Loads up to `limit` crawled pages as (url, content) pairs.
+	"""
+	pages = []
+	for _, txt_file in PageStore(store_path):
+		if len(pages) == limit:
+			break
+		web_url, _, content = txt_file.partition("\n")
+		pages.append((web_url, content))
+	return pages
+
+
+def run(name: str, extract, pages: list[tuple], repeat: int) -> None:
+	"""
+	Times `extract` over all pages and prints the best of `repeat` rounds.
+	"""
+	best = None
+	for _ in range(repeat):
+		num_links = 0
+		start = time.perf_counter()
+		for web_url, content in pages:
+			num_links += len(extract(web_url, content))
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	print(f"{name}: {len(pages)} pages, {num_links} links in {best:.3f} s -> {len(pages) / best:.1f} pages/s, {num_links / best:.0f} links/s")
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Benchmarks link extraction over saved pages.")
+	arg_parser.add_argument("--store", default="store", help="directory of the page store")
+	arg_parser.add_argument("--limit", type=int, default=2000, help="maximum number of pages to load")
+	arg_parser.add_argument("--repeat", type=int, default=3, help="number of timed rounds")
+	args = arg_parser.parse_args()
+
+	pages = load_pages(args.store, args.limit)
+	run("before", legacy_extract, pages, args.repeat)
+	run("after", LinkExtractor().extract, pages, args.repeat)
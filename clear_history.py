@@ -1,35 +1,26 @@
-import json
+import os, sys
+from frontier import Frontier
 
 """
-Updates the list of scraped URLs and their hash mappings.
+Removes duplicate URLs from the crawl frontier.
 
-This code reads a JSON file containing lists of 'wikivoyage' and 'other' URLs. It converts these lists into dictionaries to remove duplicates and ensure uniqueness.
-Each URL is used as a key in the dictionary with the value set to True.
+This code deletes every repeated entry of the 'wikivoyage' and 'other' queues, keeping the first occurrence of each URL. If a legacy JSON snapshot is given as the second argument and the frontier is still empty, it is imported first.
 
-After processing, it updates the original dictionary with these unique lists and their corresponding hash mappings, then writes this updated dictionary back to a different JSON file.
-
-The code updates the JSON file with the deduplicated lists of URLs and their hash mappings.
+The deduplication is a single query per queue against the frontier database, so no copy of the queues is written.
 
 File operations:
-- Reads from 'history/link_queue – kópia.json'.
-- Writes to 'history/link_queue_cl.json'.
+- Updates 'history/frontier.db' (or the database given as the first argument).
+- Optionally reads a legacy 'link_queue.json' snapshot.
 
 Note:
-- The purpose of this code is to clean and update the list of scraped URLs for further processing.
+- The purpose of this code is to clean the list of scraped URLs for further processing.
 """
 
-scraped_urls = None
-
-with open("history/link_queue – kópia.json", "r", encoding="utf-8") as history_file:
-	scraped_urls = json.load(history_file)
-
-wikivoyage_hash = dict.fromkeys(scraped_urls["wikivoyage"], True)
-other_hash = dict.fromkeys(scraped_urls["other"], True)
+frontier = Frontier(sys.argv[1] if len(sys.argv) > 1 else "history/frontier.db")
 
-scraped_urls["wikivoyage"] = list(wikivoyage_hash)
-scraped_urls["other"] = list(other_hash)
-scraped_urls["wikivoyage_hash"] = wikivoyage_hash
-scraped_urls["other_hash"] = other_hash
+if len(sys.argv) > 2 and os.path.isfile(sys.argv[2]) and frontier.is_empty():
+	frontier.import_json(sys.argv[2])
 
-with open("history/link_queue_cl.json", "w", encoding="utf-8") as json_file:
-	json.dump(scraped_urls, json_file, ensure_ascii=False)
+print(f"Removed {frontier.dedup_queue()} duplicate entries")
+print(frontier.stats())
+frontier.close()
@@ -1,7 +1,12 @@
-import time, re, os, random, hashlib, json, threading
+import time, os, random, hashlib, threading, argparse, asyncio
+import http.client
 import urllib.request
 import urllib.parse
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from frontier import Frontier
+from link_extractor import LinkExtractor, quote_url
+from src_code.page_store import PageStore, page_key
 
 
 # Global vars
@@ -37,45 +42,159 @@ class CrawlerInterrupter(threading.Thread):
 			exit_program = True
 
 
+class HostConnectionPool():
+	"""
+	A thread-safe pool of keep-alive HTTP connections grouped by host.
+
+	Connections are handed out to fetch threads of the asynchronous crawler and returned to the pool after the response body has been read, so consecutive requests to the same host reuse one TCP/TLS connection instead of opening a new one per page.
+	"""
+
+	def __init__(self, timeout=5, max_idle=4):
+		"""
+		Initializes an empty connection pool.
+
+		Parameters:
+		timeout (int): Socket timeout in seconds for new connections. Default is 5, the same as the blocking crawler.
+		max_idle (int): Maximum number of idle connections kept per host. Default is 4.
+		"""
+		self.timeout = timeout
+		self.max_idle = max_idle
+		self.idle = {}
+		self.lock = threading.Lock()
+
+	def acquire(self, scheme: str, host: str) -> tuple:
+		"""
+		Returns an idle connection for the host or opens a new one.
+
+		Parameters:
+		scheme (str): URL scheme, either 'http' or 'https'.
+		host (str): Network location of the server (host[:port]).
+
+		Returns:
+		tuple: The connection object and a flag telling whether it was reused from the pool.
+		"""
+		with self.lock:
+			connections = self.idle.get((scheme, host))
+			if connections:
+				return connections.pop(), True
+		if scheme == "https":
+			return http.client.HTTPSConnection(host, timeout=self.timeout), False
+		return http.client.HTTPConnection(host, timeout=self.timeout), False
+
+	def release(self, scheme: str, host: str, connection) -> None:
+		"""
+		Returns a connection to the pool, closing it if the pool for the host is full.
+
+		Parameters:
+		scheme (str): URL scheme of the connection.
+		host (str): Network location the connection is bound to.
+		connection: The connection to give back.
+		"""
+		with self.lock:
+			connections = self.idle.setdefault((scheme, host), [])
+			if len(connections) < self.max_idle:
+				connections.append(connection)
+				return
+		connection.close()
+
+	def close(self) -> None:
+		"""
+		Closes all idle connections held by the pool.
+		"""
+		with self.lock:
+			for connections in self.idle.values():
+				for connection in connections:
+					connection.close()
+			self.idle = {}
+
+	def request(self, url: str, headers: dict, max_redirects=5) -> tuple:
+		"""
+		Performs a GET request on a pooled connection, following redirects.
+
+		A reused connection may have been closed by the server while idle; in that case the request is retried once on a fresh connection.
+
+		Parameters:
+		url (str): The absolute URL to fetch.
+		headers (dict): Request headers.
+		max_redirects (int): Maximum number of redirects to follow. Default is 5.
+
+		Returns:
+		tuple: The HTTP status code, the response headers (a case-insensitive `http.client.HTTPMessage`) and the response body as bytes.
+
+		Raises:
+		OSError, http.client.HTTPException: If the request fails.
+		"""
+		for _ in range(max_redirects + 1):
+			parts = urllib.parse.urlsplit(url)
+			path = parts.path or "/"
+			if parts.query:
+				path += "?" + parts.query
+			while True:
+				connection, reused = self.acquire(parts.scheme, parts.netloc)
+				try:
+					connection.request("GET", path, headers=headers)
+					response = connection.getresponse()
+					body = response.read()
+					break
+				except (OSError, http.client.HTTPException):
+					connection.close()
+					if not reused:
+						raise
+			if response.will_close:
+				connection.close()
+			else:
+				self.release(parts.scheme, parts.netloc, connection)
+			location = response.getheader("Location")
+			if response.status in (301, 302, 303, 307, 308) and location:
+				url = urllib.parse.urljoin(url, location)
+				continue
+			return response.status, response.msg, body
+		raise http.client.HTTPException(f"Too many redirects: {url}")
+
+
 class Crawler():
 	"""
     A web crawler class for scraping URLs from Wikivoyage.
 
-    This class is designed to crawl and scrape URLs, particularly from the Wikivoyage website. It initializes with various attributes including the base URL, request headers, regular expressions for URL matching, and structures to store scraped URLs.
+    This class is designed to crawl and scrape URLs, particularly from the Wikivoyage website. It initializes with various attributes including the base URL, request headers, a link extractor, and the crawl frontier.
     """
 
 	def __init__(self):
 		"""
         Initializes the Crawler object with predefined settings.
 
-        Sets up the crawler with a base URL for Wikivoyage, appropriate request headers for HTTP requests, regular expressions for URL matching, and initializes structures for storing scraped URLs. It also calls `check_history` to load any existing history of scraped URLs.
+        Sets up the crawler with a base URL for Wikivoyage, appropriate request headers for HTTP requests, a link extractor, and opens the crawl frontier. It also calls `check_history` to load any existing history of scraped URLs.
         """
 		self.base_url = "https://en.wikivoyage.org/wiki/"
 		self.req_headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
 		}
-		self.url_regex = r"(https):\/\/([\w_-]+(?:(?:\.[\w_-]+)+))([\w.,@?^=%&:\/~+#-]*[\w@?^=%&\/~+#-])"
-		self.relative_url_regex = r"href=\"(/.*?)\""
-		self.scraped_urls = {"wikivoyage": deque(), "wikivoyage_hash": {}, "other": deque(), "other_hash": {}, "visited": {}}
+		self.link_extractor = LinkExtractor()
+		self.page_store = PageStore("store", "a")
+		self.recrawl = False
+		self.manifest = None
+		self.delay_range = (1.0, 2.0)
+		self.checkpoint_every = 100
+		self.pages_since_checkpoint = 0
+		self.frontier = Frontier()
 		self.check_history()
 
 	def check_history(self, file_name="history/link_queue.json") -> None:
 		"""
-        Checks and loads the history of scraped URLs from a JSON file.
+		Prepares the frontier for a new or resumed crawl.
 
-        If the history file specified by `file_name` exists, this method loads its content into the `scraped_urls` attribute. If the file does not exist, it initiates the loading of countries (presumably to start a fresh scraping process).
+		If the frontier database already holds a crawl, it is resumed as is. Otherwise the legacy JSON snapshot specified by `file_name` is imported into it if it exists, and if it does not, the queue is seeded with the list of countries to start a fresh scraping process.
 
-        Parameters:
-        file_name (str): The path to the history file. Default is 'history/link_queue.json'.
+		Parameters:
+		file_name (str): The path to the legacy history file. Default is 'history/link_queue.json'.
 
-        Returns:
-        None: This method updates the `scraped_urls` attribute of the class and does not return any value.
-        """
+		Returns:
+		None: This method updates the `frontier` attribute of the class and does not return any value.
+		"""
+		if not self.frontier.is_empty():
+			return
 		if os.path.isfile(file_name):
-			with open(file_name, "r", encoding="utf-8") as history_file:
-				self.scraped_urls = json.load(history_file)
-				self.scraped_urls["wikivoyage"] = deque(self.scraped_urls["wikivoyage"])
-				self.scraped_urls["other"] = deque(self.scraped_urls["other"])
+			self.frontier.import_json(file_name)
 		else:
 			self.load_countries()
 
@@ -83,134 +202,205 @@ class Crawler():
 		"""
 		Loads country names from a file and appends their URLs to the scraping queue.
 
-		This method reads a file containing country names, each on a new line, and appends a URL for each country to the 'wikivoyage' queue in the `scraped_urls` attribute. It also marks each URL as visited in the 'wikivoyage_hash'.
+		This method reads a file containing country names, each on a new line, and appends a URL for each country to the 'wikivoyage' queue of the frontier.
 
 		Parameters:
 		file_name (str): The name of the file containing country names. Default is "countries.txt".
 
 		Returns:
-		None: This method updates the `scraped_urls` attribute of the class and does not return any value.
+		None: This method updates the `frontier` attribute of the class and does not return any value.
 		"""
 		with open(file_name, "r", encoding="utf-8") as countries_file:
 			for line in countries_file:
-				self.scraped_urls["wikivoyage"].append(self.base_url + line.strip())
-				self.scraped_urls["wikivoyage_hash"][self.base_url + line.strip()] = True
+				self.add_url(self.base_url + line.strip())
+		self.frontier.checkpoint()
 
-	def url_format(self, url_tuple: tuple) -> str:
+	def get_url(self, kinds=("wikivoyage", "other")) -> str:
 		"""
-		Formats a tuple representing a URL into a string and excludes certain file types.
+		Retrieves the next URL to be scraped from the frontier.
 
-		This method converts a tuple representation of a URL into a string. It also filters out URLs that point to specific file types (e.g., images, PDFs).
+		This method pops the next URL from either the 'wikivoyage' or 'other' URL queue of the frontier, marking it as visited. It prioritizes 'wikivoyage' URLs over 'other' URLs. If no URLs are left in the queue, it returns an empty string.
 
 		Parameters:
-		url_tuple (tuple): A tuple representing the parts of a URL.
+		kinds (tuple): The queues to take the URL from, in order of priority. Default is ("wikivoyage", "other").
 
 		Returns:
-		str: A formatted URL string. Returns an empty string if the URL points to an excluded file type.
+		str: The next URL to scrape, or an empty string if no URLs are left in the queue.
 		"""
-		new_url = url_tuple[1:]
-		str_url = ''.join(new_url)
-		str_url = (url_tuple[0] + "://" + str_url)
-		regexp = re.compile(r'\.png|\.jpg|\.jpeg|\.gif|\.svg|\.pdf|\.docx')
-		if regexp.search(str_url):
-			return ""
-		return str_url
+		for kind in kinds:
+			url2scrape = self.frontier.pop(kind)
+			if url2scrape != "":
+				return url2scrape
+		return ""
 
-	def rel_url_format(self, root_url: str, url: str) -> str:
+	def add_url(self, url: str) -> None:
 		"""
-		Formats a relative URL into a full URL and excludes certain file types.
+		Adds a new URL to the scraping queue if it hasn't been visited or queued before.
 
-		This method combines a root URL and a relative URL to form a full URL. It also filters out URLs that point to specific file types (e.g., images, PDFs).
+		The frontier records the URL in its seen-set, so the same link found on many pages is queued only once. New URLs go to the appropriate queue ('wikivoyage' or 'other').
 
 		Parameters:
-		root_url (str): The root URL to which the relative URL will be appended.
-		url (str): The relative URL to be appended to the root URL.
+		url (str): The URL to be added to the scraping queue.
 
 		Returns:
-		str: A formatted full URL. Returns an empty string if the URL points to an excluded file type.
+		None: This method does not return any value.
 		"""
-		root = re.findall(r"(https://.*?)/", root_url)[0]
-		str_url = (root + url)
-		regexp = re.compile(r'\.png|\.jpg|\.jpeg|\.gif|\.svg|\.pdf|\.docx')
-		if regexp.search(str_url):
-			return ""
-		return str_url
+		if url.find("wikivoyage.org") != -1:
+			self.frontier.add("wikivoyage", url)
+		else:
+			self.frontier.add("other", url)
 
-	def get_url(self) -> str:
+	def save_state(self) -> None:
 		"""
-		Retrieves the next URL to be scraped from the stored URLs queue.
+		Writes a checkpoint of the frontier to disk and prints the queue and seen-set sizes.
 
-		This method pops the next URL from either the 'wikivoyage' or 'other' URL queue in `scraped_urls`, marking it as visited. It prioritizes 'wikivoyage' URLs over 'other' URLs. If no URLs are left in the queue, it returns an empty string.
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.frontier.checkpoint()
+		self.pages_since_checkpoint = 0
+		print(self.frontier.stats())
+
+	def page_done(self) -> None:
+		"""
+		Counts a processed page and writes a checkpoint every `checkpoint_every` pages, so a crash loses at most that many pages of progress.
 
 		Returns:
-		str: The next URL to scrape, or an empty string if no URLs are left in the queue.
+		None: This method does not return any value.
 		"""
-		if len(self.scraped_urls["wikivoyage"]) != 0:
-			url2scrape = self.scraped_urls["wikivoyage"].popleft()
-			try:
-				del self.scraped_urls["wikivoyage_hash"][url2scrape]
-			except:
-				pass
-			self.scraped_urls["visited"][url2scrape] = True
-			return url2scrape
-		elif len(self.scraped_urls["other"]) != 0:
-			url2scrape = self.scraped_urls["other"].popleft()
-			try:
-				del self.scraped_urls["other_hash"][url2scrape]
-			except:
-				pass
-			self.scraped_urls["visited"][url2scrape] = True
-			return url2scrape
-		else:
-			return ""
+		self.pages_since_checkpoint += 1
+		if self.pages_since_checkpoint >= self.checkpoint_every:
+			self.save_state()
 
-	def add_url(self, url: str) -> None:
+	def start_recrawl(self, manifest_file="history/changed_pages.tsv") -> None:
 		"""
-		Adds a new URL to the scraping queue if it hasn't been visited or queued before.
+		Switches the crawler to recrawl mode and queues every stored Wikivoyage page for a refresh.
+
+		In recrawl mode pages are requested conditionally with the `ETag` and `Last-Modified` validators recorded by earlier crawls. A page that answers 304 Not Modified, or whose content digest did not change, is neither written to the page store again nor searched for links. Every page that is written is appended to the changed-pages manifest as `key<TAB>url`, so the indexer can update only those documents (`build_index.py --changed`).
 
-		This method checks if the URL is already marked as visited or is in the queue. If not, it adds the URL to the appropriate queue ('wikivoyage' or 'other') in `scraped_urls`.
+		The queue is seeded with the URLs of the page store as they were stored, already quoted; `quote_url` leaves them unchanged, so the pages are fetched and stored under the same URL and key again.
+
+		The queue is seeded only once; if a previous recrawl was interrupted, it is resumed instead.
 
 		Parameters:
-		url (str): The URL to be added to the scraping queue.
+		manifest_file (str): The path of the changed-pages manifest. Default is 'history/changed_pages.tsv'.
 
 		Returns:
 		None: This method does not return any value.
 		"""
-		if self.scraped_urls["visited"].get(url) is True:
-			return
-		if self.scraped_urls["wikivoyage_hash"].get(url) is True:
-			return
-		if self.scraped_urls["other_hash"].get(url) is True:
+		self.recrawl = True
+		self.manifest = open(manifest_file, "a", encoding="utf-8")
+		if self.frontier.get_setting("recrawl") is None:
+			for web_url in self.page_store.urls.values():
+				if web_url.find("wikivoyage.org") != -1:
+					self.frontier.push("wikivoyage", web_url)
+			self.frontier.set_setting("recrawl", "1")
+			self.save_state()
+
+	def finish_recrawl(self) -> None:
+		"""
+		Closes the manifest and, if the queue was fully processed, marks the recrawl as finished.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		if not self.recrawl:
 			return
-		if url.find("wikivoyage.org") != -1:
-			self.scraped_urls["wikivoyage"].append(url)
-		else:
-			self.scraped_urls["other"].append(url)
+		if self.frontier.stats()["wikivoyage"] == 0:
+			self.frontier.set_setting("recrawl", None)
+			self.save_state()
+		self.manifest.close()
 
-	def save_state(self, file_name="history/link_queue.json") -> None:
+	def request_headers(self, web_url: str) -> dict:
 		"""
-		Saves the current state of scraped URLs to a JSON file.
+		Returns the request headers for a URL, with conditional headers in recrawl mode.
+
+		Parameters:
+		web_url (str): The quoted URL to fetch.
 
-		This method writes the current state of `scraped_urls` to a specified JSON file. It converts the URL deques to lists before saving to ensure JSON compatibility.
+		Returns:
+		dict: The request headers.
+		"""
+		if not self.recrawl:
+			return self.req_headers
+		headers = dict(self.req_headers)
+		meta = self.frontier.get_meta(web_url)
+		if meta is not None:
+			if meta[0] is not None:
+				headers["If-None-Match"] = meta[0]
+			if meta[1] is not None:
+				headers["If-Modified-Since"] = meta[1]
+		return headers
+
+	def process_page(self, web_url: str, headers, content: str) -> None:
+		"""
+		Handles a successfully fetched page: records its validators, stores it and queues its links.
+
+		In recrawl mode a page whose content digest equals the recorded one is skipped, and stored pages are listed in the changed-pages manifest.
+
+		Parameters:
+		web_url (str): The quoted URL the page was fetched from.
+		headers: The response headers.
+		content (str): The decoded page content.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+		meta = self.frontier.get_meta(web_url)
+		self.frontier.set_meta(web_url, headers.get("ETag"), headers.get("Last-Modified"), digest)
+		if self.recrawl:
+			if meta is not None and meta[2] == digest and page_key(web_url) in self.page_store:
+				self.page_done()
+				return
+			self.manifest.write(f"{page_key(web_url)}\t{web_url}\n")
+		self.save_page(web_url, content)
+		self.extract_links(web_url, content)
+		self.page_done()
+
+	def get_delay(self) -> float:
+		"""
+		Returns a random politeness delay in seconds from `delay_range`.
+
+		Returns:
+		float: The number of seconds to wait before the next request to the same host.
+		"""
+		return random.uniform(*self.delay_range)
+
+	def save_page(self, web_url: str, content: str) -> None:
+		"""
+		Appends a fetched page to the page store, keyed by the MD5 of the URL.
 
 		Parameters:
-		file_name (str): The file path where the state should be saved. Default is "history/link_queue.json".
+		web_url (str): The quoted URL the page was fetched from.
+		content (str): The decoded page content.
 
 		Returns:
 		None: This method does not return any value.
 		"""
-		with open(file_name, "w", encoding='utf-8') as json_file:
-			self.scraped_urls["wikivoyage"] = list(self.scraped_urls["wikivoyage"])
-			self.scraped_urls["other"] = list(self.scraped_urls["other"])
-			json.dump(self.scraped_urls, json_file, ensure_ascii=False)
+		self.page_store.write(web_url, content)
+
+	def extract_links(self, web_url: str, content: str) -> None:
+		"""
+		Finds the links of a page with the `LinkExtractor` and adds them to the scraping queue.
+
+		Parameters:
+		web_url (str): The URL of the page, used to resolve relative links.
+		content (str): The page content.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		for page_url in self.link_extractor.extract(web_url, content):
+			self.add_url(page_url)
 
 	def run_crawler(self) -> None:
 		"""
 		Runs the web crawler in a loop until instructed to exit.
 
-		This method repeatedly retrieves URLs from the scraping queue and processes each URL. For each URL, it performs a web request, extracts the content, and saves it to a file. It also extracts and formats new URLs found in the content and adds them to the scraping queue. The crawler runs in a loop and can be stopped by setting the global `exit_program` flag to True.
+		This method repeatedly retrieves URLs from the scraping queue and processes each URL. For each URL, it performs a web request, extracts the content, and saves it to the page store. It also extracts and formats new URLs found in the content and adds them to the scraping queue. The crawler runs in a loop and can be stopped by setting the global `exit_program` flag to True.
 
-		The method ensures that URLs are properly formatted and handles any exceptions during the web request. It imposes a random delay between requests to avoid overloading the server. Upon exiting the loop, either due to the `exit_program` flag being set or the queue being empty, it saves the crawler's current state.
+		The method ensures that URLs are properly formatted and handles any exceptions during the web request. It imposes a random delay between requests to avoid overloading the server. The frontier is checkpointed every `checkpoint_every` pages and upon exiting the loop, either due to the `exit_program` flag being set or the queue being empty.
 
 		Note:
 		- The crawler respects the robots.txt file of websites and follows ethical scraping practices.
@@ -227,36 +417,143 @@ class Crawler():
 			web_url = self.get_url()
 			if web_url == "":
 				break
-			web_url = urllib.parse.quote(web_url, "<>=/:!")
+			web_url = quote_url(web_url)
 			try:
-				time.sleep(float("1." + str(random.randrange(0, 100))))
-				req = urllib.request.Request(web_url, headers=self.req_headers)
-				content = urllib.request.urlopen(req, timeout=5).read().decode('utf-8')
+				time.sleep(self.get_delay())
+				req = urllib.request.Request(web_url, headers=self.request_headers(web_url))
+				response = urllib.request.urlopen(req, timeout=5)
+				content = response.read().decode('utf-8')
 			except:
+				# Errors and 304 Not Modified responses of a recrawl end up here
 				continue
-			output_file = f"data/{hashlib.md5(web_url.encode('utf-8')).hexdigest()}.txt"
-			with open(output_file, "w", encoding="utf-8") as file:
-				file.write(web_url + '\n')
-				file.write(content)
-			urls = re.findall(self.url_regex, content)
-			relative_urls = re.findall(self.relative_url_regex, content)
-			for page_url in relative_urls:
-				formatted_url = self.rel_url_format(web_url, page_url)
-				if len(formatted_url) != 0:
-					self.add_url(formatted_url)
-			for page_url in urls:
-				formatted_url = self.url_format(page_url)
-				if len(formatted_url) != 0:
-					self.add_url(formatted_url)
+			self.process_page(web_url, response.headers, content)
+		self.save_state()
+
+	def run_async_crawler(self, concurrency=16, per_host_limit=1) -> None:
+		"""
+		Runs the crawler with many requests in flight at once.
+
+		Unlike `run_crawler`, the politeness delay is applied per host rather than globally, so pages from different hosts in the 'other' queue are fetched concurrently while each host still sees at most `per_host_limit` parallel requests spaced by `get_delay` seconds. Requests go through a `HostConnectionPool`, so keep-alive connections are reused. Pages are written to the same page store as in the blocking mode.
+
+		Parameters:
+		concurrency (int): Maximum number of requests in flight across all hosts. Default is 16.
+		per_host_limit (int): Maximum number of parallel requests to a single host. Default is 1.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		asyncio.run(self.crawl_async(concurrency, per_host_limit))
+
+	async def crawl_async(self, concurrency: int, per_host_limit: int) -> None:
+		"""
+		The event loop of `run_async_crawler`.
+
+		URLs are taken from the 'wikivoyage' queue first, as in `get_url`. A URL whose host is already at its limit is parked in a per-host backlog, and once the backlog of a queue holds `concurrency` URLs the 'other' queue is consulted, so a busy host never blocks requests to idle ones. Blocking socket work runs in a thread pool; the queues are only touched from the event loop thread.
+
+		URLs popped from the frontier are marked visited, so when the crawler stops with URLs parked in the backlog or requests in flight, these are put back into their queues with `Frontier.requeue` before the checkpoint, and a resumed crawl fetches them.
+
+		Parameters:
+		concurrency (int): Maximum number of requests in flight across all hosts.
+		per_host_limit (int): Maximum number of parallel requests to a single host.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		global exit_program
+		loop = asyncio.get_running_loop()
+		pool = HostConnectionPool()
+		executor = ThreadPoolExecutor(max_workers=concurrency)
+		active = {}
+		next_slot = {}
+		backlog = {}
+		waiting = {"wikivoyage": 0, "other": 0}
+		in_flight = {}
+
+		async def fetch(web_url: str, host: str) -> tuple:
+			now = loop.time()
+			start = max(now, next_slot.get(host, now))
+			next_slot[host] = start + self.get_delay()
+			await asyncio.sleep(start - now)
+			status, headers, body = await loop.run_in_executor(executor, pool.request, web_url, self.request_headers(web_url))
+			if status < 200 or status >= 300:
+				raise http.client.HTTPException(f"HTTP {status}")
+			return headers, body.decode('utf-8')
+
+		def start(kind: str, url: str, web_url: str, host: str) -> None:
+			active[host] = active.get(host, 0) + 1
+			in_flight[asyncio.ensure_future(fetch(web_url, host))] = (kind, url, web_url, host)
+
+		def fill() -> None:
+			for host in list(backlog):
+				while backlog[host] and active.get(host, 0) < per_host_limit and len(in_flight) < concurrency:
+					kind, url, web_url = backlog[host].popleft()
+					waiting[kind] -= 1
+					start(kind, url, web_url, host)
+				if not backlog[host]:
+					del backlog[host]
+			for kind in ("wikivoyage", "other"):
+				while len(in_flight) < concurrency and waiting[kind] < concurrency:
+					url = self.get_url((kind,))
+					if url == "":
+						break
+					web_url = quote_url(url)
+					host = urllib.parse.urlsplit(web_url).netloc
+					if active.get(host, 0) < per_host_limit:
+						start(kind, url, web_url, host)
+					else:
+						backlog.setdefault(host, deque()).append((kind, url, web_url))
+						waiting[kind] += 1
+
+		try:
+			while not exit_program:
+				fill()
+				if len(in_flight) == 0:
+					break
+				done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+				for task in done:
+					_, _, web_url, host = in_flight.pop(task)
+					active[host] -= 1
+					try:
+						headers, content = task.result()
+					except:
+						continue
+					self.process_page(web_url, headers, content)
+		finally:
+			for task in in_flight:
+				task.cancel()
+			executor.shutdown(wait=True)
+			pool.close()
+			# Put back the URLs that were popped but not fetched, so a resumed crawl does not lose them
+			for kind, url, _, _ in in_flight.values():
+				self.frontier.requeue(kind, url)
+			for entries in backlog.values():
+				for kind, url, _ in entries:
+					self.frontier.requeue(kind, url)
 		self.save_state()
 
 
-print("Running...")
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Crawls Wikivoyage pages into the page store.")
+	arg_parser.add_argument("--async", dest="use_async", action="store_true", help="fetch many pages concurrently with a per-host politeness delay")
+	arg_parser.add_argument("--concurrency", type=int, default=16, help="maximum number of requests in flight (async mode)")
+	arg_parser.add_argument("--per-host", type=int, default=1, help="maximum number of parallel requests to one host (async mode)")
+	arg_parser.add_argument("--recrawl", action="store_true", help="refresh stored Wikivoyage pages with conditional requests and write history/changed_pages.tsv")
+	args = arg_parser.parse_args()
+
+	print("Running...")
 
-crawler_interrupter = CrawlerInterrupter(daemon=True)
-crawler_interrupter.start()
+	crawler_interrupter = CrawlerInterrupter(daemon=True)
+	crawler_interrupter.start()
 
-crawler = Crawler()
-crawler.run_crawler()
+	crawler = Crawler()
+	if args.recrawl:
+		crawler.start_recrawl()
+	if args.use_async:
+		crawler.run_async_crawler(args.concurrency, args.per_host)
+	else:
+		crawler.run_crawler()
+	crawler.finish_recrawl()
+	crawler.frontier.close()
+	crawler.page_store.close()
 
-print("Done!")
+	print("Done!")
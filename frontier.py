@@ -0,0 +1,443 @@
+import os, json, math, sqlite3, hashlib
+
+
+def fingerprint(url: str) -> int:
+	"""
+	Computes a 64-bit fingerprint of a URL.
+
+	The fingerprint is stored instead of the URL string in the seen-set. With 64 bits the chance of two different URLs colliding stays around one in a million even at tens of millions of URLs.
+
+	Parameters:
+	url (str): The URL to fingerprint.
+
+	Returns:
+	int: A signed 64-bit integer, so it fits an SQLite INTEGER column.
+	"""
+	return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class ScalableBloomFilter():
+	"""
+	A scalable Bloom filter over 64-bit fingerprints.
+
+	The filter is a list of plain Bloom filters. When the newest one reaches its capacity a new one, twice as large and with half the error rate, is appended, so the overall false positive rate stays below `error_rate` however many items are added. Bit positions are derived from the fingerprint by double hashing. Memory use is about 1.2 bytes per item at the default 1 % error rate.
+	"""
+
+	def __init__(self, initial_capacity=1 << 20, error_rate=0.01):
+		"""
+		Creates an empty filter.
+
+		Parameters:
+		initial_capacity (int): Number of items the first filter holds. Default is 2^20.
+		error_rate (float): Upper bound of the false positive rate. Default is 0.01.
+		"""
+		self.initial_capacity = initial_capacity
+		self.error_rate = error_rate
+		self.filters = []
+		self.count = 0
+
+	def add_filter(self) -> None:
+		"""
+		Appends a new, larger filter that receives all further items.
+		"""
+		level = len(self.filters)
+		capacity = self.initial_capacity << level
+		level_error = self.error_rate * (0.5 ** (level + 1))
+		num_bits = math.ceil(-capacity * math.log(level_error) / (math.log(2) ** 2))
+		num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+		self.filters.append({"capacity": capacity, "count": 0, "num_bits": num_bits, "num_hashes": num_hashes, "bits": bytearray((num_bits + 7) // 8)})
+
+	@staticmethod
+	def positions(fp: int, bloom: dict):
+		"""
+		Yields the bit positions of a fingerprint in one filter.
+		"""
+		h1 = fp & 0xFFFFFFFF
+		h2 = ((fp >> 32) & 0xFFFFFFFF) | 1
+		for i in range(bloom["num_hashes"]):
+			yield (h1 + i * h2) % bloom["num_bits"]
+
+	def add(self, fp: int) -> None:
+		"""
+		Adds a fingerprint to the filter.
+
+		Parameters:
+		fp (int): The fingerprint.
+		"""
+		if len(self.filters) == 0 or self.filters[-1]["count"] >= self.filters[-1]["capacity"]:
+			self.add_filter()
+		bloom = self.filters[-1]
+		bits = bloom["bits"]
+		for pos in self.positions(fp, bloom):
+			bits[pos >> 3] |= 1 << (pos & 7)
+		bloom["count"] += 1
+		self.count += 1
+
+	def __contains__(self, fp: int) -> bool:
+		"""
+		Tells whether a fingerprint may have been added. False is always correct, True may be a false positive.
+		"""
+		for bloom in self.filters:
+			bits = bloom["bits"]
+			if all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(fp, bloom)):
+				return True
+		return False
+
+	def size_bytes(self) -> int:
+		"""
+		Returns the memory used by the bit arrays in bytes.
+		"""
+		return sum(len(bloom["bits"]) for bloom in self.filters)
+
+
+class Frontier():
+	"""
+	A persistent crawl frontier backed by an SQLite database.
+
+	The frontier replaces the `scraped_urls` dictionary that used to be dumped to `history/link_queue.json` on exit. Both URL queues and the seen-set live on disk, so only the current page's links are held in memory, the crawler can write incremental checkpoints while it runs and a restart only has to open the database instead of parsing one large JSON file.
+
+	Every URL that was ever queued is recorded in the seen-set by its 64-bit `fingerprint`, so no URL is queued twice. Lookups first consult an in-memory `ScalableBloomFilter` and only go to the database when the filter reports a possible hit, which makes the common case of a new URL free of disk reads.
+
+	Tables:
+	- wikivoyage, other: FIFO queues of URLs, ordered by an autoincrement sequence number.
+	- seen: fingerprints of all queued or visited URLs, with a flag for visited ones.
+	- bloom: the Bloom filter saved by `close`, together with the size of the seen-set it covers.
+	- page_meta: `ETag`, `Last-Modified` and a content digest of every fetched page, used by recrawls.
+	- settings: small key/value flags such as an unfinished recrawl.
+	"""
+
+	queues = ("wikivoyage", "other")
+
+	def __init__(self, path="history/frontier.db"):
+		"""
+		Opens (or creates) the frontier database.
+
+		The database runs in WAL mode, so a crash can only lose the work done since the last `checkpoint` and never corrupts the stored frontier.
+
+		Parameters:
+		path (str): The path of the database file. Default is 'history/frontier.db'.
+		"""
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self.path = path
+		self.db = sqlite3.connect(path)
+		self.db.execute("PRAGMA journal_mode=WAL")
+		self.db.execute("PRAGMA synchronous=NORMAL")
+		for kind in self.queues:
+			self.db.execute(f"CREATE TABLE IF NOT EXISTS {kind} (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL)")
+		self.db.execute("CREATE TABLE IF NOT EXISTS seen (fp INTEGER PRIMARY KEY, visited INTEGER NOT NULL DEFAULT 0)")
+		self.db.execute("CREATE TABLE IF NOT EXISTS bloom (level INTEGER PRIMARY KEY, seen_count INTEGER, capacity INTEGER, count INTEGER, num_bits INTEGER, num_hashes INTEGER, bits BLOB)")
+		self.db.execute("CREATE TABLE IF NOT EXISTS page_meta (fp INTEGER PRIMARY KEY, etag TEXT, last_modified TEXT, digest TEXT)")
+		self.db.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)")
+		self.migrate_url_tables()
+		self.db.commit()
+		self.sizes = {kind: self.db.execute(f"SELECT COUNT(*) FROM {kind}").fetchone()[0] for kind in self.queues}
+		self.sizes["seen"] = self.db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+		self.sizes["visited"] = self.db.execute("SELECT COUNT(*) FROM seen WHERE visited = 1").fetchone()[0]
+		self.load_bloom()
+
+	def migrate_url_tables(self) -> None:
+		"""
+		Converts the `queued` and `visited` URL tables of older frontier databases into fingerprints.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		tables = [row[0] for row in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('queued', 'visited')")]
+		for table in tables:
+			rows = self.db.execute(f"SELECT url FROM {table}")
+			self.db.executemany("INSERT OR IGNORE INTO seen (fp) VALUES (?)", ((fingerprint(row[0]),) for row in rows))
+			if table == "visited":
+				rows = self.db.execute("SELECT url FROM visited")
+				self.db.executemany("UPDATE seen SET visited = 1 WHERE fp = ?", ((fingerprint(row[0]),) for row in rows))
+			self.db.execute(f"DROP TABLE {table}")
+
+	def load_bloom(self) -> None:
+		"""
+		Restores the Bloom filter saved by `close`, or rebuilds it from the seen-set if the saved one is missing or stale (e.g. after a crash).
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.bloom = ScalableBloomFilter()
+		rows = self.db.execute("SELECT seen_count, capacity, count, num_bits, num_hashes, bits FROM bloom ORDER BY level").fetchall()
+		if len(rows) != 0 and rows[0][0] == self.sizes["seen"]:
+			for _, capacity, count, num_bits, num_hashes, bits in rows:
+				self.bloom.filters.append({"capacity": capacity, "count": count, "num_bits": num_bits, "num_hashes": num_hashes, "bits": bytearray(bits)})
+				self.bloom.count += count
+			return
+		for row in self.db.execute("SELECT fp FROM seen"):
+			self.bloom.add(row[0])
+
+	def save_bloom(self) -> None:
+		"""
+		Stores the Bloom filter in the database, stamped with the current size of the seen-set.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.db.execute("DELETE FROM bloom")
+		self.db.executemany("INSERT INTO bloom VALUES (?, ?, ?, ?, ?, ?, ?)", ((level, self.sizes["seen"], bloom["capacity"], bloom["count"], bloom["num_bits"], bloom["num_hashes"], bytes(bloom["bits"])) for level, bloom in enumerate(self.bloom.filters)))
+
+	def is_empty(self) -> bool:
+		"""
+		Tells whether the frontier has never seen a URL, i.e. the crawl has not started yet.
+
+		Returns:
+		bool: True if the database is empty.
+		"""
+		return self.sizes["seen"] == 0
+
+	def contains(self, url: str) -> bool:
+		"""
+		Checks if a URL is already queued or visited.
+
+		Parameters:
+		url (str): The URL to look up.
+
+		Returns:
+		bool: True if the URL is known to the frontier.
+		"""
+		return self.contains_fp(fingerprint(url))
+
+	def contains_fp(self, fp: int) -> bool:
+		"""
+		Checks if a fingerprint is in the seen-set. The database is only queried when the Bloom filter reports a possible hit.
+
+		Parameters:
+		fp (int): The URL fingerprint.
+
+		Returns:
+		bool: True if the fingerprint is in the seen-set.
+		"""
+		if fp not in self.bloom:
+			return False
+		return self.db.execute("SELECT 1 FROM seen WHERE fp = ?", (fp,)).fetchone() is not None
+
+	def add(self, kind: str, url: str) -> bool:
+		"""
+		Queues a URL unless it has been seen before.
+
+		Parameters:
+		kind (str): The queue name, 'wikivoyage' or 'other'.
+		url (str): The URL to enqueue.
+
+		Returns:
+		bool: True if the URL was queued, False if it was already seen.
+		"""
+		fp = fingerprint(url)
+		if self.contains_fp(fp):
+			return False
+		self.db.execute("INSERT INTO seen (fp) VALUES (?)", (fp,))
+		self.bloom.add(fp)
+		self.sizes["seen"] += 1
+		self.push(kind, url)
+		return True
+
+	def push(self, kind: str, url: str) -> None:
+		"""
+		Appends a URL to the end of a queue without checking the seen-set. Use `add` for newly found links.
+
+		Parameters:
+		kind (str): The queue name, 'wikivoyage' or 'other'.
+		url (str): The URL to enqueue.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.db.execute(f"INSERT INTO {kind} (url) VALUES (?)", (url,))
+		self.sizes[kind] += 1
+
+	def pop(self, kind: str) -> str:
+		"""
+		Removes and returns the URL at the front of a queue and marks it as visited.
+
+		Parameters:
+		kind (str): The queue name, 'wikivoyage' or 'other'.
+
+		Returns:
+		str: The URL, or an empty string if the queue is empty.
+		"""
+		row = self.db.execute(f"SELECT seq, url FROM {kind} ORDER BY seq LIMIT 1").fetchone()
+		if row is None:
+			return ""
+		self.drop(kind, row[0], row[1])
+		self.mark_visited(row[1])
+		return row[1]
+
+	def requeue(self, kind: str, url: str) -> None:
+		"""
+		Puts a popped URL that was not fetched back at the end of a queue and clears its visited flag, e.g. when the crawler stops with requests in flight.
+
+		Parameters:
+		kind (str): The queue name, 'wikivoyage' or 'other'.
+		url (str): The URL as returned by `pop`.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.push(kind, url)
+		cursor = self.db.execute("UPDATE seen SET visited = 0 WHERE fp = ? AND visited = 1", (fingerprint(url),))
+		self.sizes["visited"] -= cursor.rowcount
+
+	def drop(self, kind: str, seq: int, url: str) -> None:
+		"""
+		Removes one entry from a queue without visiting it. The URL stays in the seen-set.
+
+		Parameters:
+		kind (str): The queue name, 'wikivoyage' or 'other'.
+		seq (int): The sequence number of the entry, as returned by `iter_queue`.
+		url (str): The URL of the entry.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		cursor = self.db.execute(f"DELETE FROM {kind} WHERE seq = ?", (seq,))
+		self.sizes[kind] -= cursor.rowcount
+
+	def mark_visited(self, url: str) -> None:
+		"""
+		Flags a URL as visited in the seen-set, adding it if necessary.
+
+		Parameters:
+		url (str): The visited URL.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		fp = fingerprint(url)
+		if not self.contains_fp(fp):
+			self.db.execute("INSERT INTO seen (fp) VALUES (?)", (fp,))
+			self.bloom.add(fp)
+			self.sizes["seen"] += 1
+		cursor = self.db.execute("UPDATE seen SET visited = 1 WHERE fp = ? AND visited = 0", (fp,))
+		self.sizes["visited"] += cursor.rowcount
+
+	def iter_queue(self, kind: str, batch_size=10000):
+		"""
+		Iterates over the entries of a queue in order, reading them from disk in batches.
+
+		The queue may be modified (e.g. with `drop`) while it is being iterated.
+
+		Parameters:
+		kind (str): The queue name, 'wikivoyage' or 'other'.
+		batch_size (int): Number of rows fetched per query. Default is 10000.
+
+		Yields:
+		tuple: The sequence number and the URL of each entry.
+		"""
+		last_seq = -1
+		while True:
+			rows = self.db.execute(f"SELECT seq, url FROM {kind} WHERE seq > ? ORDER BY seq LIMIT ?", (last_seq, batch_size)).fetchall()
+			if len(rows) == 0:
+				return
+			yield from rows
+			last_seq = rows[-1][0]
+
+	def dedup_queue(self) -> int:
+		"""
+		Removes repeated URLs from both queues, keeping the first occurrence of each.
+
+		Returns:
+		int: The number of removed entries.
+		"""
+		removed = 0
+		for kind in self.queues:
+			cursor = self.db.execute(f"DELETE FROM {kind} WHERE seq NOT IN (SELECT MIN(seq) FROM {kind} GROUP BY url)")
+			removed += cursor.rowcount
+			self.sizes[kind] -= cursor.rowcount
+		return removed
+
+	def import_json(self, file_name: str) -> None:
+		"""
+		Loads a legacy `link_queue.json` snapshot into the frontier.
+
+		Parameters:
+		file_name (str): The path of the JSON file written by the old `Crawler.save_state`.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		with open(file_name, "r", encoding="utf-8") as history_file:
+			scraped_urls = json.load(history_file)
+		for url in scraped_urls["visited"]:
+			self.mark_visited(url)
+		for kind in self.queues:
+			for url in scraped_urls[kind]:
+				self.add(kind, url)
+		self.checkpoint()
+
+	def get_meta(self, url: str) -> tuple:
+		"""
+		Returns the validators recorded for a fetched page.
+
+		Parameters:
+		url (str): The URL the page was fetched from.
+
+		Returns:
+		tuple: The ETag, the Last-Modified header and the content digest (any of them may be None), or None if the page was never fetched.
+		"""
+		return self.db.execute("SELECT etag, last_modified, digest FROM page_meta WHERE fp = ?", (fingerprint(url),)).fetchone()
+
+	def set_meta(self, url: str, etag: str, last_modified: str, digest: str) -> None:
+		"""
+		Records the validators of a fetched page.
+
+		Parameters:
+		url (str): The URL the page was fetched from.
+		etag (str): The ETag response header, or None.
+		last_modified (str): The Last-Modified response header, or None.
+		digest (str): The hex digest of the page content.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.db.execute("INSERT OR REPLACE INTO page_meta (fp, etag, last_modified, digest) VALUES (?, ?, ?, ?)", (fingerprint(url), etag, last_modified, digest))
+
+	def get_setting(self, name: str) -> str:
+		"""
+		Returns a stored flag, or None if it is not set.
+		"""
+		row = self.db.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+		return None if row is None else row[0]
+
+	def set_setting(self, name: str, value: str) -> None:
+		"""
+		Stores a flag; None removes it.
+		"""
+		if value is None:
+			self.db.execute("DELETE FROM settings WHERE name = ?", (name,))
+		else:
+			self.db.execute("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (name, value))
+
+	def stats(self) -> dict:
+		"""
+		Returns the sizes of the queues and of the seen-set, and the memory used by the Bloom filter.
+
+		The sizes are kept as counters, so calling this method does not scan the database.
+
+		Returns:
+		dict: The number of queued URLs per queue, of seen and of visited URLs, the number of Bloom filter levels and their size in bytes.
+		"""
+		return dict(self.sizes, bloom_levels=len(self.bloom.filters), bloom_bytes=self.bloom.size_bytes())
+
+	def checkpoint(self) -> None:
+		"""
+		Commits all changes made since the previous checkpoint to disk.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.db.commit()
+
+	def close(self) -> None:
+		"""
+		Saves the Bloom filter, commits pending changes and closes the database.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		self.save_bloom()
+		self.db.commit()
+		self.db.close()
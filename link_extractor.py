@@ -0,0 +1,192 @@
+import re, posixpath
+import urllib.parse
+from functools import lru_cache
+
+
+def quote_url(url: str) -> str:
+	"""
+	Returns the URL the crawler fetches and stores a canonical URL under.
+
+	Only the path and the query are quoted. Characters that cannot appear in a request, such as spaces and non-ASCII letters, are percent-encoded. '%' is kept, so the escapes of the canonical form (e.g. `%2F`) are not encoded again and quoting an already quoted URL returns it unchanged. The query keeps its '?', '&' and '='. For paths without escapes and URLs without a query, the result is the same as the `urllib.parse.quote(url, "<>=/:!")` older crawls stored pages under, so their page keys do not change.
+
+	Parameters:
+	url (str): A canonical URL from the frontier, or a URL of the page store.
+
+	Returns:
+	str: The quoted URL.
+	"""
+	parts = urllib.parse.urlsplit(url)
+	quoted = parts.scheme + "://" + parts.netloc + urllib.parse.quote(parts.path, "<>=/:!%")
+	if parts.query != "":
+		quoted += "?" + urllib.parse.quote(parts.query, "<>=/:!%&?;+,@$'()*~")
+	return quoted
+
+
+class LinkExtractor():
+	"""
+	Extracts, resolves and canonicalizes the links of a crawled page.
+
+	All patterns and rule sets are compiled once when the extractor is created. A page is scanned with a single regex pass that yields the `href` attribute of every `<a>`, `<area>`, `<link>` and `<base>` tag; a `<base href>` changes the URL that following relative links are resolved against, as in a browser.
+
+	Canonical form of a link:
+	- The scheme and host are lowercased and the default port is removed.
+	- The fragment is stripped.
+	- The path is kept percent-decoded, because the crawler encodes it exactly once (`quote_url`) before fetching and hashing it. Only `%2F`, `%25`, `%3F` and `%23` stay encoded, as decoding them would turn them into a path separator, an escape, a query or a fragment. The query gets uppercase escapes and decoded unreserved characters.
+	- A '%' that does not start an escape is encoded as `%25`.
+
+	Links are dropped if they are not http(s), point to an excluded file type or host, or carry a query parameter that only selects a variant of a page (`action=edit`, `oldid`, ...).
+
+	Every page of a wiki repeats the same navigation links, so links that do not depend on the page path (absolute URLs and paths starting with '/') are resolved through an LRU cache keyed by the origin of the page.
+	"""
+
+	href_regex = re.compile(r"""<(a|area|link|base)\b[^>]*?\shref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+	escape_regex = re.compile(r"%([0-9A-Fa-f]{2})")
+	kept_escape_regex = re.compile(r"%(2[Ff]|25|3[Ff]|23)")
+	bare_percent_regex = re.compile(r"%(?![0-9A-Fa-f]{2})")
+	unreserved = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+	default_ports = {"http": ":80", "https": ":443"}
+
+	def __init__(self, excluded_extensions=(".png", ".jpg", ".jpeg", ".gif", ".svg", ".pdf", ".docx", ".css", ".js", ".ico"), excluded_hosts=("upload.wikimedia.org",), excluded_params=("action", "oldid", "diff", "curid", "printable"), cache_size=65536):
+		"""
+		Builds the rule sets used to filter links.
+
+		Parameters:
+		excluded_extensions (tuple): File extensions (lowercase, with the dot) of links to drop. Default are the images and documents the crawler skipped before, plus stylesheets, scripts and icons.
+		excluded_hosts (tuple): Hosts whose links are dropped, including their subdomains. Default is ("upload.wikimedia.org",), the media server.
+		excluded_params (tuple): Query parameters that mark page variants such as edit forms, revisions and diffs. Default is ("action", "oldid", "diff", "curid", "printable").
+		cache_size (int): Number of resolved links kept in the LRU cache. Default is 65536.
+		"""
+		self.excluded_extensions = frozenset(excluded_extensions)
+		self.excluded_hosts = frozenset(excluded_hosts)
+		self.excluded_params = frozenset(excluded_params)
+		self.resolve_cached = lru_cache(maxsize=cache_size)(self.resolve)
+
+	def resolve(self, base_url: str, href: str) -> str:
+		"""
+		Resolves a link against the base URL and canonicalizes it.
+
+		Parameters:
+		base_url (str): The URL relative links are resolved against.
+		href (str): The value of the href attribute.
+
+		Returns:
+		str: The canonical URL, or an empty string if the link should not be crawled.
+		"""
+		return self.canonicalize(urllib.parse.urljoin(base_url, href))
+
+	@staticmethod
+	def origin(url: str) -> str:
+		"""
+		Returns the scheme and network location of a URL followed by a slash, e.g. 'https://en.wikivoyage.org/'.
+		"""
+		parts = urllib.parse.urlsplit(url)
+		return parts.scheme + "://" + parts.netloc + "/"
+
+	def normalize_escape(self, match: re.Match) -> str:
+		"""
+		Decodes an escape of an unreserved character and uppercases all others.
+		"""
+		char = chr(int(match.group(1), 16))
+		if char in self.unreserved:
+			return char
+		return "%" + match.group(1).upper()
+
+	def decode_path(self, path: str) -> str:
+		"""
+		Percent-decodes a path except for `%2F`, `%25`, `%3F` and `%23`, which are uppercased. A path that is not valid UTF-8 once decoded only gets its escapes normalized.
+		"""
+		pieces = self.kept_escape_regex.split(path)
+		try:
+			for i in range(0, len(pieces), 2):
+				pieces[i] = urllib.parse.unquote(pieces[i], errors="strict")
+		except UnicodeDecodeError:
+			return self.escape_regex.sub(self.normalize_escape, path)
+		for i in range(1, len(pieces), 2):
+			pieces[i] = "%" + pieces[i].upper()
+		return "".join(pieces)
+
+	def excluded_host(self, host: str) -> bool:
+		"""
+		Checks if a host or any of its parent domains is in `excluded_hosts`.
+
+		Parameters:
+		host (str): The lowercase host name.
+
+		Returns:
+		bool: True if links to the host should be dropped.
+		"""
+		while True:
+			if host in self.excluded_hosts:
+				return True
+			dot = host.find(".")
+			if dot == -1:
+				return False
+			host = host[dot + 1:]
+
+	def canonicalize(self, url: str) -> str:
+		"""
+		Brings an absolute URL to its canonical form and applies the filter rules.
+
+		Parameters:
+		url (str): An absolute URL.
+
+		Returns:
+		str: The canonical URL, or an empty string if the link should not be crawled.
+		"""
+		try:
+			parts = urllib.parse.urlsplit(url.strip())
+		except ValueError:
+			return ""
+		scheme = parts.scheme.lower()
+		if scheme not in self.default_ports:
+			return ""
+		host = parts.netloc.lower()
+		if host.endswith(self.default_ports[scheme]):
+			host = host[:-len(self.default_ports[scheme])]
+		if host == "" or self.excluded_host(host.split("@")[-1].split(":")[0]):
+			return ""
+		path = self.decode_path(self.bare_percent_regex.sub("%25", parts.path))
+		if path == "":
+			path = "/"
+		if posixpath.splitext(path)[1].lower() in self.excluded_extensions:
+			return ""
+		query = parts.query
+		if query != "":
+			for param in query.split("&"):
+				if param.split("=", 1)[0] in self.excluded_params:
+					return ""
+			query = "?" + self.escape_regex.sub(self.normalize_escape, self.bare_percent_regex.sub("%25", query))
+		return scheme + "://" + host + path + query
+
+	def extract(self, page_url: str, content: str) -> list[str]:
+		"""
+		Returns the canonical links of a page, in document order and without repetitions.
+
+		Parameters:
+		page_url (str): The URL the page was fetched from, used to resolve relative links.
+		content (str): The HTML of the page.
+
+		Returns:
+		list[str]: The canonical URLs of all links that passed the filter rules.
+		"""
+		base_url = page_url
+		origin = self.origin(page_url)
+		hrefs = {}
+		links = {}
+		for tag, double_quoted, single_quoted, unquoted in self.href_regex.findall(content):
+			href = double_quoted or single_quoted or unquoted
+			if tag.lower() == "base":
+				base_url = urllib.parse.urljoin(page_url, href.replace("&amp;", "&"))
+				origin = self.origin(base_url)
+				continue
+			if href == "" or href[0] == "#" or href in hrefs:
+				continue
+			hrefs[href] = True
+			href = href.replace("&amp;", "&")
+			if (href[0] == "/" and href[:2] != "//") or href.startswith(("http://", "https://")):
+				link = self.resolve_cached(origin, href)
+			else:
+				link = self.resolve(base_url, href)
+			if link != "":
+				links[link] = True
+		return list(links)
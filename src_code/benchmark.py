@@ -0,0 +1,390 @@
+import os, sys, json, time, random, shutil, argparse, platform, tempfile, subprocess
+from datetime import datetime, timezone
+
+# link_extractor.py is part of the crawler in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lucene
+import build_index
+import index_wiki
+from java.io import File
+from java.util import HashMap
+from link_extractor import LinkExtractor
+from page_store import page_key
+from schema import Schema
+from org.apache.lucene import analysis, index, queryparser, search, store
+
+"""
+End-to-end benchmark of the pipeline on a synthetic corpus.
+
+The corpus generator writes Wikivoyage-like pages (title, scripts and styles, navigation links, geocrumbs, mw-headline sections with edit links, a navigation box) and Wikipedia-like infobox records for part of the titles; it is seeded, so every run sees the same corpus. The stages are timed one after another:
+
+links    link extraction of the crawler (`LinkExtractor.extract`)
+extract  `build_index.extract_data` and `get_all_data`
+index    `build_index.insert_data` into a temporary index and a commit
+merge    `index_wiki.insert_wiki_data` of the infobox records
+search   title and category queries with the stored fields of the top hits
+
+The stateless stages (links, extract, search) report the best of `--repeat` rounds. Each run is appended with the commit, the time and the settings to the JSON file `--output`, and compared with the previous run of the same corpus, so regressions show up between commits.
+
+With `--compare-schemas` the corpus is instead indexed with every schema of SCHEMAS and the report lists, per schema, the index size, the time to index, the time of the search queries with their stored fields, and the time of the same queries sorted by 'num_cat' (which needs its doc values). It is written to `--schema-report`.
+
+Usage:
+python benchmark.py [--pages 2000] [--seed 1] [--repeat 3] [--queries 1000] [--output benchmark_results.json]
+python benchmark.py --compare-schemas [--pages 2000] [--schema-report schema_report.json]
+"""
+
+SYLLABLES = ["ba", "ra", "to", "mi", "ka", "lo", "pre", "vin", "sta", "dor", "ne", "gu", "zel", "an", "bur", "ha", "ol", "ri", "sk", "tan"]
+CONTINENTS = ["Europe", "Asia", "Africa", "North America", "South America", "Oceania"]
+OTHER_HEADINGS = ["Understand", "Talk", "Cope", "Respect", "Connect"]
+# Schemas compared by --compare-schemas: all text stored without doc values in the default codec, as build_index indexed before schema.py, the lean schema with the default codec, to tell the cost of BEST_COMPRESSION from that of the doc values, and the lean schema with and without stored text
+SCHEMAS = {
+	"stored_text_default_codec": {"store_text": True, "doc_values": False, "best_compression": False},
+	"lean_best_speed": {"store_text": True, "doc_values": True, "best_compression": False},
+	"lean": {"store_text": True, "doc_values": True, "best_compression": True},
+	"lean_index_only_text": {"store_text": False, "doc_values": True, "best_compression": True},
+}
+
+def make_name(rng: random.Random) -> str:
+	"""
+	Returns a random place name of two to four syllables.
+	"""
+	return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+def make_paragraph(rng: random.Random, names: list[str]) -> str:
+	"""
+	Returns a paragraph of filler text with links to other pages, an external site and an image.
+	"""
+	words = [rng.choice(SYLLABLES) * rng.randint(1, 3) for _ in range(rng.randint(30, 80))]
+	for _ in range(rng.randint(1, 4)):
+		name = rng.choice(names)
+		words.insert(rng.randrange(len(words)), f'<a href="/wiki/{name}" title="{name}">{name}</a>')
+	if rng.random() < 0.3:
+		words.append(f'<a rel="nofollow" class="external text" href="https://www.{rng.choice(names).lower()}.example.com/visit?lang=en&amp;page={rng.randint(1, 99)}">website</a>')
+	if rng.random() < 0.2:
+		words.append(f'<a href="/wiki/File:{rng.choice(names)}.jpg" class="image"><img src="//upload.wikimedia.org/{rng.randint(1, 9)}.jpg"></a>')
+	return "<p>" + " ".join(words) + ".</p>\n"
+
+def make_page(rng: random.Random, title: str, crumbs: list[str], names: list[str], headings: list[str]) -> str:
+	"""
+	Returns a page as the page store keeps it: the URL on the first line followed by the HTML.
+
+	Parameters:
+	rng (random.Random): The random generator.
+	title (str): The title of the page.
+	crumbs (list[str]): The geocrumbs from the continent down to the parent region.
+	names (list[str]): Titles of other pages to link to.
+	headings (list[str]): The headings of the sections.
+
+	Returns:
+	str: The page.
+	"""
+	url = "https://en.wikivoyage.org/wiki/" + title
+	parts = [url, "\n<!DOCTYPE html><html><head><title>", title, " &ndash; Travel guide at Wikivoyage</title>",
+		"<style>.mw-body{margin:0}</style><script>var RLCONF={\"wgPageName\":\"", title, "\"};</script>",
+		"<link rel=\"stylesheet\" href=\"/w/load.php?modules=site.styles\"></head><body>\n<div id=\"mw-navigation\">"]
+	for name in ("Main_Page", "Special:Random", "Wikivoyage:Travellers'_pub", "Special:RecentChanges"):
+		parts.append(f'<a href="/wiki/{name}">{name}</a>\n')
+	parts.append(f'<a href="/w/index.php?title={title}&amp;action=edit">Edit</a></div>\n<span class="ext-geocrumbs-breadcrumbs">')
+	for crumb in crumbs:
+		parts.append(f'<a href="/wiki/{crumb}" title="{crumb}">{crumb}</a> &gt; ')
+	parts.append(f"<bdi>{title}</bdi></span>\n")
+	parts.append(make_paragraph(rng, names))
+	for heading in headings:
+		parts.append(f'<h2><span class="mw-headline" id="{heading}">{heading}</span><span class="mw-editsection"><span class="mw-editsection-bracket">[</span><a href="/w/index.php?title={title}&amp;action=edit&amp;section=1">edit</a><span class="mw-editsection-bracket">]</span></span></h2>\n')
+		for _ in range(rng.randint(1, 3)):
+			parts.append(make_paragraph(rng, names))
+	parts.append('<div class="navbox"><table><tr><td>')
+	parts.append(" ".join(f'<a href="/wiki/{name}">{name}</a>' for name in rng.sample(names, min(10, len(names)))))
+	parts.append("</td></tr></table></div>\n</body></html>")
+	return "".join(parts)
+
+def make_corpus(num_pages: int, seed=1) -> tuple[list, list]:
+	"""
+	Generates the synthetic corpus.
+
+	Parameters:
+	num_pages (int): Number of pages.
+	seed (int, optional): Seed of the random generator. Defaults to 1.
+
+	Returns:
+	tuple[list, list]: The pages as (url, page) pairs, and infobox records (as written by the Spark job) for two thirds of the titles.
+	"""
+	rng = random.Random(seed)
+	titles = []
+	seen = set()
+	while len(titles) < num_pages:
+		name = make_name(rng)
+		if name not in seen:
+			seen.add(name)
+			titles.append(name)
+	regions = titles[:max(1, num_pages // 20)]
+	headings = build_index.all_objs + OTHER_HEADINGS
+	pages = []
+	records = []
+	for title in titles:
+		crumbs = [rng.choice(CONTINENTS)] + rng.sample(regions, rng.randint(0, min(2, len(regions))))
+		page = make_page(rng, title, crumbs, titles, rng.sample(headings, rng.randint(3, min(10, len(headings)))))
+		pages.append(("https://en.wikivoyage.org/wiki/" + title, page))
+		if rng.random() < 2 / 3:
+			records.append({"title": title, "infobox": {"population_total": str(rng.randint(100, 2000000)), "country": rng.choice(regions), "timezone": "UTC+" + str(rng.randint(0, 12))}})
+	return pages, records
+
+def best_of(repeat: int, run) -> float:
+	"""
+	Returns the shortest time of `repeat` calls of `run`.
+	"""
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		run()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+def stage_result(items: int, seconds: float) -> dict:
+	"""
+	Returns the record of a stage: the number of items, the time and the throughput.
+	"""
+	return {"items": items, "seconds": round(seconds, 4), "items_per_s": round(items / max(seconds, 1e-9), 1)}
+
+def extract_corpus(pages: list[tuple]) -> list[dict]:
+	"""
+	Runs `extract_data` on all pages and sets the page keys as 'id'.
+	"""
+	extracted = []
+	for url, page in pages:
+		ex_data = build_index.extract_data(page)
+		ex_data["id"] = page_key(url)
+		extracted.append(ex_data)
+	return extracted
+
+def make_queries(extracted: list[dict], num_queries: int, seed=1) -> list[str]:
+	"""
+	Returns half title and half category queries for random pages of the corpus.
+	"""
+	rng = random.Random(seed)
+	queries = []
+	for _ in range(num_queries):
+		ex_data = rng.choice(extracted)
+		if rng.random() < 0.5:
+			queries.append("title:" + ex_data["title"].split(" ")[0])
+		else:
+			queries.append('categories:"' + rng.choice(ex_data["categories"]) + '"')
+	return queries
+
+def query_parser():
+	"""
+	Returns the parser of the benchmark queries. 'categories' is a keyword field, so it is analyzed as a whole and a category of several words is one term instead of a phrase, which the field has no positions for.
+	"""
+	field_analyzers = HashMap()
+	field_analyzers.put("categories", analysis.core.KeywordAnalyzer())
+	analyzer = analysis.miscellaneous.PerFieldAnalyzerWrapper(analysis.standard.StandardAnalyzer(), field_analyzers)
+	return queryparser.classic.QueryParser("title", analyzer)
+
+def directory_size(path: str) -> int:
+	"""
+	Returns the total size of the files of a directory in bytes.
+	"""
+	return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def compare_schemas(num_pages=2000, seed=1, repeat=3, num_queries=1000) -> dict:
+	"""
+	Indexes the synthetic corpus with every schema of SCHEMAS in a temporary directory and measures size and times.
+
+	Parameters:
+	num_pages (int, optional): Number of pages. Defaults to 2000.
+	seed (int, optional): Seed of the corpus. Defaults to 1.
+	repeat (int, optional): Number of rounds of the indexing and the queries. Defaults to 3.
+	num_queries (int, optional): Number of search queries. Defaults to 1000.
+
+	Returns:
+	dict: Per schema the index size in bytes, the best indexing time and the query times in seconds; the sorted query time is None for a schema without doc values.
+	"""
+	pages, _ = make_corpus(num_pages, seed)
+	extracted = extract_corpus(pages)
+	queries = make_queries(extracted, num_queries, seed)
+	parser = query_parser()
+	sort = search.Sort(search.SortField("num_cat", search.SortField.Type.INT, True))
+	report = {}
+	for name, options in SCHEMAS.items():
+		tmp = tempfile.mkdtemp(prefix="benchmark_")
+		try:
+			# Every round indexes the corpus into a new index in the same directory, so the JIT warm-up of the first round does not count
+			index_times = []
+			for _ in range(repeat):
+				build_index.open_writer(tmp, create=True, index_schema=Schema(**options))
+				start = time.perf_counter()
+				for ex_data in extracted:
+					build_index.insert_data(ex_data)
+				build_index.iwriter.commit()
+				index_times.append(time.perf_counter() - start)
+				build_index.iwriter.close()
+			directory = store.FSDirectory.open(File(tmp).toPath())
+			ireader = index.DirectoryReader.open(directory)
+			isearcher = search.IndexSearcher(ireader)
+			def run_queries():
+				for query_str in queries:
+					for hit in isearcher.search(parser.parse(query_str), 10).scoreDocs:
+						isearcher.doc(hit.doc)
+			def run_sorted():
+				for query_str in queries:
+					isearcher.search(parser.parse(query_str), 10, sort)
+			report[name] = {
+				**options,
+				"size_bytes": directory_size(tmp),
+				"index_s": round(min(index_times), 4),
+				"query_s": round(best_of(repeat, run_queries), 4),
+				"sorted_query_s": round(best_of(repeat, run_sorted), 4) if options["doc_values"] else None,
+			}
+			ireader.close()
+			directory.close()
+		finally:
+			shutil.rmtree(tmp, ignore_errors=True)
+	return report
+
+def run_benchmark(num_pages=2000, seed=1, repeat=3, num_queries=1000) -> dict:
+	"""
+	Generates the corpus and times every stage of the pipeline on it. The index is built in a temporary directory that is removed afterwards.
+
+	Parameters:
+	num_pages (int, optional): Number of pages. Defaults to 2000.
+	seed (int, optional): Seed of the corpus. Defaults to 1.
+	repeat (int, optional): Number of rounds of the stateless stages. Defaults to 3.
+	num_queries (int, optional): Number of search queries. Defaults to 1000.
+
+	Returns:
+	dict: The record of every stage.
+	"""
+	pages, records = make_corpus(num_pages, seed)
+	stages = {}
+
+	extractor = LinkExtractor()
+	num_links = sum(len(extractor.extract(url, page.split("\n", 1)[1])) for url, page in pages)
+	stages["links"] = stage_result(len(pages), best_of(repeat, lambda: [LinkExtractor().extract(url, page.split("\n", 1)[1]) for url, page in pages]))
+	stages["links"]["links"] = num_links
+
+	def extract_all():
+		extracted[:] = extract_corpus(pages)
+		for ex_data in extracted:
+			build_index.get_all_data(ex_data)
+	extracted = []
+	stages["extract"] = stage_result(len(pages), best_of(repeat, extract_all))
+
+	tmp = tempfile.mkdtemp(prefix="benchmark_")
+	try:
+		index_path = os.path.join(tmp, "index")
+		build_index.open_writer(index_path, create=True)
+		start = time.perf_counter()
+		for ex_data in extracted:
+			build_index.insert_data(ex_data)
+		build_index.iwriter.commit()
+		stages["index"] = stage_result(len(extracted), time.perf_counter() - start)
+		build_index.iwriter.close()
+
+		records_path = os.path.join(tmp, "spark_output")
+		os.makedirs(records_path)
+		with open(os.path.join(records_path, "part-00000.json"), "w", encoding="utf-8") as json_file:
+			for record in records:
+				json_file.write(json.dumps(record) + "\n")
+		index_wiki.open_index(index_path)
+		start = time.perf_counter()
+		index_wiki.insert_wiki_data(records_path)
+		stages["merge"] = stage_result(len(records), time.perf_counter() - start)
+		index_wiki.iwriter.close()
+		index_wiki.ireader.close()
+
+		queries = make_queries(extracted, num_queries, seed)
+		directory = store.FSDirectory.open(File(index_path).toPath())
+		ireader = index.DirectoryReader.open(directory)
+		isearcher = search.IndexSearcher(ireader)
+		parser = query_parser()
+		def run_queries():
+			for query_str in queries:
+				for hit in isearcher.search(parser.parse(query_str), 10).scoreDocs:
+					isearcher.doc(hit.doc)
+		stages["search"] = stage_result(len(queries), best_of(repeat, run_queries))
+		ireader.close()
+		directory.close()
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+	return stages
+
+def git_commit() -> str:
+	"""
+	Returns the current commit of the repository, or an empty string outside of a git checkout.
+	"""
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return ""
+
+def load_runs(path: str) -> list[dict]:
+	"""
+	Reads the recorded runs, or returns an empty list if the file does not exist.
+	"""
+	if not os.path.isfile(path):
+		return []
+	with open(path, "r", encoding="utf-8") as runs_file:
+		return json.load(runs_file)
+
+def save_runs(runs: list[dict], path: str) -> None:
+	"""
+	Writes the recorded runs, replacing the file only when it is completely written.
+	"""
+	with open(path + ".tmp", "w", encoding="utf-8") as runs_file:
+		json.dump(runs, runs_file, indent=1)
+		runs_file.write("\n")
+	os.replace(path + ".tmp", path)
+
+def compare_runs(previous: dict, current: dict) -> list[str]:
+	"""
+	Returns one line per stage with the throughput of both runs and the relative change.
+	"""
+	lines = []
+	for name, result in current["stages"].items():
+		line = f"{name:8} {result['items_per_s']:>10.1f} items/s"
+		if previous is not None and name in previous["stages"]:
+			before = previous["stages"][name]["items_per_s"]
+			line += f"  (was {before:.1f} at {previous['commit'] or 'unknown commit'}, {(result['items_per_s'] / before - 1) * 100:+.1f} %)"
+		lines.append(line)
+	return lines
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Times the pipeline stages on a synthetic corpus.")
+	arg_parser.add_argument("--pages", type=int, default=2000, help="number of synthetic pages")
+	arg_parser.add_argument("--seed", type=int, default=1, help="seed of the corpus generator")
+	arg_parser.add_argument("--repeat", type=int, default=3, help="number of timed rounds of the stateless stages")
+	arg_parser.add_argument("--queries", type=int, default=1000, help="number of search queries")
+	arg_parser.add_argument("--output", default="benchmark_results.json", help="JSON file the runs are appended to")
+	arg_parser.add_argument("--compare-schemas", action="store_true", help="compare index size and times of the schemas instead")
+	arg_parser.add_argument("--schema-report", default="schema_report.json", help="JSON file of the schema comparison")
+	args = arg_parser.parse_args()
+
+	assert lucene.getVMEnv() or lucene.initVM()
+	if args.compare_schemas:
+		report = compare_schemas(args.pages, args.seed, args.repeat, args.queries)
+		baseline = report["stored_text_default_codec"]
+		print(f"{'schema':26} {'size MB':>9} {'index s':>9} {'query s':>9} {'sorted s':>9}")
+		for name, result in report.items():
+			sorted_time = f"{result['sorted_query_s']:9.3f}" if result["sorted_query_s"] is not None else f"{'-':>9}"
+			print(f"{name:26} {result['size_bytes'] / 1e6:9.2f} {result['index_s']:9.3f} {result['query_s']:9.3f} {sorted_time}  ({(result['size_bytes'] / baseline['size_bytes'] - 1) * 100:+.1f} % size)")
+		with open(args.schema_report, "w", encoding="utf-8") as report_file:
+			json.dump({"commit": git_commit(), "settings": {"pages": args.pages, "seed": args.seed, "repeat": args.repeat, "queries": args.queries}, "schemas": report}, report_file, indent=1)
+			report_file.write("\n")
+		sys.exit(0)
+	run = {
+		"commit": git_commit(),
+		"time": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+		"python": platform.python_version(),
+		"settings": {"pages": args.pages, "seed": args.seed, "repeat": args.repeat, "queries": args.queries},
+		"stages": run_benchmark(args.pages, args.seed, args.repeat, args.queries),
+	}
+	runs = load_runs(args.output)
+	# Only runs on the same corpus are comparable
+	previous = next((old for old in reversed(runs) if old["settings"] == run["settings"]), None)
+	for line in compare_runs(previous, run):
+		print(line)
+	runs.append(run)
+	save_runs(runs, args.output)
@@ -1,28 +1,33 @@
-import lucene, re, os, json
+import lucene, re, os, json, time, queue, hashlib, argparse, threading, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from java.io import File
+from page_store import PageStore
+from html_extract import parse_page
+from gazetteer_matcher import load_matcher
+from gazetteer_builder import GazetteerBuilder, normalize_name, SOURCE_TITLE, SOURCE_BREADCRUMB
+from java.util import HashMap
 from org.apache.lucene import analysis, document, index, queryparser, search, store
+from schema import Schema, index_stores_text
 
-assert lucene.getVMEnv() or lucene.initVM()
-
-# Sets up the Lucene analyzer, directory for storing the index, and the IndexWriter configuration.
-analyzer = analysis.standard.StandardAnalyzer()
-directory = store.FSDirectory.open(File('dataIndex').toPath())
-config = index.IndexWriterConfig(analyzer)
-iwriter = index.IndexWriter(directory, config)
-all_data = {}
+# The IndexWriter and the schema are created by open_writer, so worker processes can import this module without starting a JVM
+iwriter = None
+schema = None
+# Searcher of the index before an incremental build, to look up the documents that are replaced
+isearcher = None
 doc_counter = 0
+# Tags the gazetteer names in the section text when set, see gazetteer_matcher.py
+matcher = None
 
 # https://lucenetutorial.com/lucene-in-5-minutes.html
 # https://coady.github.io/lupyne/
 
-# Regex for removing html tags
-CLEANR = re.compile('<.*?>')
-
-# Get crawled data names
-web_files = os.listdir("data/")
-# web_files = ["9f7a2ffdc4ad418839e505ac46de101f.txt"]
-# print(web_files)
+# Text of the section edit links in the page text, it follows every heading
+EDIT_MARKER = "[edit]"
+WORD_CHAR = re.compile(r"\w")
+# Fields built from a page besides its sections; other stored fields of an indexed page were merged by index_wiki.py
+PAGE_FIELDS = frozenset(("title", "link", "id", "num_cat", "categories", "entities", "other"))
 
 def load_objects(path="res_mod.txt") -> list[str]:
 	"""
@@ -47,64 +52,157 @@ def load_objects(path="res_mod.txt") -> list[str]:
 		result_obj = re.findall(obj_regex, file_text)
 	return result_obj
 
+def load_vocabulary(path="headings.tsv", min_count=1) -> list[str]:
+	"""
+    Reads the headings written by `get_objects.py` that occur at least `min_count` times.
+
+    Parameters:
+    path (str, optional): The heading vocabulary, `heading<TAB>count` lines. Defaults to "headings.tsv".
+    min_count (int, optional): The minimal number of occurrences. Defaults to 1.
+
+    Returns:
+    list[str]: The headings, in the order of the file.
+
+    Raises:
+    FileNotFoundError: If the specified file does not exist.
+    """
+	result_obj = []
+	with open(path, "r", encoding="utf-8") as vocabulary_file:
+		for line in vocabulary_file:
+			heading, count = line.rstrip("\n").rsplit("\t", 1)
+			if int(count) >= min_count:
+				result_obj.append(heading)
+	return result_obj
+
 all_objs = load_objects()
 
+def word_run_start(chunk: str) -> int:
+	"""
+	Returns the offset of the run of word characters (regex \\w) at the end of a string, or -1 if the string does not end with a word character.
+	"""
+	pos = len(chunk)
+	while pos > 0 and WORD_CHAR.match(chunk, pos - 1):
+		pos -= 1
+	return pos if pos < len(chunk) else -1
+
+def remove_sections(chunks: list[str], obj: str) -> list[str]:
+	"""
+	Removes all sections of one heading from a page split at the edit markers.
+
+	This is the effect of `re.sub(f"({obj}\\[edit\\].*?(?=\\w+\\[edit\\]))", "", text, flags=re.DOTALL)` on the joined text: a section starts with the heading and its marker and ends where the last word of the next heading that ends with a word character begins.
+
+	Parameters:
+	chunks (list[str]): The text between consecutive edit markers.
+	obj (str): The heading whose sections are removed.
+
+	Returns:
+	list[str]: The chunks of the text after the removal.
+	"""
+	runs = [word_run_start(chunk) for chunk in chunks[:-1]]
+	result = []
+	current = ""
+	start = 0
+	i = 0
+	next_valid = 0
+	while i < len(chunks) - 1:
+		chunk = chunks[i]
+		obj_start = len(chunk) - len(obj)
+		if obj_start >= start and chunk.endswith(obj):
+			next_valid = max(next_valid, i + 1)
+			while next_valid < len(runs) and runs[next_valid] == -1:
+				next_valid += 1
+			if next_valid == len(runs):
+				break
+			current += chunk[start:obj_start]
+			i = next_valid
+			start = runs[next_valid]
+			continue
+		result.append(current + chunk[start:])
+		current = ""
+		start = 0
+		i += 1
+	result.append(current + chunks[i][start:])
+	result.extend(chunks[i + 1:])
+	return result
+
+def split_sections(clean_html: str, objs: list[str]) -> tuple[dict, str]:
+	"""
+	Splits a page without html tags into the sections of the wanted headings and the remaining text.
+
+	The page is split at the edit markers once and the text before every marker is looked up in a set of the wanted headings, so the whole page is not scanned again for every heading. The result is the same as that of running, for every heading in `objs`, a DOTALL `re.findall` for its first section on the page and a `re.sub` removing its sections from the remaining text.
+
+	Parameters:
+	clean_html (str): The page text with html tags removed.
+	objs (list[str]): The wanted headings, in the order in which their sections are removed.
+
+	Returns:
+	tuple[dict, str]: The first section of every heading found (newlines collapsed, limited to 32000 characters) in the order of `objs`, and the remaining text.
+	"""
+	chunks = clean_html.split(EDIT_MARKER)
+	runs = [word_run_start(chunk) for chunk in chunks[:-1]]
+	wanted = set(objs)
+	lengths = sorted({len(obj) for obj in objs})
+	first = {}
+	for i in range(len(runs)):
+		chunk = chunks[i]
+		for length in lengths:
+			if length > len(chunk):
+				break
+			heading = chunk[len(chunk) - length:]
+			if heading in wanted and heading not in first:
+				first[heading] = i
+	paragraphs = {}
+	for obj in objs:
+		i = first.get(obj)
+		if i is None:
+			continue
+		j = i + 1
+		while j < len(runs) and runs[j] == -1:
+			j += 1
+		if j == len(runs):
+			continue
+		paragraph = obj + EDIT_MARKER + "".join(chunk + EDIT_MARKER for chunk in chunks[i + 1:j]) + chunks[j][:runs[j]]
+		paragraphs[obj] = re.sub("\n+", "\n", paragraph)[:32000]
+	rest_chunks = chunks
+	for obj in objs:
+		if obj in first:
+			rest_chunks = remove_sections(rest_chunks, obj)
+	return paragraphs, EDIT_MARKER.join(rest_chunks)
+
 def extract_data(data: str) -> dict:
 	"""
 	Extracts and processes data from a given HTML string.
 
-	This function parses the input HTML data to extract various elements such as title, link, categories, and paragraphs. It uses regular expressions to clean HTML content and extract structured information. The function also identifies and processes specific objects listed in the global variable 'all_objs'.
+	This function parses the input HTML data to extract various elements such as title, link, categories, and paragraphs. The page is parsed in one streaming pass of an HTML event parser (see `html_extract.PageParser`) and the sections are split from its text. The function also identifies and processes specific objects listed in the global variable 'all_objs'. If a gazetteer matcher is loaded into the global variable 'matcher', the place names mentioned in the sections and the remaining text are tagged as 'entities'.
 
 	Parameters:
 	data (str): A string containing HTML content to be processed.
 
 	Returns:
-	dict: A dictionary containing the extracted data. The keys include 'title', 'link', 'num_cat' (number of categories), 'categories' (a list of category names), 'paragraphs' (a dictionary with keys as object names and values as corresponding content), and 'other' (remaining content after extraction).
+	dict: A dictionary containing the extracted data. The keys include 'title', 'link', 'num_cat' (number of categories), 'categories' (a list of category names), 'paragraphs' (a dictionary with keys as object names and values as corresponding content), and 'other' (remaining content after extraction). With a loaded matcher also 'entities' (the gazetteer names found in the text).
 
 	Note:
 	- The 'title' is extracted from the <title> tag.
 	- The 'link' is derived from the first line of the data.
 	- Categories are extracted from a specific span with the class 'ext-geocrumbs-breadcrumbs'.
 	- Paragraphs are extracted based on the objects in 'all_objs', each limited to 32000 characters.
-	- Any HTML tags are removed from the extracted content.
+	- Any HTML tags are removed from the extracted content, as are scripts, styles and navigation boxes.
 	"""
 	global all_objs
-	clean_html = ""
-	rest = ""
-	tree_items = []
-	paragraph = []
-	paragraphs = {}
-	title = re.findall("<title>(.*)</title>", data)
-	link = data.split("\n")[0]
-	if len(title) == 0:
-		title = ""
-	else:
-		title = title[0]
-	try:
-		tree = re.findall("<span class=\"ext-geocrumbs-breadcrumbs\">.*", data)[0]
-		tree_items = re.findall("title=\"(.*?)\"", tree)
-		tree_items.append(re.findall("<bdi>(.*?)</bdi>", tree)[-1])
-	except:
-		pass
-	clean_html = re.sub(CLEANR, "", data)
-	for obj in range(len(all_objs)):
-		paragraph = re.findall(f"({all_objs[obj]}\\[edit\\].*?(?=\\w+\\[edit\\]))", clean_html, flags=re.DOTALL)
-		if obj == 0:
-			rest = re.sub(f"({all_objs[obj]}\\[edit\\].*?(?=\\w+\\[edit\\]))", "", clean_html, flags=re.DOTALL)
-		else:
-			rest = re.sub(f"({all_objs[obj]}\\[edit\\].*?(?=\\w+\\[edit\\]))", "", rest, flags=re.DOTALL)
-		if len(paragraph) >= 1:
-			prettify_paragraph = paragraph[0]
-			prettify_paragraph = re.sub("\n+", "\n", prettify_paragraph)
-			paragraphs[all_objs[obj]] = prettify_paragraph[:32000]
+	link = data.split("\n", 1)[0]
+	page = parse_page(data)
+	paragraphs, rest = split_sections("".join(page.text), all_objs)
 	rest = re.sub("\n+", "\n", rest)
-	return {"title": title, "link": link, "num_cat": len(paragraphs.keys()), "categories": tree_items, "paragraphs": paragraphs, "other": rest[:32000]}
+	ex_data = {"title": page.title, "link": link, "num_cat": len(paragraphs.keys()), "categories": page.categories, "paragraphs": paragraphs, "other": rest[:32000]}
+	if matcher is not None:
+		ex_data["entities"] = matcher.find("\n".join(paragraphs.values()) + "\n" + ex_data["other"])
+	return ex_data
 
 def create_gazetteer(data: dict) -> None:
 	"""
     Writes the keys of a given dictionary to a file named 'gazetteer.txt'.
 
-    This function takes a dictionary, extracts its keys, and writes them line by line to a text file named 'gazetteer.txt'. Each key is written on a new line. The file is encoded in UTF-8.
+    This function takes a dictionary, extracts its keys, and writes them line by line to a text file named 'gazetteer.txt'. Each key is written on a new line, in sorted order, so the same data always gives the same file. The file is encoded in UTF-8.
 
     Parameters:
     data (dict): The dictionary whose keys are to be written to the file.
@@ -122,7 +220,7 @@ def create_gazetteer(data: dict) -> None:
     key1
     key2
     """
-	data_keys = list(data.keys())
+	data_keys = sorted(data.keys())
 	with open("gazetteer.txt", "w", encoding="utf-8") as gaz_file:
 		for item in data_keys:
 			gaz_file.write(item + "\n")
@@ -150,23 +248,66 @@ def get_all_data(extracted_data: dict) -> dict:
 	if len(list(extracted_data.keys())) == 0:
 		return {}
 	all_ex_data = {}
-	mod_title = re.sub(r"( -.*)|( \(.*)|( \|.*)|( –.*)|( —.*)|(\n)", "", extracted_data["title"])
-	all_ex_data[mod_title] = True
-	for category in extracted_data["categories"]:
-		new_cat = re.sub(r"( -.*)|( \(.*)|( \|.*)|( –.*)|( —.*)|(\n)", "", category)
-		all_ex_data[new_cat] = True
+	for name, _ in gazetteer_entries(extracted_data):
+		all_ex_data[name] = True
 	return all_ex_data
 
-def insert_data(data: dict) -> None:
+def gazetteer_entries(extracted_data: dict) -> list[tuple]:
+	"""
+    Returns the gazetteer names of a page with their source: the cleaned 'title' and every cleaned 'category' (see `gazetteer_builder.normalize_name`).
+
+    Parameters:
+    extracted_data (dict): A dictionary containing 'title' and 'categories'.
+
+    Returns:
+    list[tuple]: (name, source) pairs, the source being SOURCE_TITLE or SOURCE_BREADCRUMB. Empty if 'extracted_data' is empty.
+    """
+	if len(extracted_data) == 0:
+		return []
+	entries = [(normalize_name(extracted_data["title"]), SOURCE_TITLE)]
+	for category in extracted_data["categories"]:
+		entries.append((normalize_name(category), SOURCE_BREADCRUMB))
+	return entries
+
+def infobox_fields(stored_doc, objs: list[str]) -> dict:
+	"""
+    Returns the infobox fields index_wiki.py merged into a stored document: its stored text fields that are neither in `PAGE_FIELDS` nor the section of one of the headings `objs`.
+
+    Parameters:
+    stored_doc (Document): The stored document of a page.
+    objs (list[str]): The wanted headings.
+
+    Returns:
+    dict: The infobox keys and values.
+    """
+	sections = set(objs)
+	fields = {}
+	for field in stored_doc.getFields():
+		name = field.name()
+		if name not in PAGE_FIELDS and name not in sections and field.fieldType().stored() and field.stringValue() is not None:
+			fields.setdefault(name, field.stringValue())
+	return fields
+
+def stored_infobox(key: str) -> dict:
+	"""
+    Returns the infobox fields of the indexed document of a page (see `infobox_fields`), looked up by its 'id' with the global searcher ('isearcher'). Empty if the page is not indexed yet.
+    """
+	hits = isearcher.search(search.TermQuery(index.Term("id", key)), 1).scoreDocs
+	if len(hits) == 0:
+		return {}
+	return infobox_fields(isearcher.doc(hits[0].doc), all_objs)
+
+def insert_data(data: dict, update=False) -> None:
 	"""
     Inserts data into a Lucene document and adds it to the index.
 
-    This function constructs a Lucene document by adding various fields from the provided data dictionary. It handles different types of data fields, including tokenized and non-tokenized text, integers, and floats. The fields 'categories', 'paragraphs', 'link', 'title', 'other', and 'id' are specifically processed. Tokenized fields are searchable, while non-tokenized fields are stored but not searchable.
+    This function constructs a Lucene document by adding various fields from the provided data dictionary with the field types of the global schema ('schema', see schema.py). It handles different types of data fields, including tokenized and non-tokenized text, integers, and floats. The fields 'categories', 'paragraphs', 'link', 'title', 'other', 'id' and 'entities' are specifically processed. Tokenized fields are searchable, non-tokenized fields are matched as a whole; 'categories' and the integers also get doc values for faceting and sorting.
 
-    The constructed document is then added to a global index writer ('iwriter') for indexing.
+    The constructed document is then added to a global index writer ('iwriter') for indexing. With `update` it replaces the document with the same 'id', so a page that is indexed again is not duplicated; the infobox fields index_wiki.py merged into the old document are carried over (see `stored_infobox`), as the page itself does not give them again.
 
     Parameters:
     data (dict): A dictionary containing data to be added to the Lucene document. The keys should correspond to the field names, and the values to the field content.
+    update (bool, optional): Whether to replace an existing document with the same 'id' instead of adding a new one. Defaults to False.
 
     Returns:
     None: This function does not return anything.
@@ -186,56 +327,377 @@ def insert_data(data: dict) -> None:
     }
     The function will process and add these as fields to a Lucene document.
     """
-	global iwriter
-	doc = document.Document()
-	tokenized = document.FieldType()
-	tokenized.setStored(True)
-	tokenized.setTokenized(True)
-	tokenized.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS)
-
-	tokenized2 = document.FieldType()
-	tokenized2.setStored(True)
-	tokenized2.setTokenized(True)
-	tokenized2.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS_AND_POSITIONS)
-
-	non_tokenized = document.FieldType()
-	non_tokenized.setStored(True)
-	non_tokenized.setTokenized(False)
-	non_tokenized.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS)
-	for key in data:
-		if key == "categories":
-			for i in range(len(data[key])):
-				doc.add(document.Field("categories", data[key][i], non_tokenized))
-		elif key == "paragraphs":
-			for new_key in data[key]:
-				doc.add(document.Field(new_key, data[key][new_key], tokenized))
-		elif type(data[key]) == int:
-			doc.add(document.IntPoint(key, data[key]))
-		elif type(data[key]) == float:
-			doc.add(document.FloatPoint(key, data[key]))
-		elif key == "link":
-			doc.add(document.Field(key, data[key], non_tokenized))
-		elif key == "title":
-			doc.add(document.Field(key, data[key], tokenized2))
-		elif key == "other":
-			doc.add(document.Field(key, data[key], tokenized))
-		elif key == "id":
-			doc.add(document.Field(key, data[key], non_tokenized))
-		else:
+	if update:
+		data["infobox"] = stored_infobox(data["id"])
+	doc = schema.document(data)
+	if update:
+		iwriter.updateDocument(index.Term("id", data["id"]), doc)
+	else:
+		iwriter.addDocument(doc)
+
+def open_writer(path="dataIndex", create=False, store_text=True, index_schema=None) -> None:
+	"""
+    Starts the JVM, creates the global schema and opens the global IndexWriter.
+
+    Sets up the Lucene analyzer, directory for storing the index, and the IndexWriter configuration with the codec of the schema. Whether the large text fields are stored is recorded in the commits; an existing index that is appended to keeps its setting.
+
+    Parameters:
+    path (str, optional): The index directory. Defaults to "dataIndex".
+    create (bool, optional): Whether to replace an existing index instead of appending to it. Defaults to False.
+    store_text (bool, optional): Whether the section fields and 'other' are stored, for a new index. Defaults to True.
+    index_schema (Schema, optional): A schema to use instead of the default one. Defaults to None.
+
+    Returns:
+    None: This function does not return anything.
+    """
+	global iwriter, schema
+	assert lucene.getVMEnv() or lucene.initVM()
+	analyzer = analysis.standard.StandardAnalyzer()
+	directory = store.FSDirectory.open(File(path).toPath())
+	if not create and index.DirectoryReader.indexExists(directory):
+		store_text = index_stores_text(directory)
+	schema = index_schema if index_schema is not None else Schema(store_text)
+	config = index.IndexWriterConfig(analyzer)
+	config.setOpenMode(index.IndexWriterConfig.OpenMode.CREATE if create else index.IndexWriterConfig.OpenMode.CREATE_OR_APPEND)
+	schema.configure(config)
+	iwriter = index.IndexWriter(directory, config)
+	commit_data = HashMap()
+	for key, value in schema.commit_data().items():
+		commit_data.put(key, value)
+	iwriter.setLiveCommitData(commit_data.entrySet())
+
+def load_state(path="indexed_pages.tsv") -> dict:
+	"""
+    Reads the list of indexed pages written by `save_state`.
+
+    Parameters:
+    path (str, optional): The state file. Defaults to "indexed_pages.tsv".
+
+    Returns:
+    dict: The store location and SHA-1 digest of every indexed page by its key. Empty if the file does not exist.
+    """
+	state = {}
+	if not os.path.isfile(path):
+		return state
+	with open(path, "r", encoding="utf-8") as state_file:
+		for line in state_file:
+			key, location, digest = line.rstrip("\n").split("\t")
+			state[key] = (location, digest)
+	return state
+
+def save_state(state: dict, path="indexed_pages.tsv") -> None:
+	"""
+    Writes the list of indexed pages as `key<TAB>location<TAB>digest` lines. The file is replaced atomically, so an interrupted run leaves the previous state.
+
+    Parameters:
+    state (dict): The store location and digest of every indexed page by its key.
+    path (str, optional): The state file. Defaults to "indexed_pages.tsv".
+
+    Returns:
+    None: This function does not return anything.
+    """
+	with open(path + ".tmp", "w", encoding="utf-8") as state_file:
+		for key, (location, digest) in state.items():
+			state_file.write(f"{key}\t{location}\t{digest}\n")
+	os.replace(path + ".tmp", path)
+
+def write_gazetteer_entries(state_file, builder: GazetteerBuilder, key: str, entries: list[tuple]) -> None:
+	"""
+    Counts the gazetteer entries of an indexed page with the builder and writes them to the new gazetteer state as a JSON line.
+
+    Parameters:
+    state_file: The new state file, `path + ".tmp"` of `merge_gazetteer_state`.
+    builder (GazetteerBuilder): The builder counting the names.
+    key (str): The key of the page.
+    entries (list[tuple]): The (name, source) pairs of the page.
+
+    Returns:
+    None: This function does not return anything.
+    """
+	builder.add_entries(entries)
+	state_file.write(json.dumps({"key": key, "entries": entries}, ensure_ascii=False) + "\n")
+
+def merge_gazetteer_state(builder: GazetteerBuilder, dropped: set, path="gazetteer_state.jsonl", incremental=False) -> None:
+	"""
+    Completes the gazetteer state written with `write_gazetteer_entries` and replaces the previous one. The state holds the gazetteer entries of every indexed page and the builder counts all of them, so the gazetteer is the sum over the state and an incremental build gives the same gazetteer as a full one.
+
+    With `incremental` the previous state is streamed and the entries of its pages that are not in `dropped` (the removed pages and the pages indexed again) are counted and appended, so only the keys of the indexed pages are held in memory. The file is replaced atomically, so an interrupted run leaves the previous state.
+
+    Parameters:
+    builder (GazetteerBuilder): The builder counting the names.
+    dropped (set): The keys of the pages whose previous entries are left out.
+    path (str, optional): The state file. Defaults to "gazetteer_state.jsonl".
+    incremental (bool, optional): Whether to keep the entries of the previous state. Defaults to False.
+
+    Returns:
+    None: This function does not return anything.
+    """
+	if incremental and os.path.isfile(path):
+		with open(path + ".tmp", "a", encoding="utf-8") as state_file, open(path, "r", encoding="utf-8") as old_file:
+			for line in old_file:
+				page = json.loads(line)
+				if page["key"] not in dropped:
+					builder.add_entries(page["entries"])
+					state_file.write(line)
+	os.replace(path + ".tmp", path)
+
+def diff_state(page_store: PageStore, state: dict) -> tuple[list, list]:
+	"""
+    Compares the page store with the indexed pages.
+
+    The PageStore only appends, so a page is only missing from it when the index is updated from another store than the one it was built from, e.g. one converted anew with `convert_data_dir`.
+
+    Parameters:
+    page_store (PageStore): The page store.
+    state (dict): The store location and digest of every indexed page by its key.
+
+    Returns:
+    tuple[list, list]: The keys of pages that are new or were written again since they were indexed, and the keys of indexed pages that are no longer in the store.
+    """
+	changed = [key for key in page_store.keys() if key not in state or state[key][0] != page_store.location(key)]
+	removed = [key for key in state if key not in page_store]
+	return changed, removed
+
+def load_manifest(path="../history/changed_pages.tsv") -> tuple[list, int]:
+	"""
+    Reads the changed-pages manifest the crawler writes in recrawl mode (`crawler_Zuzula.Crawler.start_recrawl`), `key<TAB>url` lines.
+
+    Parameters:
+    path (str, optional): The manifest. Defaults to "../history/changed_pages.tsv", the one of the crawler.
+
+    Returns:
+    tuple[list, int]: The keys of the changed pages in the order they were first written, and the number of bytes read, for `consume_manifest`.
+    """
+	keys = {}
+	with open(path, "rb") as manifest_file:
+		data = manifest_file.read()
+	# A line the crawler is still writing is left for the next build
+	size = data.rfind(b"\n") + 1
+	for line in data[:size].decode("utf-8").splitlines():
+		keys[line.split("\t", 1)[0]] = True
+	return list(keys), size
+
+def consume_manifest(path: str, size: int) -> None:
+	"""
+    Removes the first `size` bytes, the lines read by `load_manifest`, from the manifest, so the next build only sees pages the crawler changed since. Lines appended in the meantime are kept.
+    """
+	with open(path, "rb") as manifest_file:
+		manifest_file.seek(size)
+		rest = manifest_file.read()
+	with open(path + ".tmp", "wb") as manifest_file:
+		manifest_file.write(rest)
+	os.replace(path + ".tmp", path)
+
+def changed_pages(page_store: PageStore, keys: list, state: dict):
+	"""
+    Streams the given pages and skips those whose content has the digest they were indexed with. The state is updated with the location and digest of every page read.
+
+    Parameters:
+    page_store (PageStore): The page store.
+    keys (list): The keys of the pages to read.
+    state (dict): The store location and digest of every indexed page by its key.
+
+    Yields:
+    tuple: The key and the page text of each new or changed page.
+    """
+	for key, txt_file in page_store.iter_keys(keys):
+		digest = hashlib.sha1(txt_file.encode("utf-8")).hexdigest()
+		old = state.get(key)
+		state[key] = (page_store.location(key), digest)
+		if old is not None and old[1] == digest:
+			continue
+		yield key, txt_file
+
+def init_worker(objs: list[str], entity_matcher=None) -> None:
+	"""
+    Initializes a parsing worker process with the list of wanted headings and the gazetteer matcher of the parent process.
+    """
+	global all_objs, matcher
+	all_objs = objs
+	matcher = entity_matcher
+
+def parse_pages(pages: list[tuple]) -> list[tuple]:
+	"""
+    Runs `extract_data` and `gazetteer_entries` on a chunk of pages. This is the unit of work of the parsing processes.
+
+    Parameters:
+    pages (list[tuple]): (key, page text) pairs from the page store.
+
+    Returns:
+    list[tuple]: The extracted data, with the page key as 'id', and the gazetteer entries of every page.
+    """
+	result = []
+	for key, txt_file in pages:
+		ex_data = extract_data(txt_file)
+		ex_data["id"] = key
+		result.append((ex_data, gazetteer_entries(ex_data)))
+	return result
+
+def iter_parsed(pages, workers: int, chunk_size: int):
+	"""
+    Parses pages in a pool of `workers` processes and yields the results in input order.
+
+    Pages are sent to the pool in chunks of `chunk_size` and at most two chunks per worker are in flight, so the page store is streamed instead of being loaded into memory at once. With fewer than two workers pages are parsed in the calling process.
+
+    The workers are started with the 'spawn' method: the calling process runs the JVM and the indexing threads, and a forked copy of it would inherit locks held by those threads. The workers import this module without starting a JVM and get the headings and the matcher through `init_worker`.
+
+    Parameters:
+    pages: An iterable of (key, page text) pairs.
+    workers (int): Number of parsing processes.
+    chunk_size (int): Number of pages per task.
+
+    Yields:
+    tuple: The extracted data and the gazetteer entries of each page.
+    """
+	if workers < 2:
+		for page in pages:
+			yield from parse_pages([page])
+		return
+	with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(all_objs, matcher)) as pool:
+		pending = deque()
+		chunk = []
+		for page in pages:
+			chunk.append(page)
+			if len(chunk) == chunk_size:
+				pending.append(pool.submit(parse_pages, chunk))
+				chunk = []
+				if len(pending) >= 2 * workers:
+					yield from pending.popleft().result()
+		if len(chunk) != 0:
+			pending.append(pool.submit(parse_pages, chunk))
+		while pending:
+			yield from pending.popleft().result()
+
+def index_documents(doc_queue: queue.Queue, update=False, errors=None) -> None:
+	"""
+    Adds (or with `update` replaces) documents from a queue in the index until it receives None. Runs in an indexing thread attached to the JVM; IndexWriter is thread-safe, so several of these threads share one writer.
+
+    An exception of `insert_data` (e.g. a JavaError) is appended to `errors` instead of ending the thread, and the thread keeps taking documents from the queue without indexing them, so the producer never blocks on a full queue. The producer checks `errors` and raises the first one.
+    """
+	lucene.getVMEnv().attachCurrentThread()
+	while True:
+		data = doc_queue.get()
+		if data is None:
+			return
+		if errors:
 			continue
-	iwriter.addDocument(doc)
+		try:
+			insert_data(data, update)
+		except Exception as error:
+			errors.append(error)
+
+def build_index(store_path="store", workers=1, index_threads=1, chunk_size=16, incremental=False, state_path="indexed_pages.tsv", manifest_path=None, gazetteer_state_path="gazetteer_state.jsonl") -> None:
+	"""
+    Indexes the pages of the page store, commits the index and writes the gazetteer (gazetteer.txt and its statistics gazetteer.tsv, see gazetteer_builder.py) and the list of indexed pages.
+
+    Every document gets the key of its page in the store as 'id'. A full build indexes all pages. An incremental build only indexes pages that are new or whose content changed since the last build (according to `state_path`), replaces their old documents with `IndexWriter.updateDocument` (keeping the infobox fields merged by index_wiki.py, see `insert_data`), and deletes the documents of pages that are no longer in the store. The gazetteer names of every page are kept in `gazetteer_state_path` and the gazetteer is counted from it (see `merge_gazetteer_state`), so the names of removed pages and the old names of changed pages are dropped; without that file an incremental build only counts the names of the pages it indexes.
+
+    With `manifest_path` an incremental build indexes exactly the pages listed in the changed-pages manifest of a recrawl instead of comparing the whole store with the state, and deletes nothing. The lines it read are removed from the manifest once the index is committed, also by a full build, which indexes them anyway.
+
+    Parsing and extraction run in `workers` processes, while `index_threads` JVM-attached threads feed the parsed documents to the shared IndexWriter. Throughput is printed at the end. If adding a document fails, the build stops, the changes of the IndexWriter are rolled back (which closes it) and the error is raised.
+
+    Parameters:
+    store_path (str, optional): The page store directory. Defaults to "store".
+    workers (int, optional): Number of parsing processes. Defaults to 1, which parses in the main process.
+    index_threads (int, optional): Number of indexing threads. Defaults to 1.
+    chunk_size (int, optional): Number of pages per parsing task. Defaults to 16.
+    incremental (bool, optional): Whether to update the index instead of building it from all pages. Defaults to False.
+    state_path (str, optional): The file listing the indexed pages. Defaults to "indexed_pages.tsv".
+    manifest_path (str, optional): The changed-pages manifest of a recrawl. Defaults to None.
+    gazetteer_state_path (str, optional): The file with the gazetteer names of every indexed page. Defaults to "gazetteer_state.jsonl".
+
+    Returns:
+    None: This function does not return anything.
+
+    Raises:
+    Exception: The first error of the indexing threads, e.g. a JavaError of `IndexWriter.addDocument`.
+    """
+	global doc_counter, isearcher
+	start = time.time()
+	page_store = PageStore(store_path)
+	state = load_state(state_path) if incremental else {}
+	if manifest_path is not None:
+		manifest_keys, manifest_size = load_manifest(manifest_path)
+	if incremental and manifest_path is not None:
+		changed, removed = [key for key in manifest_keys if key in page_store], []
+	else:
+		changed, removed = diff_state(page_store, state)
+	if incremental:
+		# A reader of the index as it was before this build, it does not see the replaced documents
+		isearcher = search.IndexSearcher(index.DirectoryReader.open(iwriter))
+	for key in removed:
+		iwriter.deleteDocuments(index.Term("id", key))
+		del state[key]
+	# The names of the indexed pages are counted and written to the new gazetteer state as they are parsed
+	builder = GazetteerBuilder()
+	indexed = set()
+	gaz_state_file = open(gazetteer_state_path + ".tmp", "w", encoding="utf-8")
+	doc_queue = queue.Queue(maxsize=256)
+	errors = []
+	threads = [threading.Thread(target=index_documents, args=(doc_queue, incremental, errors)) for _ in range(index_threads)]
+	for thread in threads:
+		thread.start()
+	try:
+		for ex_data, entries in iter_parsed(changed_pages(page_store, changed, state), workers, chunk_size):
+			if errors:
+				break
+			write_gazetteer_entries(gaz_state_file, builder, ex_data["id"], entries)
+			indexed.add(ex_data["id"])
+			doc_queue.put(ex_data)
+			doc_counter += 1
+	finally:
+		for thread in threads:
+			doc_queue.put(None)
+		for thread in threads:
+			thread.join()
+		if isearcher is not None:
+			isearcher.getIndexReader().close()
+			isearcher = None
+		gaz_state_file.close()
+	if errors:
+		# Nothing of the failed build is committed, and the state and the gazetteer are left as they were
+		os.remove(gazetteer_state_path + ".tmp")
+		iwriter.rollback()
+		raise errors[0]
+	iwriter.commit()
+	# The names are saved first: if the run stops in between, the pages are indexed again and their names replaced
+	merge_gazetteer_state(builder, indexed | set(removed), gazetteer_state_path, incremental)
+	save_state(state, state_path)
+	if manifest_path is not None:
+		consume_manifest(manifest_path, manifest_size)
+	elapsed = time.time() - start
+	print(f"Indexed {doc_counter} documents in {elapsed:.1f} s ({doc_counter / max(elapsed, 1e-9):.1f} docs/s), {len(state) - doc_counter} unchanged, {len(removed)} deleted")
+	print(f"Wrote {builder.finish()} gazetteer names")
 
 
 if __name__ == '__main__':
-	for web in range(len(web_files)):
-		with open(f"data/{web_files[web]}", "r", encoding="utf-8") as file_content:
-			txt_file = file_content.read()
-			ex_data = extract_data(txt_file)
-			ex_data["id"] = str(doc_counter)
-			all_data.update(get_all_data(ex_data))
-			# print(ex_data)
-			insert_data(ex_data)
-		doc_counter += 1
-	create_gazetteer(all_data)
-
-iwriter.close()
+	arg_parser = argparse.ArgumentParser(description="Builds the Lucene index from the crawled pages.")
+	arg_parser.add_argument("--store", default="store", help="page store directory")
+	arg_parser.add_argument("--index", default="dataIndex", help="index directory")
+	arg_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of parsing processes (1 parses in the main process)")
+	arg_parser.add_argument("--index-threads", type=int, default=2, help="number of threads adding documents to the IndexWriter")
+	arg_parser.add_argument("--chunk-size", type=int, default=16, help="number of pages per parsing task")
+	arg_parser.add_argument("--incremental", action="store_true", help="only index new and changed pages and delete removed ones")
+	arg_parser.add_argument("--state", default="indexed_pages.tsv", help="file listing the indexed pages")
+	arg_parser.add_argument("--gazetteer-state", default="gazetteer_state.jsonl", help="file with the gazetteer names of every indexed page")
+	arg_parser.add_argument("--changed", default=None, help="changed-pages manifest of a recrawl, e.g. ../history/changed_pages.tsv; only its pages are indexed (implies --incremental)")
+	arg_parser.add_argument("--headings", default=None, help="heading vocabulary written by get_objects.py, instead of res_mod.txt")
+	arg_parser.add_argument("--min-count", type=int, default=200, help="minimal number of occurrences of a heading from --headings")
+	arg_parser.add_argument("--no-store-text", action="store_true", help="index the sections and 'other' without storing them (a new index only; index_wiki.py cannot merge into it)")
+	arg_parser.add_argument("--entities", default=None, help="gazetteer to tag the place names of the pages with, e.g. gazetteer.txt of the previous build")
+	args = arg_parser.parse_args()
+
+	if args.headings is not None:
+		all_objs = load_vocabulary(args.headings, args.min_count)
+		print(f"Loaded {len(all_objs)} headings from {args.headings}")
+	if args.entities is not None:
+		matcher = load_matcher(args.entities)
+		print(f"Loaded {len(matcher)} gazetteer names from {args.entities}")
+
+	# Without a list of indexed pages and their gazetteer names the index and the gazetteer cannot be updated, so they are rebuilt
+	incremental = (args.incremental or args.changed is not None) and os.path.isfile(args.state) and os.path.isfile(args.gazetteer_state)
+	if (args.incremental or args.changed is not None) and not incremental:
+		print(f"{args.state} or {args.gazetteer_state} not found, rebuilding the index")
+	open_writer(args.index, create=not incremental, store_text=not args.no_store_text)
+	build_index(args.store, args.workers, args.index_threads, args.chunk_size, incremental, args.state, args.changed, args.gazetteer_state)
+	iwriter.close()
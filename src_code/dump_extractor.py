@@ -0,0 +1,157 @@
+import re, os, bz2, html, json, time, argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Extracts the infoboxes of the gazetteer pages from a Wikipedia multistream dump without Spark.
+
+A multistream dump is a series of bz2 streams of about 100 pages each, and its index file lists `offset:page_id:title` for every page, where offset is the start of the stream holding the page. Only the streams that hold a gazetteer title are read: each one is seeked to, decompressed and parsed on its own in a pool of processes. The output has the format of the `spark_output` of PySpark.py, JSON lines with the 'title' and the 'infobox' map of keys to values, so index_wiki.py can read either.
+
+Usage:
+python dump_extractor.py --dump enwiki-pages-articles-multistream.xml.bz2 --index enwiki-pages-articles-multistream-index.txt.bz2 [--gazetteer gazetteer.txt] [--output spark_output] [--workers 4]
+"""
+
+# The same regex PySpark.py applies to the page text
+infobox_regex = re.compile(r"\n\|(.*?)=(.*)")
+markup_regex = re.compile(r"[\[\]\{\}\=]|<.*?>")
+space_regex = re.compile(r" +")
+
+# Set in every extraction process by init_worker
+dump_file = None
+gazetteer = set()
+
+def load_gazetteer(path="gazetteer.txt") -> set[str]:
+	"""
+	Loads the titles to extract, one per line.
+
+	Parameters:
+	path (str): The gazetteer file. Defaults to "gazetteer.txt".
+
+	Returns:
+	set[str]: The titles.
+	"""
+	with open(path, "r", encoding="utf-8") as txt_file:
+		return {line.strip() for line in txt_file}
+
+def clean_text(data: list[str]) -> list[str]:
+	"""
+	Cleans infobox keys or values the way PySpark.py does: strips whitespace, removes brackets, braces, '=' and html tags, replaces '|' with a space and collapses spaces.
+
+	Parameters:
+	data (list[str]): The strings to clean.
+
+	Returns:
+	list[str]: The cleaned strings.
+	"""
+	new_data = []
+	for item in data:
+		new_text = markup_regex.sub("", item.strip())
+		new_text = space_regex.sub(" ", new_text.replace("|", " "))
+		new_data.append(new_text)
+	return new_data
+
+def read_index(path: str, titles: set[str]) -> list[tuple]:
+	"""
+	Reads the multistream index and finds the streams that hold at least one of the titles. A stream ends where the next one in the index starts.
+
+	Parameters:
+	path (str): The index file, bz2 compressed or plain text.
+	titles (set[str]): The wanted titles.
+
+	Returns:
+	list[tuple]: The start offset and the end offset of every stream to read, in dump order. The end of the last stream of the dump is None.
+	"""
+	opener = bz2.open if path.endswith(".bz2") else open
+	blocks = []
+	start = None
+	wanted = False
+	with opener(path, "rt", encoding="utf-8") as index_file:
+		for line in index_file:
+			offset, _, title = line.rstrip("\n").split(":", 2)
+			offset = int(offset)
+			if offset != start:
+				if wanted:
+					blocks.append((start, offset))
+				start = offset
+				wanted = False
+			wanted = wanted or html.unescape(title) in titles
+	if wanted:
+		blocks.append((start, None))
+	return blocks
+
+def init_worker(path: str, titles: set[str]) -> None:
+	"""
+	Opens the dump in an extraction process and keeps the wanted titles.
+	"""
+	global dump_file, gazetteer
+	dump_file = open(path, "rb")
+	gazetteer = titles
+
+def extract_block(block: tuple) -> list[dict]:
+	"""
+	Decompresses one stream of the dump and extracts the infoboxes of its gazetteer pages. This is the unit of work of the extraction processes.
+
+	Parameters:
+	block (tuple): The start and end offset of the stream; the end is None for the last stream.
+
+	Returns:
+	list[dict]: A record with 'title' and 'infobox' for every gazetteer page with infobox fields. A repeated key keeps its last value, as in the Spark job.
+	"""
+	start, end = block
+	dump_file.seek(start)
+	data = dump_file.read(-1 if end is None else end - start)
+	pages = bz2.BZ2Decompressor().decompress(data).decode("utf-8")
+	records = []
+	for page in ET.fromstring("<pages>" + pages + "</pages>").iter("page"):
+		title = page.findtext("title")
+		if title not in gazetteer:
+			continue
+		text = page.findtext("revision/text") or ""
+		fields = infobox_regex.findall(text)
+		if len(fields) == 0:
+			continue
+		records.append({"title": title, "infobox": dict(zip(clean_text([key for key, _ in fields]), clean_text([value for _, value in fields])))})
+	return records
+
+def extract_dump(dump_path: str, index_path: str, titles: set[str], output="spark_output", workers=1) -> int:
+	"""
+	Extracts the infoboxes of the given titles from a multistream dump into `output/part-00000.json`. Earlier part files in `output` are removed, as Spark does in overwrite mode.
+
+	Parameters:
+	dump_path (str): The multistream dump.
+	index_path (str): Its index file.
+	titles (set[str]): The wanted titles.
+	output (str, optional): The output directory. Defaults to "spark_output".
+	workers (int, optional): Number of extraction processes. Defaults to 1.
+
+	Returns:
+	int: The number of records written.
+	"""
+	start = time.time()
+	blocks = read_index(index_path, titles)
+	os.makedirs(output, exist_ok=True)
+	for file in os.listdir(output):
+		if file.startswith("part-") and file.endswith(".json"):
+			os.remove(os.path.join(output, file))
+	count = 0
+	with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(dump_path, titles)) as pool:
+		with open(os.path.join(output, "part-00000.json"), "w", encoding="utf-8") as json_file:
+			for records in pool.map(extract_block, blocks, chunksize=4):
+				for record in records:
+					json_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+					count += 1
+	elapsed = time.time() - start
+	print(f"Read {len(blocks)} streams, wrote {count} records in {elapsed:.1f} s")
+	return count
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Extracts the infoboxes of the gazetteer pages from a Wikipedia multistream dump.")
+	arg_parser.add_argument("--dump", required=True, help="the pages-articles-multistream .xml.bz2 dump")
+	arg_parser.add_argument("--index", required=True, help="the multistream index file of the dump")
+	arg_parser.add_argument("--gazetteer", default="gazetteer.txt", help="file with the titles to extract")
+	arg_parser.add_argument("--output", default="spark_output", help="output directory")
+	arg_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of extraction processes")
+	args = arg_parser.parse_args()
+
+	extract_dump(args.dump, args.index, load_gazetteer(args.gazetteer), args.output, args.workers)
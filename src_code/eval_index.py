@@ -1,12 +1,13 @@
-import lucene, re
-import urllib.request
-import urllib.parse
+import lucene, os, sys, time, argparse, threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 from sklearn.metrics import average_precision_score, recall_score
 
 from java.io import File
 from org.apache.lucene import analysis, document, index, queryparser, search, store, util
+from query_cache import QueryCache
+from ground_truth import DEFAULT_BASE_URL, fetch_counts, save_fixture, load_fixture
 
 assert lucene.getVMEnv() or lucene.initVM()
 
@@ -16,54 +17,76 @@ directory = store.FSDirectory.open(File('dataIndex').toPath())
 
 ireader = index.DirectoryReader.open(directory)
 isearcher = search.IndexSearcher(ireader)
+cache = QueryCache()
+# One QueryParser per thread, QueryParser is not thread-safe
+local = threading.local()
 
 def load_keywords(path="eval_dataset.txt") -> list[str]:
     words = []
     with open(path, "r", encoding='utf-8') as data_file:
         for line in data_file:
             words.append(line.strip())
-    return list(set(words))
+    # Sorted, so the keywords and counts are in the same order on every run
+    return sorted(set(words))
 
-def get_wiki_res(data: list[str]) -> dict:
-    result = {}
-    req_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-    total_regex = r"data-mw-num-results-total=\"(.*?)\""
-    total_count = 0
-    for title in data:
-        web_url = 'https://en.wikivoyage.org/w/index.php?search=intitle:"' + title +\
-        '"&title=Special:Search&profile=advanced&fulltext=1&advancedSearch-current={"fields":{"intitle":"' + title + '"}}&ns0=1'
-        web_url = urllib.parse.quote(web_url, "<>=/:!?&")
-        # print(web_url)
-        req = urllib.request.Request(web_url, headers=req_headers)
-        content = urllib.request.urlopen(req, timeout=5).read().decode('utf-8')
-        try:
-            total_count = int(re.findall(total_regex, content)[0])
-        except:
-            pass
-        result[title] = total_count
-    return result
+def attach_thread() -> None:
+    """
+    Attaches a counting thread to the JVM and creates its QueryParser.
+    """
+    lucene.getVMEnv().attachCurrentThread()
+    local.parser = queryparser.classic.QueryParser("title", analyzer)
+
+def count_hits(title: str) -> int:
+    """
+    Counts the English pages whose title matches a keyword with `IndexSearcher.count`, which only counts the matching documents instead of scoring and collecting them.
+    """
+    query_str = "title:" + title + " AND link:https\\:\\/\\/en.*"
+    # A count does not depend on a number of hits, so counts are cached with limit 0
+    return cache.get_or_compute(ireader.getVersion(), QueryCache.make_key(query_str, 0), lambda: isearcher.count(local.parser.parse(query_str)))
 
-def get_index_res(data: list[str]) -> dict:
-    result = {}
-    parser = queryparser.classic.QueryParser("title", analyzer)
-    # Query index
-    for title in data:
-        query = parser.parse("title:" + title + " AND link:https\\:\\/\\/en.*")
-        hits = isearcher.search(query, 1000000).scoreDocs
-        result[title] = len(hits)
+def get_index_res(data: list[str], threads=8) -> dict:
+    # Query index, the keywords are counted in parallel by JVM-attached threads sharing the searcher
+    with ThreadPoolExecutor(max_workers=threads, initializer=attach_thread) as pool:
+        result = dict(zip(data, pool.map(count_hits, data)))
     return result
 
-keywords = load_keywords()
-wiki_res = get_wiki_res(keywords)
-wiki_count = np.array(list(wiki_res.values())).reshape(-1, 1)
-index_res = get_index_res(keywords)
-index_count = np.array(list(index_res.values())).reshape(-1, 1)
 
-precision = average_precision_score(wiki_count, index_count, average="macro")
-recall = recall_score(wiki_count, index_count, average="macro", zero_division=0.0)
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Compares the hit counts of the index with the search results of Wikivoyage.")
+    arg_parser.add_argument("--threads", type=int, default=8, help="number of threads counting the index hits")
+    arg_parser.add_argument("--fixture", default="eval_ground_truth.json", help="file with the ground-truth counts")
+    arg_parser.add_argument("--refresh", action="store_true", help="fetch the ground truth and rewrite the fixture before evaluating (done once without it when the fixture does not exist)")
+    arg_parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="wiki to fetch the ground truth from, e.g. a local stand-in server")
+    arg_parser.add_argument("--fetch-threads", type=int, default=8, help="number of concurrent requests of --refresh")
+    args = arg_parser.parse_args()
+
+    keywords = load_keywords()
+    # Without a fixture the ground truth is fetched once, as with --refresh; later evaluations run offline from the fixture
+    if args.refresh or not os.path.isfile(args.fixture):
+        if not args.refresh:
+            print(f"{args.fixture} not found, fetching the ground truth from {args.base_url} once")
+        start = time.time()
+        counts, failed = fetch_counts(keywords, args.base_url, args.fetch_threads)
+        print(f"Fetched {len(counts)} keywords from {args.base_url} in {time.time() - start:.2f} s")
+        if len(failed) != 0:
+            sys.exit(f"Could not fetch {len(failed)} keywords, e.g. {failed[0]!r}; {args.fixture} was not written")
+        save_fixture(args.fixture, keywords, counts, args.base_url)
+    try:
+        wiki_res = load_fixture(args.fixture, keywords)
+    except ValueError as error:
+        sys.exit(f"{error}, update it with --refresh")
+    wiki_count = np.array(list(wiki_res.values())).reshape(-1, 1)
+    start = time.time()
+    index_res = get_index_res(keywords, args.threads)
+    print(f"Counted {len(keywords)} keywords in {time.time() - start:.2f} s")
+    index_count = np.array(list(index_res.values())).reshape(-1, 1)
+
+    precision = average_precision_score(wiki_count, index_count, average="macro")
+    recall = recall_score(wiki_count, index_count, average="macro", zero_division=0.0)
 
-print(f"Average precision: {precision * 100} %")
-print(f"Average recall: {recall * 100} %")
+    print(f"Average precision: {precision * 100} %")
+    print(f"Average recall: {recall * 100} %")
+    print(f"Query cache: {cache.stats()}")
 
-ireader.close()
-directory.close()
+    ireader.close()
+    directory.close()
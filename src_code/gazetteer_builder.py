@@ -0,0 +1,182 @@
+import os, heapq, tempfile
+
+"""
+Builds the gazetteer, the list of place names PySpark.py, dump_extractor.py and the gazetteer matcher read, from the titles and geocrumbs of the indexed pages.
+
+Names are normalized with plain string operations and counted in memory until `run_size` distinct names are held; the counts are then written as a sorted run to a temporary directory. `finish` merges the sorted runs, adds up the counts of equal names and writes:
+- gazetteer.txt: the names, one per line, sorted, so every build gives the same file for the same pages and the difference between two builds is a readable diff;
+- gazetteer.tsv: `name<TAB>frequency<TAB>source` lines in the same order, the frequency being the number of title and geocrumb occurrences and the source 'title', 'breadcrumb' or 'title,breadcrumb'.
+Memory use is bounded by `run_size` however many pages are indexed.
+"""
+
+# Suffixes cut off names, the same ones `index_wiki.TITLE_SUFFIX` matches
+SUFFIX_SEPARATORS = (" -", " (", " |", " –", " —")
+SOURCE_TITLE = 1
+SOURCE_BREADCRUMB = 2
+SOURCE_NAMES = {0: "", SOURCE_TITLE: "title", SOURCE_BREADCRUMB: "breadcrumb", SOURCE_TITLE | SOURCE_BREADCRUMB: "title,breadcrumb"}
+SOURCE_BITS = {name: bits for bits, name in SOURCE_NAMES.items()}
+
+def normalize_name(name: str) -> str:
+	"""
+	Removes the suffix of a title or geocrumb that starts with ' -', ' (', ' |', ' –' or ' —', and the newlines.
+
+	This is the result of `re.sub(r"( -.*)|( \\(.*)|( \\|.*)|( –.*)|( —.*)|(\\n)", "", name)` without the regex: every line is cut at its first separator and the lines are joined.
+
+	Parameters:
+	name (str): The title or geocrumb.
+
+	Returns:
+	str: The normalized name.
+	"""
+	parts = []
+	for line in name.split("\n"):
+		cut = len(line)
+		for separator in SUFFIX_SEPARATORS:
+			pos = line.find(separator)
+			if pos != -1 and pos < cut:
+				cut = pos
+		parts.append(line[:cut])
+	return "".join(parts)
+
+def read_run(path: str):
+	"""
+	Streams the `name<TAB>frequency<TAB>source bits` lines of a run.
+
+	Yields:
+	tuple: The name, the frequency and the source bits.
+	"""
+	with open(path, "r", encoding="utf-8") as run_file:
+		for line in run_file:
+			name, count, sources = line.rstrip("\n").split("\t")
+			yield name, int(count), int(sources)
+
+def read_stats(path="gazetteer.tsv"):
+	"""
+	Streams the entries of a gazetteer.tsv written by `GazetteerBuilder.finish`, in their sorted order.
+
+	Parameters:
+	path (str, optional): The file. Defaults to "gazetteer.tsv".
+
+	Yields:
+	tuple: The name, the frequency and the source bits.
+	"""
+	with open(path, "r", encoding="utf-8") as stats_file:
+		for line in stats_file:
+			name, count, source = line.rstrip("\n").split("\t")
+			yield name, int(count), SOURCE_BITS[source]
+
+
+class GazetteerBuilder():
+	"""
+	Counts gazetteer names in bounded memory and writes them sorted, see the module description.
+	"""
+
+	def __init__(self, run_size=100000, tmp_dir=None):
+		"""
+		Creates an empty builder.
+
+		Parameters:
+		run_size (int): Number of distinct names held in memory before they are written as a run. Default is 100000.
+		tmp_dir (str): Directory for the runs. Default is the system temporary directory.
+		"""
+		self.run_size = run_size
+		self.counts = {}
+		self.tmp = tempfile.TemporaryDirectory(prefix="gazetteer_", dir=tmp_dir)
+		self.runs = []
+		self.inputs = []
+
+	def add(self, name: str, source: int, count=1) -> None:
+		"""
+		Counts a normalized name. Empty names are skipped and tabs become spaces, so every name fits on a TSV line.
+
+		Parameters:
+		name (str): The normalized name.
+		source (int): SOURCE_TITLE or SOURCE_BREADCRUMB, or 0 for a name of unknown source.
+		count (int): The number of occurrences. Default is 1.
+		"""
+		if name == "":
+			return
+		if "\t" in name:
+			name = name.replace("\t", " ")
+		entry = self.counts.get(name)
+		if entry is None:
+			self.counts[name] = [count, source]
+			if len(self.counts) >= self.run_size:
+				self.flush()
+		else:
+			entry[0] += count
+			entry[1] |= source
+
+	def add_entries(self, entries: list[tuple]) -> None:
+		"""
+		Counts the (name, source) pairs of a page, as returned by `build_index.gazetteer_entries`.
+		"""
+		for name, source in entries:
+			self.add(name, source)
+
+	def add_sorted(self, entries) -> None:
+		"""
+		Adds entries that are already sorted by name, e.g. `read_stats` of the previous build, as one more input of the merge without loading them.
+
+		Parameters:
+		entries: An iterable of (name, frequency, source bits) tuples sorted by name.
+		"""
+		self.inputs.append(entries)
+
+	def flush(self) -> None:
+		"""
+		Writes the names held in memory as a sorted run and empties the memory.
+		"""
+		path = os.path.join(self.tmp.name, f"run-{len(self.runs):05}.tsv")
+		with open(path, "w", encoding="utf-8") as run_file:
+			for name in sorted(self.counts):
+				count, sources = self.counts[name]
+				run_file.write(f"{name}\t{count}\t{sources}\n")
+		self.runs.append(path)
+		self.counts = {}
+
+	def merged(self):
+		"""
+		Merges the runs, the sorted inputs and the names in memory.
+
+		Yields:
+		tuple: The name, the total frequency and the source bits of every distinct name, sorted by name.
+		"""
+		in_memory = ((name, count, sources) for name, (count, sources) in sorted(self.counts.items()))
+		streams = [read_run(path) for path in self.runs] + self.inputs + [in_memory]
+		current = None
+		for name, count, sources in heapq.merge(*streams, key=lambda entry: entry[0]):
+			if current is not None and current[0] == name:
+				current[1] += count
+				current[2] |= sources
+				continue
+			if current is not None:
+				yield tuple(current)
+			current = [name, count, sources]
+		if current is not None:
+			yield tuple(current)
+
+	def finish(self, path="gazetteer.txt", stats_path="gazetteer.tsv") -> int:
+		"""
+		Writes the sorted gazetteer and its statistics and removes the runs. Both files are replaced only when they are completely written.
+
+		Parameters:
+		path (str): The gazetteer, one name per line. Default is "gazetteer.txt".
+		stats_path (str): The statistics, `name<TAB>frequency<TAB>source` lines. Default is "gazetteer.tsv".
+
+		Returns:
+		int: The number of names.
+		"""
+		num_names = 0
+		with open(path + ".tmp", "w", encoding="utf-8") as gaz_file, open(stats_path + ".tmp", "w", encoding="utf-8") as stats_file:
+			for name, count, sources in self.merged():
+				gaz_file.write(name + "\n")
+				stats_file.write(f"{name}\t{count}\t{SOURCE_NAMES[sources]}\n")
+				num_names += 1
+		os.replace(path + ".tmp", path)
+		os.replace(stats_path + ".tmp", stats_path)
+		self.tmp.cleanup()
+		self.runs = []
+		self.inputs = []
+		self.counts = {}
+		return num_names
@@ -0,0 +1,196 @@
+import os, pickle, hashlib
+
+"""
+Tags the gazetteer place names mentioned in a text.
+
+All names are compiled into one Aho–Corasick automaton over case-folded characters, so a text is scanned once, character by character, however many names there are. A match counts only if it is a whole word sequence, i.e. the characters before and after it are not word characters. Where matches overlap, the leftmost and then the longest wins, so 'New York City' is tagged instead of 'York' inside it.
+
+The tables of the automaton are pickled next to the gazetteer with the digest of the gazetteer it was built from, and `load_matcher` rebuilds it only when the gazetteer changed. Only plain lists and dicts are pickled, not the class, so the pickle loads whatever module path `GazetteerMatcher` was imported under (e.g. `gazetteer_matcher` in src_code/ and `src_code.gazetteer_matcher` in bench_gazetteer.py); a pickle that cannot be loaded is rebuilt.
+"""
+
+# Version of the pickled automaton, pickles of another version are rebuilt
+MATCHER_VERSION = 2
+# The attributes holding the automaton, the contents of the pickle
+TABLES = ("names", "goto", "fail", "out", "out_link")
+
+def is_word_char(char: str) -> bool:
+	"""
+	Returns True for characters the regex \\w matches.
+	"""
+	return char.isalnum() or char == "_"
+
+
+class GazetteerMatcher():
+	"""
+	An Aho–Corasick automaton of case-folded names.
+
+	States are numbered; `goto[state]` maps a character to the next state, `fail[state]` is the state of the longest proper suffix that is also a prefix of a name, and `out[state]` is the length of the longest name ending in the state together with the index of its gazetteer spelling (or None), while `out_link[state]` points to the next state on the fail chain that ends a name.
+	"""
+
+	def __init__(self, names: list[str]):
+		"""
+		Builds the automaton.
+
+		Parameters:
+		names (list[str]): The names. Names that only differ in case are one entry, tagged with their first spelling.
+		"""
+		self.names = []
+		self.goto = [{}]
+		self.out = [None]
+		for name in names:
+			key = name.strip().casefold()
+			if key == "":
+				continue
+			state = 0
+			for char in key:
+				next_state = self.goto[state].get(char)
+				if next_state is None:
+					next_state = len(self.goto)
+					self.goto[state][char] = next_state
+					self.goto.append({})
+					self.out.append(None)
+				state = next_state
+			if self.out[state] is None:
+				self.out[state] = (len(key), len(self.names))
+				self.names.append(name.strip())
+		self.fail = [0] * len(self.goto)
+		self.out_link = [0] * len(self.goto)
+		# Breadth-first, so the fail state of every state is finished before its children
+		level = list(self.goto[0].values())
+		while level:
+			next_level = []
+			for state in level:
+				for char, child in self.goto[state].items():
+					fail = self.fail[state]
+					while fail and char not in self.goto[fail]:
+						fail = self.fail[fail]
+					fail = self.goto[fail].get(char, 0)
+					self.fail[child] = fail
+					self.out_link[child] = fail if self.out[fail] is not None else self.out_link[fail]
+					next_level.append(child)
+			level = next_level
+
+	@classmethod
+	def from_tables(cls, tables: dict) -> "GazetteerMatcher":
+		"""
+		Creates a matcher from the tables of `tables`, without building the automaton again.
+		"""
+		matcher = cls.__new__(cls)
+		for name in TABLES:
+			setattr(matcher, name, tables[name])
+		return matcher
+
+	def tables(self) -> dict:
+		"""
+		Returns the automaton as a dict of plain lists and dicts, see `TABLES`.
+		"""
+		return {name: getattr(self, name) for name in TABLES}
+
+	def __len__(self) -> int:
+		return len(self.names)
+
+	def matches(self, text: str) -> list[tuple]:
+		"""
+		Finds all whole-word occurrences of the names in one pass over the case-folded text.
+
+		Parameters:
+		text (str): The text.
+
+		Returns:
+		list[tuple]: The start, end and name index of every occurrence, overlapping ones included, in order of their end. Positions refer to the case-folded text.
+		"""
+		text = text.casefold()
+		goto = self.goto
+		fail = self.fail
+		out = self.out
+		out_link = self.out_link
+		found = []
+		state = 0
+		end = len(text)
+		for pos, char in enumerate(text):
+			while state and char not in goto[state]:
+				state = fail[state]
+			state = goto[state].get(char, 0)
+			if state == 0:
+				continue
+			match_state = state if out[state] is not None else out_link[state]
+			if match_state == 0 or (pos + 1 < end and is_word_char(text[pos + 1])):
+				continue
+			while match_state:
+				length, name_index = out[match_state]
+				start = pos + 1 - length
+				if start == 0 or not is_word_char(text[start - 1]):
+					found.append((start, pos + 1, name_index))
+				match_state = out_link[match_state]
+		return found
+
+	def find(self, text: str) -> list[str]:
+		"""
+		Returns the gazetteer names mentioned in a text, each once, in order of their first occurrence. Of overlapping occurrences the leftmost one is kept, and of those starting at the same position the longest.
+
+		Parameters:
+		text (str): The text.
+
+		Returns:
+		list[str]: The names, in their gazetteer spelling.
+		"""
+		found = {}
+		covered = 0
+		for start, end, name_index in sorted(self.matches(text), key=lambda match: (match[0], -match[1])):
+			if start < covered:
+				continue
+			covered = end
+			found.setdefault(self.names[name_index], True)
+		return list(found)
+
+	def save(self, path: str, digest="") -> None:
+		"""
+		Pickles the tables of the automaton together with the digest of the gazetteer it was built from.
+		"""
+		with open(path + ".tmp", "wb") as pickle_file:
+			pickle.dump((MATCHER_VERSION, digest, self.tables()), pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(path + ".tmp", path)
+
+
+def gazetteer_digest(path: str) -> str:
+	"""
+	Returns the SHA-1 digest of a gazetteer file.
+	"""
+	with open(path, "rb") as gaz_file:
+		return hashlib.sha1(gaz_file.read()).hexdigest()
+
+def build_matcher(path="gazetteer.txt") -> GazetteerMatcher:
+	"""
+	Builds the automaton of a gazetteer file with one name per line.
+	"""
+	with open(path, "r", encoding="utf-8") as gaz_file:
+		return GazetteerMatcher([line.rstrip("\n") for line in gaz_file])
+
+def load_matcher(path="gazetteer.txt", cache_path=None) -> GazetteerMatcher:
+	"""
+	Loads the pickled automaton of a gazetteer, or builds and pickles it if there is no pickle of the current gazetteer. A pickle that cannot be loaded, e.g. one of an earlier version holding a `GazetteerMatcher` instance, is replaced.
+
+	Parameters:
+	path (str, optional): The gazetteer file. Defaults to "gazetteer.txt".
+	cache_path (str, optional): The pickle. Defaults to the gazetteer path with the extension '.pkl'.
+
+	Returns:
+	GazetteerMatcher: The automaton.
+
+	Raises:
+	FileNotFoundError: If the gazetteer does not exist.
+	"""
+	if cache_path is None:
+		cache_path = os.path.splitext(path)[0] + ".pkl"
+	digest = gazetteer_digest(path)
+	if os.path.isfile(cache_path):
+		try:
+			with open(cache_path, "rb") as pickle_file:
+				version, cached_digest, tables = pickle.load(pickle_file)
+			if version == MATCHER_VERSION and cached_digest == digest:
+				return GazetteerMatcher.from_tables(tables)
+		except (pickle.UnpicklingError, ImportError, AttributeError, EOFError, ValueError):
+			pass
+	matcher = build_matcher(path)
+	matcher.save(cache_path, digest)
+	return matcher
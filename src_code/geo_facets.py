@@ -0,0 +1,90 @@
+import threading
+from org.apache.lucene import facet, index
+
+"""
+Facet counts over the geocrumb hierarchy of the pages.
+
+Every page is indexed with its geocrumbs as one hierarchical path of the SortedSet facet dimension 'geo', e.g. Europe / Czechia / Prague for the page of Prague. The counts live in doc values, so a query collects its top hits and counts the children of any node of the hierarchy in a single pass over the matching documents, without loading stored fields. A drill-down to a path restricts the query to the pages below it and counts the next level, e.g. the countries of Europe or the regions of Czechia.
+
+The ordinals of the facet labels are read once per index version into a SortedSetDocValuesReaderState, which `FacetStateCache` keeps until the index changes.
+"""
+
+FACET_DIM = "geo"
+
+def facets_config():
+	"""
+	Returns the FacetsConfig of the index, with 'geo' as a hierarchical dimension with one path per page.
+	"""
+	config = facet.FacetsConfig()
+	config.setHierarchical(FACET_DIM, True)
+	config.setMultiValued(FACET_DIM, False)
+	return config
+
+def geo_path(categories: list[str]) -> list[str]:
+	"""
+	Returns the facet path of a page from its geocrumbs, skipping empty ones, which a facet path cannot hold.
+	"""
+	return [category.strip() for category in categories if category.strip() != ""]
+
+def parse_path(path_str: str) -> list[str]:
+	"""
+	Splits a path written as 'Europe/Czechia' into its labels. An empty string is the root.
+	"""
+	return [label.strip() for label in path_str.split("/") if label.strip() != ""]
+
+
+class FacetStateCache():
+	"""
+	Keeps the SortedSetDocValuesReaderState of the newest index version. A reader of an older version, from a searcher acquired before a refresh, gets a state that is not kept. Thread-safe.
+	"""
+
+	def __init__(self, config):
+		self.config = config
+		self.version = None
+		self.state = None
+		self.lock = threading.Lock()
+
+	def get(self, reader):
+		"""
+		Returns the facet state of a DirectoryReader.
+		"""
+		version = index.DirectoryReader.cast_(reader).getVersion()
+		with self.lock:
+			if self.version is not None and version == self.version:
+				return self.state
+			if self.version is not None and version < self.version:
+				return facet.sortedset.DefaultSortedSetDocValuesReaderState(reader, self.config)
+			self.state = facet.sortedset.DefaultSortedSetDocValuesReaderState(reader, self.config)
+			self.version = version
+			return self.state
+
+
+def drill_down(isearcher, state, config, query, path=(), top_n=10, limit=0) -> dict:
+	"""
+	Counts the children of a node of the geocrumb hierarchy among the pages matching a query, in one pass that also collects the top hits.
+
+	Parameters:
+	isearcher (IndexSearcher): The searcher.
+	state (SortedSetDocValuesReaderState): The facet state of the searcher's reader, from `FacetStateCache.get`.
+	config (FacetsConfig): The config from `facets_config`.
+	query (Query): The query.
+	path (tuple, optional): The node, e.g. ('Europe', 'Czechia'); the query is restricted to the pages below it. Defaults to (), the continents.
+	top_n (int, optional): Maximum number of children. Defaults to 10.
+	limit (int, optional): Number of top hits to collect. Defaults to 0.
+
+	Returns:
+	dict: The number of matching pages below the node as 'total', the children with their page counts, most pages first, as 'counts', and the top hits as 'top_docs'.
+	"""
+	if len(path) != 0:
+		drill_query = facet.DrillDownQuery(config, query)
+		drill_query.add(FACET_DIM, list(path))
+		query = drill_query
+	collector = facet.FacetsCollector()
+	top_docs = facet.FacetsCollector.search(isearcher, query, max(limit, 1), collector)
+	counts = facet.sortedset.SortedSetDocValuesFacetCounts(state, collector)
+	result = counts.getTopChildren(top_n, FACET_DIM, list(path))
+	children = []
+	if result is not None:
+		for label_value in result.labelValues:
+			children.append((label_value.label, label_value.value.intValue()))
+	return {"total": top_docs.totalHits.value, "counts": children, "top_docs": top_docs if limit > 0 else None}
@@ -1,28 +1,165 @@
-import re, os
-
-heading_regex = "<span class=\"mw-headline\"[^>]*>([^<]*)</span>"
-
-entity_count = {}
-
-web_files = os.listdir("data/")
-# print(web_files)
-
-# Counts occurrences of headings matching a regex in a list of files.
-for web in web_files:
-	txt_file = ""
-	with open(f"data/{web}", "r", encoding="utf-8") as file_content:
-		txt_file = file_content.read()
-		headings = re.findall(heading_regex, txt_file)
-		for heading in headings:
-			if entity_count.get(heading) is not None:
-				entity_count[heading] += 1
-			else:
-				entity_count[heading] = 1
-
-sorted_entity = list(entity_count.items())
-sorted_entity.sort(key=lambda item: item[1], reverse=True)
-
-# Writes occurrences to txt file
-with open("res.txt", "w", encoding="utf-8") as file_res:
-	for i in sorted_entity:
-		file_res.write(str(i) + "\n")
+import re, os, html, json, time, argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from page_store import PageStore
+
+"""
+Heading statistics of the crawled pages: how often every section heading occurs, written as the heading vocabulary `build_index.py --headings` reads.
+
+Pages are read from the page store in chunks by a pool of processes, each counting the headings of its chunk into a `Counter`. The counts of every page are kept in a state file with the store location they were read from, so a later run with `--incremental` only counts pages that are new or were crawled again and drops pages that left the store; the totals are the sum over the state. Only pages of one language wiki (`--language`, by the host of their URL) are counted, which leaves out the headings of the other language editions.
+
+Output: one `heading<TAB>count` line per heading with at least `--min-count` occurrences, the most frequent first.
+
+Usage:
+python get_objects.py [--store store] [--output headings.tsv] [--min-count 1] [--language en] [--workers N] [--incremental] [--state heading_state.jsonl]
+"""
+
+HEADING_REGEX = re.compile(r"<span class=\"mw-headline\"[^>]*>([^<]*)</span>")
+
+# The page store of a worker process, opened by init_worker
+page_store = None
+
+def count_headings(txt_file: str, language="en") -> Counter:
+	"""
+	Counts the headings of a page. Character references are decoded, so the headings match the text `extract_data` splits into sections.
+
+	Parameters:
+	txt_file (str): The page, its URL on the first line.
+	language (str, optional): The language wiki of the pages to count, e.g. 'en' for en.wikivoyage.org; an empty string counts all pages. Defaults to "en".
+
+	Returns:
+	Counter: The number of occurrences of every heading, empty for a page of another language.
+	"""
+	if language != "" and not txt_file.startswith(("https://" + language + ".", "http://" + language + ".")):
+		return Counter()
+	return Counter(html.unescape(heading).strip() for heading in HEADING_REGEX.findall(txt_file))
+
+def init_worker(store_path: str) -> None:
+	"""
+	Opens the page store in a counting process.
+	"""
+	global page_store
+	page_store = PageStore(store_path)
+
+def count_pages(keys: list[str], language: str) -> list[tuple]:
+	"""
+	Counts the headings of a chunk of pages. This is the unit of work of the counting processes.
+
+	Parameters:
+	keys (list[str]): The keys of the pages.
+	language (str): The language wiki of the pages to count.
+
+	Returns:
+	list[tuple]: The key, the store location and the heading counts of every page.
+	"""
+	return [(key, page_store.location(key), count_headings(txt_file, language)) for key, txt_file in page_store.iter_keys(keys)]
+
+def load_state(path="heading_state.jsonl") -> dict:
+	"""
+	Reads the heading counts of the counted pages written by `save_state`.
+
+	Parameters:
+	path (str, optional): The state file. Defaults to "heading_state.jsonl".
+
+	Returns:
+	dict: The store location and the heading counts of every counted page by its key. Empty if the file does not exist.
+	"""
+	state = {}
+	if not os.path.isfile(path):
+		return state
+	with open(path, "r", encoding="utf-8") as state_file:
+		for line in state_file:
+			page = json.loads(line)
+			state[page["key"]] = (page["location"], Counter(page["headings"]))
+	return state
+
+def save_state(state: dict, path="heading_state.jsonl") -> None:
+	"""
+	Writes the heading counts of the counted pages as one JSON object per line. The file is replaced atomically, so an interrupted run leaves the previous state.
+
+	Parameters:
+	state (dict): The store location and the heading counts of every counted page by its key.
+	path (str, optional): The state file. Defaults to "heading_state.jsonl".
+
+	Returns:
+	None: This function does not return anything.
+	"""
+	with open(path + ".tmp", "w", encoding="utf-8") as state_file:
+		for key, (location, headings) in state.items():
+			state_file.write(json.dumps({"key": key, "location": location, "headings": headings}, ensure_ascii=False) + "\n")
+	os.replace(path + ".tmp", path)
+
+def heading_stats(store_path="store", workers=1, chunk_size=256, language="en", incremental=False, state_path="heading_state.jsonl") -> Counter:
+	"""
+	Counts the headings of all pages of the page store.
+
+	Parameters:
+	store_path (str, optional): The page store directory. Defaults to "store".
+	workers (int, optional): Number of counting processes. Defaults to 1, which counts in the main process.
+	chunk_size (int, optional): Number of pages per task. Defaults to 256.
+	language (str, optional): The language wiki of the pages to count. Defaults to "en".
+	incremental (bool, optional): Whether to reuse the counts of the state file for pages that did not change. Defaults to False.
+	state_path (str, optional): The state file. Defaults to "heading_state.jsonl".
+
+	Returns:
+	Counter: The number of occurrences of every heading.
+	"""
+	store = PageStore(store_path)
+	state = load_state(state_path) if incremental else {}
+	for key in [key for key in state if key not in store]:
+		del state[key]
+	# Chunks of pages in store order, so every task reads its pages sequentially
+	changed = sorted((key for key in store.keys() if key not in state or state[key][0] != store.location(key)), key=store.index.get)
+	chunks = [changed[i:i + chunk_size] for i in range(0, len(changed), chunk_size)]
+	if workers < 2:
+		init_worker(store_path)
+		for chunk_result in map(count_pages, chunks, [language] * len(chunks)):
+			for key, location, headings in chunk_result:
+				state[key] = (location, headings)
+	else:
+		with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(store_path,)) as pool:
+			for chunk_result in pool.map(count_pages, chunks, [language] * len(chunks)):
+				for key, location, headings in chunk_result:
+					state[key] = (location, headings)
+	save_state(state, state_path)
+	counts = Counter()
+	for _, headings in state.values():
+		counts.update(headings)
+	print(f"Counted {len(changed)} pages, {len(state) - len(changed)} unchanged, {len(counts)} distinct headings")
+	return counts
+
+def write_vocabulary(counts: Counter, path="headings.tsv", min_count=1) -> int:
+	"""
+	Writes the headings with at least `min_count` occurrences as `heading<TAB>count` lines, the most frequent first and equal counts in alphabetical order.
+
+	Parameters:
+	counts (Counter): The number of occurrences of every heading.
+	path (str, optional): The output file. Defaults to "headings.tsv".
+	min_count (int, optional): The minimal number of occurrences. Defaults to 1.
+
+	Returns:
+	int: The number of written headings.
+	"""
+	headings = sorted((item for item in counts.items() if item[1] >= min_count and item[0] != ""), key=lambda item: (-item[1], item[0]))
+	with open(path, "w", encoding="utf-8") as vocabulary_file:
+		for heading, count in headings:
+			vocabulary_file.write(f"{heading}\t{count}\n")
+	return len(headings)
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Counts the section headings of the crawled pages.")
+	arg_parser.add_argument("--store", default="store", help="page store directory")
+	arg_parser.add_argument("--output", default="headings.tsv", help="heading vocabulary to write")
+	arg_parser.add_argument("--min-count", type=int, default=1, help="minimal number of occurrences of a written heading")
+	arg_parser.add_argument("--language", default="en", help="language wiki of the counted pages, empty for all")
+	arg_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of counting processes (1 counts in the main process)")
+	arg_parser.add_argument("--chunk-size", type=int, default=256, help="number of pages per task")
+	arg_parser.add_argument("--incremental", action="store_true", help="only count new and changed pages")
+	arg_parser.add_argument("--state", default="heading_state.jsonl", help="file with the heading counts of every page")
+	args = arg_parser.parse_args()
+
+	start = time.time()
+	counts = heading_stats(args.store, args.workers, args.chunk_size, args.language, args.incremental, args.state)
+	written = write_vocabulary(counts, args.output, args.min_count)
+	print(f"Wrote {written} headings to {args.output} in {time.time() - start:.1f} s")
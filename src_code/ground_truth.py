@@ -0,0 +1,143 @@
+import re, json, hashlib, threading
+import http.client
+import urllib.parse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Ground truth of the evaluation: the number of Wikivoyage search results for every keyword of eval_dataset.txt.
+
+The counts are fetched once with `fetch_counts` and saved to a versioned JSON fixture, so evaluation runs offline and gives the same numbers every time. The fixture records the keyword set it was built for; if eval_dataset.txt changes, loading fails until the fixture is refreshed. The fixture, eval_ground_truth.json, is not in the repository yet: the first run of eval_index.py fetches the counts from Wikivoyage (it needs network access once) and writes it, and `python eval_index.py --refresh` fetches them again. Once it is committed next to eval_dataset.txt, evaluation runs offline from a fresh checkout.
+
+The counts differ from those the live requests of earlier versions of eval_index.py evaluated against:
+- A search page without a total (no results) counts 0. Earlier versions reused the count of the previous keyword, so a keyword without results got the count of whichever keyword was requested before it.
+- Totals with thousands separators (e.g. '1,234') are parsed. Earlier versions failed to parse them and also reused the previous count.
+- A request that fails is reported and no fixture is written, instead of ending the evaluation.
+Precision and recall computed from a fixture are therefore not comparable with numbers reported by earlier versions.
+"""
+
+# Version of the fixture format, files with another version are rejected
+FIXTURE_VERSION = 1
+DEFAULT_BASE_URL = "https://en.wikivoyage.org"
+
+req_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
+total_regex = re.compile(r"data-mw-num-results-total=\"(.*?)\"")
+
+def dataset_digest(keywords: list[str]) -> str:
+	"""
+	Returns the SHA-1 digest of a keyword set, independent of the order of the keywords.
+	"""
+	return hashlib.sha1("\n".join(sorted(set(keywords))).encode("utf-8")).hexdigest()
+
+def search_path(title: str) -> str:
+	"""
+	Returns the path and query of the advanced 'intitle:' search for a keyword, as eval_index.py requested it.
+	"""
+	path = '/w/index.php?search=intitle:"' + title +\
+	'"&title=Special:Search&profile=advanced&fulltext=1&advancedSearch-current={"fields":{"intitle":"' + title + '"}}&ns0=1'
+	return urllib.parse.quote(path, "<>=/:!?&")
+
+def parse_total(content: str) -> int:
+	"""
+	Returns the total number of results of a search page; a page without results has no total and gives 0.
+	"""
+	total = total_regex.findall(content)
+	if len(total) == 0:
+		return 0
+	return int(total[0].replace(",", ""))
+
+def fetch_counts(keywords: list[str], base_url=DEFAULT_BASE_URL, threads=8, timeout=5.0) -> tuple[dict, list]:
+	"""
+	Fetches the number of search results of every keyword.
+
+	The keywords are fetched by `threads` threads, each keeping one keep-alive connection to the server, so the pool holds at most `threads` connections. A request on a connection the server has closed is retried once on a new connection.
+
+	Parameters:
+	keywords (list[str]): The keywords.
+	base_url (str, optional): Scheme and host of the wiki, e.g. a local stand-in server 'http://127.0.0.1:8000'. Defaults to "https://en.wikivoyage.org".
+	threads (int, optional): Number of concurrent requests. Defaults to 8.
+	timeout (float, optional): Timeout of a request in seconds. Defaults to 5.
+
+	Returns:
+	tuple[dict, list]: The count of every fetched keyword and the keywords that could not be fetched.
+	"""
+	parts = urllib.parse.urlsplit(base_url)
+	connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+	local = threading.local()
+
+	def fetch(title: str):
+		for attempt in range(2):
+			if getattr(local, "connection", None) is None:
+				local.connection = connection_class(parts.netloc, timeout=timeout)
+			try:
+				local.connection.request("GET", parts.path.rstrip("/") + search_path(title), headers=req_headers)
+				response = local.connection.getresponse()
+				content = response.read().decode("utf-8")
+				if response.status != 200:
+					return None
+				return parse_total(content)
+			except (http.client.HTTPException, OSError):
+				local.connection.close()
+				local.connection = None
+		return None
+
+	with ThreadPoolExecutor(max_workers=threads) as pool:
+		results = list(pool.map(fetch, keywords))
+	counts = {}
+	failed = []
+	for title, count in zip(keywords, results):
+		if count is None:
+			failed.append(title)
+		else:
+			counts[title] = count
+	return counts, failed
+
+def save_fixture(path: str, keywords: list[str], counts: dict, base_url=DEFAULT_BASE_URL) -> None:
+	"""
+	Writes the counts to a fixture file together with the format version, the source, the fetch time and the digest of the keyword set.
+
+	Parameters:
+	path (str): The fixture file.
+	keywords (list[str]): The keywords of the dataset.
+	counts (dict): The count of every keyword.
+	base_url (str, optional): The server the counts were fetched from. Defaults to "https://en.wikivoyage.org".
+
+	Returns:
+	None: This function does not return anything.
+	"""
+	fixture = {
+		"version": FIXTURE_VERSION,
+		"source": base_url,
+		"fetched": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+		"dataset": dataset_digest(keywords),
+		"counts": dict(sorted(counts.items())),
+	}
+	with open(path, "w", encoding="utf-8") as fixture_file:
+		json.dump(fixture, fixture_file, ensure_ascii=False, indent=1)
+		fixture_file.write("\n")
+
+def load_fixture(path: str, keywords: list[str]) -> dict:
+	"""
+	Reads the counts of the keywords from a fixture file.
+
+	Parameters:
+	path (str): The fixture file.
+	keywords (list[str]): The keywords of the dataset.
+
+	Returns:
+	dict: The count of every keyword.
+
+	Raises:
+	FileNotFoundError: If the fixture does not exist.
+	ValueError: If the fixture has another format version, was built for another keyword set or misses counts.
+	"""
+	with open(path, "r", encoding="utf-8") as fixture_file:
+		fixture = json.load(fixture_file)
+	if fixture.get("version") != FIXTURE_VERSION:
+		raise ValueError(f"{path} has version {fixture.get('version')}, expected {FIXTURE_VERSION}")
+	if fixture["dataset"] != dataset_digest(keywords):
+		raise ValueError(f"{path} was built for another keyword set")
+	missing = [title for title in keywords if title not in fixture["counts"]]
+	if len(missing) != 0:
+		raise ValueError(f"{path} has no counts for {len(missing)} keywords, e.g. {missing[0]!r}")
+	return {title: fixture["counts"][title] for title in keywords}
@@ -0,0 +1,125 @@
+from html.parser import HTMLParser
+
+# Size of the slices a page is fed to the parser in
+FEED_SIZE = 64 * 1024
+
+
+class PageParser(HTMLParser):
+	"""
+	Extracts the title, the geocrumb categories, the headings and the text of a Wikivoyage page in one streaming pass.
+
+	The page is fed to the parser in slices, so besides the extracted text only the unparsed tail of the current slice is kept in memory. The text is the content of all text nodes in document order, the same text that removing all tags leaves, except that:
+	- character references such as '&amp;' are decoded,
+	- comments and tags that span several lines are removed completely,
+	- the content of scripts, styles and navigation boxes is dropped.
+
+	The '[edit]' links after the headings stay in the text, so sections can be split at them as before.
+	"""
+
+	skipped_tags = frozenset(("script", "style", "noscript", "template"))
+	skipped_classes = frozenset(("navbox", "navbox-inner", "navbox-subgroup"))
+	heading_tags = frozenset(("h1", "h2", "h3", "h4", "h5", "h6"))
+
+	def __init__(self):
+		super().__init__(convert_charrefs=True)
+		self.title = ""
+		self.categories = []
+		self.headings = []
+		self.text = []
+		self.skip_tag = None
+		self.skip_depth = 0
+		self.in_title = False
+		self.crumbs_depth = 0
+		self.bdi = None
+		self.in_bdi = False
+		self.heading = None
+		self.editsection_depth = 0
+
+	def handle_starttag(self, tag: str, attrs: list[tuple]) -> None:
+		if self.skip_tag is not None:
+			if tag == self.skip_tag:
+				self.skip_depth += 1
+			return
+		classes = set()
+		title = None
+		for name, value in attrs:
+			if name == "class" and value:
+				classes.update(value.split())
+			elif name == "title":
+				title = value
+		if tag in self.skipped_tags or not classes.isdisjoint(self.skipped_classes):
+			self.skip_tag = tag
+			self.skip_depth = 1
+			return
+		if tag == "title":
+			self.in_title = True
+		elif tag in self.heading_tags:
+			self.heading = []
+		elif tag == "span":
+			if self.crumbs_depth > 0:
+				self.crumbs_depth += 1
+			elif "ext-geocrumbs-breadcrumbs" in classes:
+				self.crumbs_depth = 1
+			if self.editsection_depth > 0:
+				self.editsection_depth += 1
+			elif "mw-editsection" in classes:
+				self.editsection_depth = 1
+		elif self.crumbs_depth > 0:
+			if tag == "a" and title is not None:
+				self.categories.append(title)
+			elif tag == "bdi":
+				self.in_bdi = True
+				self.bdi = ""
+
+	def handle_endtag(self, tag: str) -> None:
+		if self.skip_tag is not None:
+			if tag == self.skip_tag:
+				self.skip_depth -= 1
+				if self.skip_depth == 0:
+					self.skip_tag = None
+			return
+		if tag == "title":
+			self.in_title = False
+		elif tag in self.heading_tags and self.heading is not None:
+			self.headings.append("".join(self.heading).strip())
+			self.heading = None
+		elif tag == "span":
+			if self.crumbs_depth > 0:
+				self.crumbs_depth -= 1
+			if self.editsection_depth > 0:
+				self.editsection_depth -= 1
+		elif tag == "bdi":
+			self.in_bdi = False
+
+	def handle_data(self, data: str) -> None:
+		if self.skip_tag is not None:
+			return
+		self.text.append(data)
+		if self.in_title:
+			self.title += data
+		if self.in_bdi:
+			self.bdi += data
+		if self.heading is not None and self.editsection_depth == 0:
+			self.heading.append(data)
+
+	def close(self) -> None:
+		super().close()
+		if self.bdi is not None:
+			self.categories.append(self.bdi)
+
+
+def parse_page(data: str) -> PageParser:
+	"""
+	Parses a page in slices of `FEED_SIZE` characters.
+
+	Parameters:
+	data (str): The page HTML.
+
+	Returns:
+	PageParser: The closed parser with the extracted title, categories, headings and text.
+	"""
+	parser = PageParser()
+	for start in range(0, len(data), FEED_SIZE):
+		parser.feed(data[start:start + FEED_SIZE])
+	parser.close()
+	return parser
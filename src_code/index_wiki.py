@@ -1,111 +1,366 @@
-import lucene, os, json, re
+import lucene, os, json, re, time, heapq, argparse, tempfile
 
 from java.io import File
+from java.util import HashSet
 from org.apache.lucene import analysis, document, index, queryparser, search, store, util
+from schema import Schema, index_stores_text
 
-assert lucene.getVMEnv() or lucene.initVM()
+# Lucene objects, set by open_index
+iwriter = None
+ireader = None
+isearcher = None
+schema = None
 
-# Lucene setup
-analyzer = analysis.standard.StandardAnalyzer()
-directory = store.FSDirectory.open(File('dataIndex').toPath())
-config = index.IndexWriterConfig(analyzer)
-iwriter = index.IndexWriter(directory, config)
+# Suffixes removed from titles before joining, the same ones `build_index.get_all_data` removes for the gazetteer
+TITLE_SUFFIX = re.compile(r"( -.*)|( \(.*)|( \|.*)|( –.*)|( —.*)|(\n)")
+WORD = re.compile(r"\w+")
 
-ireader = index.DirectoryReader.open(directory)
-isearcher = search.IndexSearcher(ireader)
+def open_index(path="dataIndex") -> None:
+	"""
+    Starts the JVM, opens the IndexWriter and a reader of the current index, and creates the schema of the index (see schema.py).
+
+    Parameters:
+    path (str, optional): The index directory. Defaults to "dataIndex".
+
+    Returns:
+    None: This function does not return anything.
+    """
+	global iwriter, ireader, isearcher, schema
+	assert lucene.getVMEnv() or lucene.initVM()
+	analyzer = analysis.standard.StandardAnalyzer()
+	directory = store.FSDirectory.open(File(path).toPath())
+	schema = Schema(index_stores_text(directory))
+	config = index.IndexWriterConfig(analyzer)
+	schema.configure(config)
+	iwriter = index.IndexWriter(directory, config)
+
+	ireader = index.DirectoryReader.open(directory)
+	isearcher = search.IndexSearcher(ireader)
+
+def normalize_title(title: str) -> str:
+	"""
+    Brings a Wikivoyage or Wikipedia title to the form used to join them: the suffix after ' -', ' (', ' |', ' –' or ' —' is removed and the remaining words are lowercased and separated by single spaces.
+
+    Parameters:
+    title (str): The title.
+
+    Returns:
+    str: The normalized title, e.g. 'prague' for 'Prague – Travel guide at Wikivoyage'.
+    """
+	return " ".join(WORD.findall(TITLE_SUFFIX.sub("", title).lower()))
+
+def title_tokens(title: str) -> tuple:
+	"""
+    Returns the lowercased words of a whole title, suffix included, as the StandardAnalyzer tokenizes the 'title' field for the phrase queries earlier versions joined with.
+    """
+	return tuple(WORD.findall(title.lower()))
+
+def stable_id(doc_id: str) -> str:
+	"""
+    Returns the id of a page without the '_' prefixes that earlier versions of `insert_wiki_data` added to the ids of merged copies.
+    """
+	return doc_id.lstrip("_")
+
+def map_titles(titles, phrase=False) -> dict:
+	"""
+    Builds the title map of `match_title` from (document number, title) pairs.
+
+    Parameters:
+    titles: An iterable of (document number, title) pairs.
+    phrase (bool, optional): Whether to map every word of the titles instead of the normalized titles. Defaults to False.
+
+    Returns:
+    dict: The list of document numbers of every normalized title, or with `phrase` the words (`title_tokens`) and document number of every title containing a word.
+    """
+	title_map = {}
+	for doc_id, title in titles:
+		if phrase:
+			tokens = title_tokens(title)
+			for token in set(tokens):
+				title_map.setdefault(token, []).append((tokens, doc_id))
+		else:
+			title_map.setdefault(normalize_title(title), []).append(doc_id)
+	return title_map
+
+def load_title_map(phrase=False) -> tuple[dict, dict]:
+	"""
+    Reads the title and id of every live document once and maps the normalized titles to document numbers.
+
+    Only the 'title' and 'id' stored fields are loaded for each document. If the index still holds several documents of a page (merged copies with '_' prefixed ids left by earlier versions), only the most recent copy, the one with the most prefixes, is mapped.
+
+    Parameters:
+    phrase (bool, optional): Whether to map every word of the titles instead, for phrase matching. Defaults to False.
+
+    Returns:
+    tuple[dict, dict]: The title map (see `map_titles`), and the '_' prefixed ids of every page that has such copies, by the document number of its most recent copy.
+    """
+	latest = {}
+	prefixed = {}
+	fields = HashSet()
+	fields.add("title")
+	fields.add("id")
+	live_docs = index.MultiBits.getLiveDocs(ireader)
+	for doc_id in range(ireader.maxDoc()):
+		if live_docs is not None and not live_docs.get(doc_id):
+			continue
+		stored = ireader.document(doc_id, fields)
+		title = stored.get("title")
+		page_id = stored.get("id")
+		if title is None or page_id is None:
+			continue
+		old = latest.get(stable_id(page_id))
+		if old is None or len(page_id) >= len(old[1]):
+			latest[stable_id(page_id)] = (doc_id, page_id, title)
+		if page_id != stable_id(page_id):
+			prefixed.setdefault(stable_id(page_id), set()).add(page_id)
+	legacy = {}
+	for key, (doc_id, _, _) in latest.items():
+		if key in prefixed:
+			legacy[doc_id] = prefixed[key]
+	return map_titles(((doc_id, title) for doc_id, _, title in latest.values()), phrase), legacy
+
+def read_records(path: str):
+	"""
+    Streams the records of all '.json' files of the Spark output directory.
+
+    Parameters:
+    path (str): The Spark output directory.
+
+    Yields:
+    dict: One record, with the Wikipedia 'title' and the infobox fields in 'infobox' (or, in the output of older versions, the keys and values in 'mod_key' and 'mod_val').
+    """
+	for file in sorted(os.listdir(path)):
+		if file.endswith(".json"):
+			with open(os.path.join(path, file), "r", encoding="utf-8") as json_file:
+				for line in json_file:
+					yield json.loads(line)
+
+def record_fields(json_data: dict) -> dict:
+	"""
+    Returns the infobox fields of a record, from the 'infobox' map or, for records written by older versions of the Spark job, from the 'mod_key' and 'mod_val' arrays. A repeated key keeps its last value.
+
+    Parameters:
+    json_data (dict): A Spark output record.
+
+    Returns:
+    dict: The infobox keys and values.
+    """
+	if "infobox" in json_data:
+		return json_data["infobox"]
+	return dict(zip(json_data["mod_key"], json_data["mod_val"]))
+
+def match_title(title: str, title_map: dict, phrase=False) -> list[int]:
+	"""
+    Returns the document numbers of the pages a record title matches.
+
+    By default a record matches the pages with the same normalized title, with one dict lookup. With `phrase` it matches every page whose whole title contains the words of the record title in order, like the phrase query `title:"<record title>"` earlier versions ran: 'Prague' then also matches 'Prague/Old Town' and 'Vienna to Prague'. The candidates are the titles containing the rarest word of the record title.
+
+    Parameters:
+    title (str): The Wikipedia title of the record.
+    title_map (dict): The title map of `map_titles`, built with the same `phrase`.
+    phrase (bool, optional): Whether to match phrases instead of normalized titles. Defaults to False.
+
+    Returns:
+    list[int]: The matched document numbers.
+    """
+	if not phrase:
+		return title_map.get(normalize_title(title), [])
+	tokens = title_tokens(title)
+	if len(tokens) == 0:
+		return []
+	candidates = min((title_map.get(token, []) for token in tokens), key=len)
+	return [doc_id for doc_tokens, doc_id in candidates if any(doc_tokens[i:i + len(tokens)] == tokens for i in range(len(doc_tokens) - len(tokens) + 1))]
 
-# Tokenized field type
-tokenized = document.FieldType()
-tokenized.setStored(True)
-tokenized.setTokenized(True)
-tokenized.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS)
+def write_run(matches: list, path: str) -> str:
+	"""
+    Writes (document number, record number, infobox fields) matches as a run of JSON lines sorted by document number and record number.
 
-tokenized2 = document.FieldType()
-tokenized2.setStored(True)
-tokenized2.setTokenized(True)
-tokenized2.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS_AND_POSITIONS)
+    Returns:
+    str: The path of the run.
+    """
+	matches.sort(key=lambda match: (match[0], match[1]))
+	with open(path, "w", encoding="utf-8") as run_file:
+		for match in matches:
+			run_file.write(json.dumps(match, ensure_ascii=False) + "\n")
+	return path
 
-# Non-tokenized field type
-non_tokenized = document.FieldType()
-non_tokenized.setStored(True)
-non_tokenized.setTokenized(False)
-non_tokenized.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS)
+def read_run(path: str):
+	"""
+    Streams the matches of a run written by `write_run`.
 
-delete_id = []
+    Yields:
+    tuple: The document number, the record number and the infobox fields.
+    """
+	with open(path, "r", encoding="utf-8") as run_file:
+		for line in run_file:
+			doc_id, record, fields = json.loads(line)
+			yield doc_id, record, fields
 
-def insert_wiki_data(path: str) -> None:
+def join_records(records, title_map: dict, run_dir: str, phrase=False, run_size=100000) -> tuple[list, int]:
+	"""
+    Joins infobox records with the indexed documents by title, see `match_title`.
+
+    The matches are held in memory until `run_size` of them are collected and then written to `run_dir` as a run sorted by document number (see `write_run`), so memory use is bounded however many records match. `merge_runs` merges the runs in document order.
+
+    Parameters:
+    records: An iterable of Spark output records.
+    title_map (dict): The title map of `map_titles`, built with the same `phrase`.
+    run_dir (str): The directory of the runs.
+    phrase (bool, optional): Whether to match phrases instead of normalized titles. Defaults to False.
+    run_size (int, optional): Number of matches per run. Defaults to 100000.
+
+    Returns:
+    tuple[list, int]: The paths of the runs and the number of records read.
+    """
+	runs = []
+	matches = []
+	num_records = 0
+	for json_data in records:
+		fields = None
+		for doc_id in match_title(json_data["title"], title_map, phrase):
+			if fields is None:
+				fields = record_fields(json_data)
+			matches.append((doc_id, num_records, fields))
+			if len(matches) >= run_size:
+				runs.append(write_run(matches, os.path.join(run_dir, f"run-{len(runs):05}.jsonl")))
+				matches = []
+		num_records += 1
+	if len(matches) != 0:
+		runs.append(write_run(matches, os.path.join(run_dir, f"run-{len(runs):05}.jsonl")))
+	return runs, num_records
+
+def merge_runs(runs: list, doc_ids=()):
+	"""
+    Merges the runs of `join_records` and yields the matched documents in document order. When several records match the same document, their fields are merged and the value of the first record is kept for a repeated key.
+
+    Parameters:
+    runs (list): The paths of the runs.
+    doc_ids: Sorted document numbers to yield also without a matching record. Defaults to none.
+
+    Yields:
+    tuple: The document number and its infobox fields.
+    """
+	streams = [read_run(path) for path in runs] + [((doc_id, -1, {}) for doc_id in doc_ids)]
+	current = None
+	field_data = {}
+	for doc_id, _, fields in heapq.merge(*streams, key=lambda match: (match[0], match[1])):
+		if doc_id != current:
+			if current is not None:
+				yield current, field_data
+			current = doc_id
+			field_data = {}
+		for key, value in fields.items():
+			field_data.setdefault(key, value)
+	if current is not None:
+		yield current, field_data
+
+def merge_document(old_doc, field_data: dict):
+	"""
+    Rebuilds a stored document with new infobox fields.
+
+    The stored fields are added again with the schema `build_index` indexes them with, so the section fields stay searchable, 'categories' and 'num_cat' get their doc values back and the stored geocrumbs give the 'geo' facet path again. The id loses any '_' prefixes. Infobox keys that are already a field of the document are skipped, so merging the same infobox again gives the same document.
+
+    Parameters:
+    old_doc (Document): The stored document.
+    field_data (dict): The infobox keys and values.
+
+    Returns:
+    Document: The merged document, or None if the document already has all infobox keys and keeps its id.
+    """
+	new_doc = document.Document()
+	old_names = set()
+	categories = []
+	changed = False
+	for field in old_doc.getFields():
+		name = field.name()
+		old_names.add(name)
+		if name == "id":
+			schema.add_field(new_doc, "id", stable_id(field.stringValue()))
+			changed = changed or stable_id(field.stringValue()) != field.stringValue()
+		elif field.numericValue() is not None:
+			# The only stored numbers are the int fields of build_index, e.g. 'num_cat'
+			schema.add_field(new_doc, name, field.numericValue().intValue())
+		else:
+			schema.add_field(new_doc, name, field.stringValue())
+			if name == "categories":
+				categories.append(field.stringValue())
+	schema.add_geo(new_doc, categories)
+	for field_key in field_data:
+		if field_key not in old_names:
+			schema.add_field(new_doc, field_key, field_data[field_key])
+			changed = True
+	if not changed:
+		return None
+	return schema.build(new_doc)
+
+def insert_wiki_data(path: str, commit_every=1000, phrase=False, run_size=100000) -> None:
 	"""
     Processes and inserts Wikipedia data from JSON files into a Lucene index.
 
-    This function reads JSON files from a specified directory and inserts the data into a Lucene index. Each JSON file is expected to contain Wikipedia data. The function parses the JSON data, constructs a new Lucene document for each entry, and adds it to the index. If a document with the same title exists, it updates the existing document with new information.
+    The normalized titles of all indexed documents are read into a map once; the Spark records are then streamed and joined against the map with one dict lookup each, instead of a phrase query and a stored document fetch per record. A record only enriches the page with the same normalized title; earlier versions also enriched every page whose title contains the record title as a phrase, e.g. the district pages 'Prague/Old Town' and itineraries like 'Vienna to Prague' got the infobox of 'Prague'. These pages are no longer matched, so fewer documents are updated; `phrase` restores the old matching (see `match_title`). The matches are written to disk in sorted runs of `run_size` and merged in document order (see `join_records` and `merge_runs`), so memory holds at most `run_size` matches besides the title map. The matched documents are fetched in that order, merged with their infobox fields and replaced in place with `IndexWriter.updateDocument` on their 'id' term, so the index never holds two versions of a page. Documents that already have all their infobox fields are not rewritten, which makes a second run a no-op. Merged copies with '_' prefixed ids left by earlier versions are deleted and the most recent copy of each such page is kept under the stable id. The index is committed every `commit_every` updated documents. Throughput is printed at the end.
 
     Global variables used:
-    - `iwriter`: An IndexWriter object for adding documents to the index.
-    - `isearcher`: An IndexSearcher object for searching existing documents.
-    - `tokenized` and `non_tokenized`: FieldType objects indicating how fields should be indexed.
-    - `delete_id`: A list to track document IDs for deletion.
+    - `iwriter`: An IndexWriter object for updating documents.
+    - `ireader`: An IndexReader of the index before the update; its document numbers stay valid across the commits.
 
     Parameters:
     path (str): The directory path containing the JSON files to be processed.
+    commit_every (int, optional): Number of updated documents between commits. Defaults to 1000.
+    phrase (bool, optional): Whether to match the record titles as phrases of the page titles, as earlier versions did. Defaults to False.
+    run_size (int, optional): Number of matches held in memory before they are written as a run. Defaults to 100000.
 
     Returns:
     None: This function does not return anything.
 
-    Raises:
-    FileNotFoundError: If the specified path is not found or is not a directory.
-
     Example:
     Calling `insert_wiki_data("/path/to/json/files")` will process and index all '.json' files in the specified directory.
     """
-	global iwriter, isearcher, tokenized, non_tokenized, delete_id, tokenized2
 	if not os.path.isdir(path):
 		print("Path not found")
 		return
-	for file in os.listdir(path):
-		if file.endswith(".json"):
-			with open(path + "/" + file, "r", encoding="utf-8") as json_file:
-				for line in json_file:
-					json_data = json.loads(line)
-					field_data = {json_data["mod_key"][i]: json_data["mod_val"][i] for i in range(len(json_data["mod_key"]))}
-					parser = queryparser.classic.QueryParser("title", analyzer)
-					query = re.sub(r"[\+\-&\|!\(\){}\[\]\^\"~\*\?:\\\/]+", "", json_data["title"])
-					query = "title:\"" + query + "\""
-					query = parser.parse(query)
-					hits = isearcher.search(query, 100000).scoreDocs
-					for hit in hits:
-						# print("indexing...")
-						doc_id = hit.doc
-						old_doc = isearcher.doc(doc_id)
-						old_doc_fields = old_doc.getFields()
-						new_doc = document.Document()
-						old_names = []
-						for field in old_doc_fields:
-							old_names.append(field.name())
-							if field.name() == "id":
-								new_doc.add(document.Field("id", "_" + old_doc["id"], non_tokenized))
-								delete_id.append(old_doc["id"])
-							elif field.name() == "link":
-								new_doc.add(document.Field("link", old_doc["link"], non_tokenized))
-							elif field.name() == "title":
-								new_doc.add(document.Field("title", old_doc["title"], tokenized2))
-							elif field.name() == "other":
-								new_doc.add(document.Field("other", old_doc["other"], tokenized))
-							else:
-								new_doc.add(field)
-						for field_key in field_data:
-							if field_key not in old_names:
-								new_doc.add(document.Field(field_key, field_data[field_key], tokenized))
-						# iwriter.updateDocument(index.Term("id", old_doc["id"]), new_doc)
-						iwriter.addDocument(new_doc)
-
-insert_wiki_data("spark_output")
-
-iwriter.commit()
-
-for item in delete_id:
-	iwriter.deleteDocuments(index.Term("id", item))
-
-iwriter.commit()
-
-iwriter.close()
-ireader.close()
+	if not schema.store_text:
+		print("The index does not store the section text, merging would drop it; rebuild it without --no-store-text")
+		return
+	start = time.time()
+	title_map, legacy = load_title_map(phrase)
+	map_time = time.time() - start
+	num_matched = 0
+	updated = 0
+	with tempfile.TemporaryDirectory(prefix="join_") as run_dir:
+		runs, num_records = join_records(read_records(path), title_map, run_dir, phrase, run_size)
+		join_time = time.time() - start - map_time
+		# Pages with merged copies from earlier versions are rewritten under their stable id even without a matching record
+		for doc_id, field_data in merge_runs(runs, sorted(legacy)):
+			if len(field_data) != 0:
+				num_matched += 1
+			old_doc = ireader.document(doc_id)
+			new_doc = merge_document(old_doc, field_data)
+			if new_doc is None:
+				continue
+			for page_id in legacy.get(doc_id, ()):
+				iwriter.deleteDocuments(index.Term("id", page_id))
+			iwriter.updateDocument(index.Term("id", stable_id(old_doc.get("id"))), new_doc)
+			updated += 1
+			if updated % commit_every == 0:
+				iwriter.commit()
+	iwriter.commit()
+	elapsed = time.time() - start
+	print(f"Title map: {len(title_map)} {'words' if phrase else 'titles'} in {map_time:.1f} s")
+	print(f"Joined {num_records} records in {join_time:.1f} s ({num_records / max(join_time, 1e-9):.0f} records/s), {num_matched} documents matched, {updated} updated, {len(legacy)} with '_' copies cleaned up")
+	print(f"Total {elapsed:.1f} s ({num_records / max(elapsed, 1e-9):.0f} records/s)")
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Adds the Wikipedia infoboxes extracted by Spark to the indexed pages with the same title.")
+	arg_parser.add_argument("--input", default="spark_output", help="directory of the Spark output")
+	arg_parser.add_argument("--index", default="dataIndex", help="index directory")
+	arg_parser.add_argument("--commit-every", type=int, default=1000, help="number of updated documents between commits")
+	arg_parser.add_argument("--run-size", type=int, default=100000, help="number of matched records held in memory before they are sorted to disk")
+	arg_parser.add_argument("--match", choices=("exact", "phrase"), default="exact", help="join records with the pages of the same normalized title, or with every page whose title contains the record title (the matching of earlier versions)")
+	args = arg_parser.parse_args()
+
+	open_index(args.index)
+	insert_wiki_data(args.input, args.commit_every, args.match == "phrase", args.run_size)
+
+	iwriter.close()
+	ireader.close()
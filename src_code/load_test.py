@@ -0,0 +1,100 @@
+import json, math, time, argparse, threading
+import urllib.request
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Load test of search_service.py.
+
+`--concurrency` client threads send queries for `--duration` seconds, cycling through the keywords of the evaluation dataset (one query per line, searched in the title field). Latency is measured per request on the client; the report lists throughput (QPS), latency percentiles and the number of failed requests.
+
+Usage:
+python load_test.py [--url http://127.0.0.1:8080/search] [--queries eval_dataset.txt] [--concurrency 8] [--duration 30] [--limit 10]
+"""
+
+
+def load_queries(path="eval_dataset.txt") -> list[str]:
+	"""
+	Loads one query per line, skipping empty lines.
+	"""
+	with open(path, "r", encoding="utf-8") as query_file:
+		return [line.strip() for line in query_file if line.strip() != ""]
+
+def percentile(values: list[float], percent: float) -> float:
+	"""
+	Returns the nearest-rank percentile of sorted values.
+	"""
+	if len(values) == 0:
+		return 0.0
+	rank = max(1, math.ceil(percent / 100 * len(values)))
+	return values[rank - 1]
+
+def client(url: str, queries: list[str], offset: int, limit: int, deadline: float, latencies: list, errors: list, lock: threading.Lock) -> None:
+	"""
+	Sends queries until the deadline and records the latency of every successful request.
+	"""
+	own_latencies = []
+	own_errors = 0
+	i = offset
+	while time.perf_counter() < deadline:
+		query = '"' + queries[i % len(queries)].replace('"', '') + '"'
+		request_url = url + "?" + urllib.parse.urlencode({"q": query, "limit": limit, "fields": "title,link"})
+		start = time.perf_counter()
+		try:
+			with urllib.request.urlopen(request_url, timeout=10) as response:
+				json.loads(response.read())
+			own_latencies.append(time.perf_counter() - start)
+		except Exception:
+			own_errors += 1
+		i += 1
+	with lock:
+		latencies.extend(own_latencies)
+		errors.append(own_errors)
+
+def run_load_test(url: str, queries: list[str], concurrency=8, duration=30.0, limit=10) -> dict:
+	"""
+	Runs the load test and returns the report.
+
+	Parameters:
+	url (str): The search endpoint.
+	queries (list[str]): The queries to cycle through.
+	concurrency (int, optional): Number of client threads. Defaults to 8.
+	duration (float, optional): Seconds to send queries. Defaults to 30.
+	limit (int, optional): Number of hits per query. Defaults to 10.
+
+	Returns:
+	dict: Number of requests and errors, QPS and p50/p90/p99/max latency in milliseconds.
+	"""
+	latencies = []
+	errors = []
+	lock = threading.Lock()
+	start = time.perf_counter()
+	deadline = start + duration
+	with ThreadPoolExecutor(max_workers=concurrency) as pool:
+		for offset in range(concurrency):
+			pool.submit(client, url, queries, offset * len(queries) // concurrency, limit, deadline, latencies, errors, lock)
+	elapsed = time.perf_counter() - start
+	latencies.sort()
+	return {
+		"requests": len(latencies),
+		"errors": sum(errors),
+		"qps": round(len(latencies) / elapsed, 1),
+		"p50_ms": round(percentile(latencies, 50) * 1000, 2),
+		"p90_ms": round(percentile(latencies, 90) * 1000, 2),
+		"p99_ms": round(percentile(latencies, 99) * 1000, 2),
+		"max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+	}
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Load tests the search service.")
+	arg_parser.add_argument("--url", default="http://127.0.0.1:8080/search", help="search endpoint")
+	arg_parser.add_argument("--queries", default="eval_dataset.txt", help="file with one query per line")
+	arg_parser.add_argument("--concurrency", type=int, default=8, help="number of client threads")
+	arg_parser.add_argument("--duration", type=float, default=30.0, help="seconds to send queries")
+	arg_parser.add_argument("--limit", type=int, default=10, help="number of hits per query")
+	args = arg_parser.parse_args()
+
+	report = run_load_test(args.url, load_queries(args.queries), args.concurrency, args.duration, args.limit)
+	print(f"{report['requests']} requests, {report['errors']} errors, {report['qps']} QPS")
+	print(f"latency p50 {report['p50_ms']} ms, p90 {report['p90_ms']} ms, p99 {report['p99_ms']} ms, max {report['max_ms']} ms")
@@ -0,0 +1,327 @@
+import os, sys, gzip, uuid, hashlib
+from datetime import datetime, timezone
+
+# Segment file names, e.g. store/segment-00000.warc.gz and its offset index store/segment-00000.idx
+SEGMENT_NAME = "segment-{:05d}.warc.gz"
+INDEX_NAME = "segment-{:05d}.idx"
+
+
+def page_key(url: str) -> str:
+	"""
+	Returns the key of a page in the store, the MD5 hex digest of its (quoted) URL.
+
+	This is the same name the crawler used for `data/<md5>.txt` files, so keys of converted and newly crawled pages agree.
+
+	Parameters:
+	url (str): The URL of the page as it was fetched.
+
+	Returns:
+	str: The 32 character hex digest.
+	"""
+	return hashlib.md5(url.encode('utf-8')).hexdigest()
+
+
+class PageStore():
+	"""
+	An append-only store of crawled pages in gzip compressed WARC-style segment files.
+
+	Every page is written as one WARC 'resource' record, compressed as its own gzip member, so a record can be decompressed on its own given its offset and length. Segments are rolled over once they exceed `segment_size` bytes. Next to every segment an `.idx` file lists `key<TAB>offset<TAB>length<TAB>url` for each record; the store loads all index files on open and keeps a dict from key to record location.
+
+	When a page is written again (e.g. by a recrawl) the new record is appended and the index points to it; iteration and lookups only return the latest version of each page.
+
+	Pages are returned as the text the crawler used to write to `data/<md5>.txt`: the URL on the first line followed by the page content.
+	"""
+
+	def __init__(self, path="store", mode="r", segment_size=256 * 1024 * 1024):
+		"""
+		Opens a page store.
+
+		Parameters:
+		path (str): The directory of the store. Default is 'store'.
+		mode (str): 'r' to read or 'a' to append pages. Default is 'r'.
+		segment_size (int): Size in bytes after which a new segment is started. Default is 256 MiB.
+
+		Raises:
+		FileNotFoundError: If the store does not exist and mode is 'r'.
+		"""
+		if mode == "a":
+			os.makedirs(path, exist_ok=True)
+		elif not os.path.isdir(path):
+			raise FileNotFoundError(f"Page store not found: {path}")
+		self.path = path
+		self.mode = mode
+		self.segment_size = segment_size
+		self.index = {}
+		self.urls = {}
+		self.readers = {}
+		self.segment_count = 0
+		while os.path.isfile(os.path.join(path, INDEX_NAME.format(self.segment_count))):
+			self.load_index(self.segment_count)
+			self.segment_count += 1
+		self.segment_file = None
+		self.index_file = None
+		if mode == "a":
+			self.open_segment(max(self.segment_count - 1, 0))
+
+	def load_index(self, segment: int) -> None:
+		"""
+		Reads the offset index of one segment. A torn last line left by a crash is ignored.
+
+		Parameters:
+		segment (int): The segment number.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		with open(os.path.join(self.path, INDEX_NAME.format(segment)), "r", encoding="utf-8") as index_file:
+			for line in index_file:
+				if not line.endswith("\n"):
+					break
+				key, offset, length, url = line[:-1].split("\t", 3)
+				self.index[key] = (segment, int(offset), int(length))
+				self.urls[key] = url
+
+	def open_segment(self, segment: int) -> None:
+		"""
+		Opens a segment for appending and cuts off any data written after its last indexed record.
+
+		Parameters:
+		segment (int): The segment number.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		if self.segment_file is not None:
+			self.segment_file.close()
+			self.index_file.close()
+		segment_path = os.path.join(self.path, SEGMENT_NAME.format(segment))
+		index_path = os.path.join(self.path, INDEX_NAME.format(segment))
+		end = 0
+		index_end = 0
+		if os.path.isfile(index_path):
+			with open(index_path, "rb") as index_file:
+				for line in index_file:
+					if not line.endswith(b"\n"):
+						break
+					index_end += len(line)
+					_, offset, length, _ = line.split(b"\t", 3)
+					end = max(end, int(offset) + int(length))
+		self.segment_file = open(segment_path, "r+b" if os.path.isfile(segment_path) else "w+b")
+		self.segment_file.truncate(end)
+		self.segment_file.seek(end)
+		self.index_file = open(index_path, "r+b" if os.path.isfile(index_path) else "w+b")
+		self.index_file.truncate(index_end)
+		self.index_file.seek(index_end)
+		self.segment = segment
+		self.segment_count = max(self.segment_count, segment + 1)
+
+	def write(self, url: str, content: str) -> str:
+		"""
+		Appends a page to the store.
+
+		Parameters:
+		url (str): The URL the page was fetched from.
+		content (str): The decoded page content.
+
+		Returns:
+		str: The key of the page.
+		"""
+		payload = content.encode("utf-8")
+		header = (
+			"WARC/1.0\r\n"
+			"WARC-Type: resource\r\n"
+			f"WARC-Target-URI: {url}\r\n"
+			f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}\r\n"
+			f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+			"Content-Type: text/html; charset=utf-8\r\n"
+			f"Content-Length: {len(payload)}\r\n"
+			"\r\n"
+		).encode("utf-8")
+		record = gzip.compress(header + payload + b"\r\n\r\n")
+		if self.segment_file.tell() > 0 and self.segment_file.tell() + len(record) > self.segment_size:
+			self.open_segment(self.segment + 1)
+		offset = self.segment_file.tell()
+		self.segment_file.write(record)
+		self.segment_file.flush()
+		key = page_key(url)
+		self.index_file.write(f"{key}\t{offset}\t{len(record)}\t{url}\n".encode("utf-8"))
+		self.index_file.flush()
+		self.index[key] = (self.segment, offset, len(record))
+		self.urls[key] = url
+		return key
+
+	@staticmethod
+	def parse_record(record: bytes) -> str:
+		"""
+		Decompresses a record and returns it as '<url>\\n<content>'.
+
+		Parameters:
+		record (bytes): The gzip member of one record.
+
+		Returns:
+		str: The page text in the format of the old `data/<md5>.txt` files.
+		"""
+		data = gzip.decompress(record)
+		header_end = data.index(b"\r\n\r\n")
+		url = ""
+		length = 0
+		for line in data[:header_end].decode("utf-8").split("\r\n"):
+			name, _, value = line.partition(": ")
+			if name == "WARC-Target-URI":
+				url = value
+			elif name == "Content-Length":
+				length = int(value)
+		return url + "\n" + data[header_end + 4:header_end + 4 + length].decode("utf-8")
+
+	def read_record(self, location: tuple) -> str:
+		"""
+		Reads the record at a location returned by the index.
+
+		Parameters:
+		location (tuple): Segment number, offset and length of the record.
+
+		Returns:
+		str: The page text.
+		"""
+		segment, offset, length = location
+		if segment not in self.readers:
+			self.readers[segment] = open(os.path.join(self.path, SEGMENT_NAME.format(segment)), "rb")
+		reader = self.readers[segment]
+		reader.seek(offset)
+		return self.parse_record(reader.read(length))
+
+	def get(self, url: str) -> str:
+		"""
+		Looks up a page by its URL.
+
+		Parameters:
+		url (str): The URL the page was fetched from.
+
+		Returns:
+		str: The page text, or None if the page is not in the store.
+		"""
+		return self.get_by_key(page_key(url))
+
+	def get_by_key(self, key: str) -> str:
+		"""
+		Looks up a page by its key.
+
+		Parameters:
+		key (str): The MD5 key of the page.
+
+		Returns:
+		str: The page text, or None if the page is not in the store.
+		"""
+		location = self.index.get(key)
+		if location is None:
+			return None
+		return self.read_record(location)
+
+	def __contains__(self, key: str) -> bool:
+		return key in self.index
+
+	def __len__(self) -> int:
+		return len(self.index)
+
+	def keys(self) -> list[str]:
+		"""
+		Returns the keys of all pages in the store.
+		"""
+		return list(self.index)
+
+	def location(self, key: str) -> str:
+		"""
+		Returns the location of the latest record of a page as 'segment:offset'. It changes whenever the page is written again.
+
+		Parameters:
+		key (str): The MD5 key of the page.
+
+		Returns:
+		str: The location, or None if the page is not in the store.
+		"""
+		location = self.index.get(key)
+		if location is None:
+			return None
+		return f"{location[0]}:{location[1]}"
+
+	def __iter__(self):
+		"""
+		Streams all pages sequentially, segment by segment, skipping superseded versions.
+
+		Yields:
+		tuple: The key and the page text of each page.
+		"""
+		return self.iter_keys(self.index)
+
+	def iter_keys(self, keys):
+		"""
+		Streams the latest version of the given pages sequentially, segment by segment. Keys that are not in the store are skipped.
+
+		Parameters:
+		keys: An iterable of page keys.
+
+		Yields:
+		tuple: The key and the page text of each page.
+		"""
+		latest = {}
+		for key in keys:
+			if key not in self.index:
+				continue
+			segment, offset, length = self.index[key]
+			latest.setdefault(segment, []).append((offset, length, key))
+		for segment in sorted(latest):
+			with open(os.path.join(self.path, SEGMENT_NAME.format(segment)), "rb") as segment_file:
+				position = 0
+				for offset, length, key in sorted(latest[segment]):
+					if offset != position:
+						segment_file.seek(offset)
+					yield key, self.parse_record(segment_file.read(length))
+					position = offset + length
+
+	def close(self) -> None:
+		"""
+		Closes all open segment and index files.
+
+		Returns:
+		None: This method does not return any value.
+		"""
+		for reader in self.readers.values():
+			reader.close()
+		self.readers = {}
+		if self.segment_file is not None:
+			self.segment_file.close()
+			self.index_file.close()
+			self.segment_file = None
+			self.index_file = None
+
+
+def convert_data_dir(data_dir="data", path="store") -> int:
+	"""
+	Copies all pages of an old `data/` directory of `<md5>.txt` files into a page store.
+
+	Parameters:
+	data_dir (str): The directory with the crawled text files. Default is 'data'.
+	path (str): The directory of the page store. Default is 'store'.
+
+	Returns:
+	int: The number of converted pages.
+	"""
+	page_store = PageStore(path, "a")
+	count = 0
+	for file_name in sorted(os.listdir(data_dir)):
+		if not file_name.endswith(".txt"):
+			continue
+		with open(os.path.join(data_dir, file_name), "r", encoding="utf-8") as page_file:
+			url, _, content = page_file.read().partition("\n")
+		page_store.write(url, content)
+		count += 1
+	page_store.close()
+	return count
+
+
+if __name__ == '__main__':
+	# python page_store.py convert <data dir> <store dir>
+	if len(sys.argv) == 4 and sys.argv[1] == "convert":
+		print(f"Converted {convert_data_dir(sys.argv[2], sys.argv[3])} pages")
+	else:
+		print("Usage: python page_store.py convert <data dir> <store dir>")
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+
+class QueryCache():
+	"""
+	An LRU cache of query results that is emptied when the index changes.
+
+	Entries are keyed on the normalized query string, its default field, the number of hits and the requested fields, and belong to one version of the index reader (`DirectoryReader.getVersion()`). When a lookup comes with a newer version, the index has new commits and all entries are dropped. A lookup with an older version, from a searcher acquired before a refresh, is computed without touching the cache. All methods are thread-safe.
+	"""
+
+	def __init__(self, max_size=1024):
+		"""
+		Creates an empty cache.
+
+		Parameters:
+		max_size (int): Maximum number of cached results. Default is 1024.
+		"""
+		self.max_size = max_size
+		self.entries = OrderedDict()
+		self.version = None
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.invalidations = 0
+
+	@staticmethod
+	def make_key(query_str: str, limit: int, fields=(), field="title") -> tuple:
+		"""
+		Builds the key of a query. Whitespace in the query string is collapsed, so queries that only differ in spacing share an entry.
+
+		Parameters:
+		query_str (str): The query in Lucene query syntax.
+		limit (int): The number of hits.
+		fields (tuple): The returned stored fields.
+		field (str): The default field of the query parser. Default is 'title'.
+
+		Returns:
+		tuple: The key.
+		"""
+		return (field, " ".join(query_str.split()), limit, tuple(fields))
+
+	def get_or_compute(self, version: int, key: tuple, compute):
+		"""
+		Returns the cached result of a query or computes and caches it.
+
+		Parameters:
+		version (int): The version of the index reader the query runs on.
+		key (tuple): The key from `make_key`.
+		compute: A function without arguments that runs the query.
+
+		Returns:
+		The result of `compute` for this key and index version.
+		"""
+		with self.lock:
+			if self.version is None or version > self.version:
+				if self.version is not None:
+					self.invalidations += 1
+				self.entries.clear()
+				self.version = version
+			if version == self.version and key in self.entries:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return self.entries[key]
+			self.misses += 1
+		result = compute()
+		with self.lock:
+			if version == self.version:
+				self.entries[key] = result
+				self.entries.move_to_end(key)
+				while len(self.entries) > self.max_size:
+					self.entries.popitem(last=False)
+		return result
+
+	def clear(self) -> None:
+		"""
+		Drops all entries.
+		"""
+		with self.lock:
+			self.entries.clear()
+
+	def stats(self) -> dict:
+		"""
+		Returns the number of hits, misses and invalidations, the hit rate and the number of entries.
+		"""
+		with self.lock:
+			lookups = self.hits + self.misses
+			return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0, "invalidations": self.invalidations, "size": len(self.entries)}
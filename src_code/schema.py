@@ -0,0 +1,167 @@
+from org.apache.lucene import codecs, document, facet, index, util
+from geo_facets import FACET_DIM, facets_config, geo_path
+
+"""
+The fields of the page index and how they are indexed, stored and given doc values.
+
+field           indexed                     stored                  doc values
+title           text with positions         yes                     -
+link, id        keyword                     yes                     -
+categories      keyword, one per geocrumb   yes                     SortedSet, for faceting
+$facets         -                           -                       SortedSet, the geocrumbs as one 'geo' facet path
+entities        keyword, one per name       yes                     -
+num_cat         IntPoint                    yes                     Numeric, for sorting
+other numbers   IntPoint or FloatPoint      yes                     Numeric for ints
+other, section  text                        unless store_text=False -
+infobox fields  text                        yes                     -
+
+The section fields and 'other' hold most of the text of a page. They are only needed for search, so `store_text=False` indexes them without storing them; index_wiki.py rebuilds documents from their stored fields and cannot merge into such an index. Stored fields are compressed with the BEST_COMPRESSION mode of the default codec. On the synthetic corpus of benchmark.py (see schema_report.json, `python benchmark.py --compare-schemas`) it takes the index from 7.4 to 4.3 MB, but the stored fields of the top hits take about three times as long to load; without stored text the index is 1.7 MB. The doc values add 1.5 % to the size. The 'geo' facet path (see geo_facets.py) is rebuilt from the stored geocrumbs, in their order, and only added with doc values.
+"""
+
+# Commit user data key recording if the large text fields are stored
+STORE_TEXT_KEY = "store_text"
+KEYWORD_FIELDS = frozenset(("link", "id", "categories", "entities"))
+
+def compressed_codec():
+	"""
+	Returns the default codec of the Lucene version in use (e.g. Lucene99Codec) with stored fields in BEST_COMPRESSION mode.
+	"""
+	codec_name = codecs.Codec.getDefault().getName()
+	codec_class = getattr(getattr(codecs, codec_name.lower()), codec_name + "Codec")
+	return codec_class(codec_class.Mode.BEST_COMPRESSION)
+
+def index_stores_text(directory) -> bool:
+	"""
+	Returns whether the latest commit of an index stores the large text fields. Indexes written before the schema recorded it do.
+	"""
+	value = index.SegmentInfos.readLatestCommit(directory).getUserData().get(STORE_TEXT_KEY)
+	return value is None or str(value) == "true"
+
+
+class Schema():
+	"""
+	The field types of the index, created once per process after the JVM is started and frozen, so they are shared by all documents and threads.
+	"""
+
+	def __init__(self, store_text=True, doc_values=True, best_compression=True):
+		"""
+		Creates the field types.
+
+		Parameters:
+		store_text (bool): Whether the section fields and 'other' are stored. Default is True.
+		doc_values (bool): Whether 'categories' and 'num_cat' get doc values and pages the 'geo' facet path. Default is True.
+		best_compression (bool): Whether stored fields use BEST_COMPRESSION instead of the default BEST_SPEED. Default is True.
+		"""
+		self.store_text = store_text
+		self.doc_values = doc_values
+		self.best_compression = best_compression
+		self.facets_config = facets_config()
+
+		self.text = document.FieldType()
+		self.text.setStored(True)
+		self.text.setTokenized(True)
+		self.text.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS)
+		self.text.freeze()
+
+		self.large_text = document.FieldType(self.text)
+		self.large_text.setStored(store_text)
+		self.large_text.freeze()
+
+		self.title = document.FieldType()
+		self.title.setStored(True)
+		self.title.setTokenized(True)
+		self.title.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS_AND_POSITIONS)
+		self.title.freeze()
+
+		self.keyword = document.FieldType()
+		self.keyword.setStored(True)
+		self.keyword.setTokenized(False)
+		self.keyword.setIndexOptions(index.IndexOptions.DOCS_AND_FREQS)
+		self.keyword.freeze()
+
+	def configure(self, config) -> None:
+		"""
+		Sets the codec of an IndexWriterConfig.
+		"""
+		if self.best_compression:
+			config.setCodec(compressed_codec())
+
+	def commit_data(self) -> dict:
+		"""
+		Returns the commit user data describing the schema, see `IndexWriter.setLiveCommitData`.
+		"""
+		return {STORE_TEXT_KEY: str(self.store_text).lower()}
+
+	def add_field(self, doc, name: str, value, large=False) -> None:
+		"""
+		Adds a field to a document with the type of its name.
+
+		Parameters:
+		doc (Document): The document.
+		name (str): The field name.
+		value: The value, a str, an int or a float.
+		large (bool): Whether a text field is a section or 'other', which are stored only with `store_text`. Default is False.
+		"""
+		if type(value) == int:
+			doc.add(document.IntPoint(name, value))
+			doc.add(document.StoredField(name, value))
+			if self.doc_values:
+				doc.add(document.NumericDocValuesField(name, value))
+		elif type(value) == float:
+			doc.add(document.FloatPoint(name, value))
+			doc.add(document.StoredField(name, value))
+		elif name in KEYWORD_FIELDS:
+			doc.add(document.Field(name, value, self.keyword))
+			if name == "categories" and self.doc_values:
+				doc.add(document.SortedSetDocValuesField(name, util.BytesRef(value)))
+		elif name == "title":
+			doc.add(document.Field(name, value, self.title))
+		else:
+			doc.add(document.Field(name, value, self.large_text if large else self.text))
+
+	def add_geo(self, doc, categories: list[str]) -> None:
+		"""
+		Adds the geocrumbs of a page, in their order, as its path of the hierarchical 'geo' facet. Does nothing without doc values or geocrumbs.
+		"""
+		path = geo_path(categories)
+		if self.doc_values and len(path) != 0:
+			doc.add(facet.sortedset.SortedSetDocValuesFacetField(FACET_DIM, path))
+
+	def build(self, doc):
+		"""
+		Returns the document to add to the index, with the facet fields translated to their doc values by the FacetsConfig.
+		"""
+		if self.doc_values:
+			return self.facets_config.build(doc)
+		return doc
+
+	def document(self, data: dict):
+		"""
+		Builds the document of a page from the output of `build_index.extract_data`. Other keys are skipped.
+
+		Parameters:
+		data (dict): The extracted data with the page key as 'id', and optionally the infobox fields of the page to keep as 'infobox'.
+
+		Returns:
+		Document: The document.
+		"""
+		doc = document.Document()
+		for key in data:
+			if key == "categories" or key == "entities":
+				for value in data[key]:
+					self.add_field(doc, key, value)
+				if key == "categories":
+					self.add_geo(doc, data[key])
+			elif key == "paragraphs":
+				for new_key in data[key]:
+					self.add_field(doc, new_key, data[key][new_key], large=True)
+			elif type(data[key]) == int or type(data[key]) == float:
+				self.add_field(doc, key, data[key])
+			elif key == "other":
+				self.add_field(doc, key, data[key], large=True)
+			elif key in ("link", "title", "id"):
+				self.add_field(doc, key, data[key])
+			elif key == "infobox":
+				for field_key in data[key]:
+					self.add_field(doc, field_key, data[key][field_key])
+		return self.build(doc)
@@ -2,6 +2,8 @@ import lucene
 
 from java.io import File
 from org.apache.lucene import analysis, document, index, queryparser, search, store, util
+from query_cache import QueryCache
+from geo_facets import FacetStateCache, drill_down, facets_config, parse_path
 
 assert lucene.getVMEnv() or lucene.initVM()
 
@@ -13,26 +15,91 @@ ireader = index.DirectoryReader.open(directory)
 isearcher = search.IndexSearcher(ireader)
 
 parser = queryparser.classic.QueryParser("title", analyzer)
-# query_str = 'categories:Europe AND link:https\:\/\/en.*' title 10
-# query_str = 'title:slovakia AND link:https\:\/\/en.*' Sleep 1
-# query_str = 'capital:Prague AND link:https\:\/\/en.*' title 1
-# Query index
-while True:
-    query_str = input("Zadaj query: ")
-    number_hits = int(input("Zadaj limit vysledkov: "))
-    query = parser.parse(query_str)
-    hits = isearcher.search(query, number_hits).scoreDocs
-    output_field = input("Vystupne pole: ")
-    # print("Pocet vysledkov:", len(hits))
-    # Iterate through the results:
-    for hit in hits:
-        hitDoc = isearcher.doc(hit.doc)
-        fields = hitDoc.getFields()
-        if output_field == "all_fields":
-            for field in fields:
-                print(field.name())
-        else:
-            print(hitDoc[output_field])
-
-ireader.close()
-directory.close()
+cache = QueryCache()
+facet_config = facets_config()
+facet_states = FacetStateCache(facet_config)
+
+def refresh() -> None:
+	"""
+    Reopens the reader if the index has new commits, so the results (and the cache) follow index updates.
+    """
+	global ireader, isearcher
+	new_reader = index.DirectoryReader.openIfChanged(ireader)
+	if new_reader is not None:
+		ireader.close()
+		ireader = new_reader
+		isearcher = search.IndexSearcher(ireader)
+
+def run_query(query_str: str, number_hits: int, output_field: str) -> list[str]:
+	"""
+    Runs a query and returns the lines to print: the value of `output_field` of every hit, or with 'all_fields' the names of all fields of every hit. Results are cached until the index changes.
+
+    Parameters:
+    query_str (str): The query in Lucene query syntax.
+    number_hits (int): Maximum number of hits.
+    output_field (str): The stored field to print, or 'all_fields'.
+
+    Returns:
+    list[str]: The output lines.
+    """
+	def compute() -> list[str]:
+		query = parser.parse(query_str)
+		hits = isearcher.search(query, number_hits).scoreDocs
+		lines = []
+		# Iterate through the results:
+		for hit in hits:
+			hitDoc = isearcher.doc(hit.doc)
+			if output_field == "all_fields":
+				for field in hitDoc.getFields():
+					lines.append(field.name())
+			else:
+				lines.append(hitDoc[output_field])
+		return lines
+	return cache.get_or_compute(ireader.getVersion(), QueryCache.make_key(query_str, number_hits, (output_field,)), compute)
+
+def run_facets(query_str: str, path_str: str, top_n: int) -> list[str]:
+	"""
+    Counts the pages matching a query below a node of the geocrumb hierarchy by its children, in one search pass (see geo_facets.py), and returns the lines to print: the number of pages below the node, then one 'label<TAB>count' line per child. Results are cached until the index changes.
+
+    Parameters:
+    query_str (str): The query in Lucene query syntax.
+    path_str (str): The node as 'Europe/Czechia', or '' for the continents.
+    top_n (int): Maximum number of children.
+
+    Returns:
+    list[str]: The output lines.
+    """
+	def compute() -> list[str]:
+		path = parse_path(path_str)
+		result = drill_down(isearcher, facet_states.get(ireader), facet_config, parser.parse(query_str), path, top_n)
+		lines = [f"{'/'.join(path) or '/'}: {result['total']}"]
+		for label, count in result["counts"]:
+			lines.append(f"{label}\t{count}")
+		return lines
+	return cache.get_or_compute(ireader.getVersion(), QueryCache.make_key(query_str, top_n, (("facets",) + tuple(parse_path(path_str)),)), compute)
+
+
+if __name__ == '__main__':
+	# query_str = 'categories:Europe AND link:https\:\/\/en.*' title 10
+	# query_str = 'title:slovakia AND link:https\:\/\/en.*' Sleep 1
+	# query_str = 'capital:Prague AND link:https\:\/\/en.*' title 1
+	# query_str = 'link:https\:\/\/en.*' 10 facets Europe -> number of pages per country of Europe
+	# Query index, the query 'cache_stats' prints the hits and misses of the cache, the output field 'facets' counts the hits per geocrumb below a path
+	while True:
+		query_str = input("Zadaj query: ")
+		if query_str == "cache_stats":
+			print(cache.stats())
+			continue
+		number_hits = int(input("Zadaj limit vysledkov: "))
+		output_field = input("Vystupne pole: ")
+		refresh()
+		if output_field == "facets":
+			path_str = input("Zadaj cestu (napr. Europe/Czechia): ")
+			lines = run_facets(query_str, path_str, number_hits)
+		else:
+			lines = run_query(query_str, number_hits, output_field)
+		for line in lines:
+			print(line)
+
+	ireader.close()
+	directory.close()
@@ -0,0 +1,279 @@
+import lucene, json, time, argparse, threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from java.io import File
+from java.util import HashSet
+from org.apache.lucene import analysis, index, queryparser, search, store
+from query_cache import QueryCache
+from geo_facets import FacetStateCache, drill_down, facets_config, parse_path
+
+"""
+HTTP/JSON search service over the index built by build_index.py and index_wiki.py.
+
+Requests are served by a fixed pool of threads attached to the JVM, all searching one shared IndexSearcher obtained from a SearcherManager. A background thread calls `maybeRefresh` periodically, so commits of the indexing scripts become visible without restarting the service.
+
+GET /search?q=<query>[&field=title][&limit=10][&fields=title,link]
+    q       Lucene query syntax, e.g. 'categories:Europe AND link:https\\:\\/\\/en.*'
+    field   default field of the query parser
+    limit   maximum number of hits
+    fields  comma separated stored fields to return; only these are loaded
+
+Response: {"query": ..., "total": <matching documents>, "took_ms": ..., "hits": [{"score": ..., "title": ..., ...}]}. Fields with several values (e.g. 'categories') are returned as lists. Results are cached until the searcher is refreshed to a new index version.
+
+GET /facets?q=<query>[&path=Europe/Czechia][&field=title][&top=10]
+    q       Lucene query syntax
+    path    node of the geocrumb hierarchy, '/' separated; empty for the continents
+    top     maximum number of children
+
+Response: {"query": ..., "path": [...], "total": <matching documents below the node>, "took_ms": ..., "counts": [{"label": ..., "count": ...}]}, the children of the node with their numbers of matching pages, counted in the same search pass that drills down to the node (see geo_facets.py). Cached like searches.
+
+GET /stats
+    hits and misses of the query cache
+
+Usage:
+python search_service.py [--index dataIndex] [--port 8080] [--threads 8] [--refresh 1.0]
+"""
+
+analyzer = None
+manager = None
+facet_config = None
+facet_states = None
+cache = QueryCache()
+# One QueryParser per thread, QueryParser is not thread-safe
+local = threading.local()
+
+def open_manager(path="dataIndex") -> None:
+	"""
+    Starts the JVM and opens a SearcherManager on the index.
+
+    Parameters:
+    path (str, optional): The index directory. Defaults to "dataIndex".
+
+    Returns:
+    None: This function does not return anything.
+    """
+	global analyzer, manager, facet_config, facet_states
+	assert lucene.getVMEnv() or lucene.initVM()
+	analyzer = analysis.standard.StandardAnalyzer()
+	facet_config = facets_config()
+	facet_states = FacetStateCache(facet_config)
+	directory = store.FSDirectory.open(File(path).toPath())
+	manager = search.SearcherManager(directory, search.SearcherFactory())
+
+def attach_thread() -> None:
+	"""
+    Attaches a pool thread to the JVM. Runs once per thread.
+    """
+	lucene.getVMEnv().attachCurrentThread()
+
+def refresh_loop(interval: float, stop: threading.Event) -> None:
+	"""
+    Reopens the searcher when the index has new commits, every `interval` seconds until `stop` is set.
+    """
+	attach_thread()
+	while not stop.wait(interval):
+		manager.maybeRefresh()
+
+def get_parser(field: str):
+	"""
+    Returns the QueryParser of the current thread for a default field.
+    """
+	parsers = getattr(local, "parsers", None)
+	if parsers is None:
+		parsers = local.parsers = {}
+	if field not in parsers:
+		parsers[field] = queryparser.classic.QueryParser(field, analyzer)
+	return parsers[field]
+
+def run_query(query_str: str, field="title", limit=10, fields=("title", "link")) -> dict:
+	"""
+    Runs a query on the current searcher and loads the requested stored fields of the hits. Results are cached per index version.
+
+    Parameters:
+    query_str (str): The query in Lucene query syntax.
+    field (str, optional): The default field of the query. Defaults to "title".
+    limit (int, optional): Maximum number of hits. Defaults to 10.
+    fields (tuple, optional): The stored fields to return. Defaults to ("title", "link").
+
+    Returns:
+    dict: The number of matching documents as 'total' and the hits with their score and fields as 'hits'.
+
+    Raises:
+    ParseException: If the query cannot be parsed.
+    """
+	isearcher = manager.acquire()
+	try:
+		version = index.DirectoryReader.cast_(isearcher.getIndexReader()).getVersion()
+		return cache.get_or_compute(version, QueryCache.make_key(query_str, limit, fields, field), lambda: search_hits(isearcher, query_str, field, limit, fields))
+	finally:
+		manager.release(isearcher)
+
+def search_hits(isearcher, query_str: str, field: str, limit: int, fields: tuple) -> dict:
+	"""
+    Runs a query on a searcher, see `run_query`.
+    """
+	query = get_parser(field).parse(query_str)
+	field_set = HashSet()
+	for name in fields:
+		field_set.add(name)
+	top_docs = isearcher.search(query, limit)
+	hits = []
+	for hit in top_docs.scoreDocs:
+		hit_doc = isearcher.doc(hit.doc, field_set)
+		result = {"score": hit.score}
+		for name in fields:
+			values = list(hit_doc.getValues(name))
+			if len(values) == 1:
+				result[name] = values[0]
+			elif len(values) > 1:
+				result[name] = values
+		hits.append(result)
+	return {"total": top_docs.totalHits.value, "hits": hits}
+
+def run_facets(query_str: str, path_str="", field="title", top_n=10) -> dict:
+	"""
+    Counts the pages matching a query below a node of the geocrumb hierarchy by its children on the current searcher. Results are cached per index version.
+
+    Parameters:
+    query_str (str): The query in Lucene query syntax.
+    path_str (str, optional): The node as 'Europe/Czechia'. Defaults to "", the continents.
+    field (str, optional): The default field of the query. Defaults to "title".
+    top_n (int, optional): Maximum number of children. Defaults to 10.
+
+    Returns:
+    dict: The node as 'path', the number of matching documents below it as 'total' and its children with their counts as 'counts'.
+
+    Raises:
+    ParseException: If the query cannot be parsed.
+    """
+	path = parse_path(path_str)
+	isearcher = manager.acquire()
+	try:
+		version = index.DirectoryReader.cast_(isearcher.getIndexReader()).getVersion()
+		return cache.get_or_compute(version, QueryCache.make_key(query_str, top_n, (("facets",) + tuple(path),), field), lambda: facet_counts(isearcher, query_str, field, path, top_n))
+	finally:
+		manager.release(isearcher)
+
+def facet_counts(isearcher, query_str: str, field: str, path: list[str], top_n: int) -> dict:
+	"""
+    Counts the children of a node on a searcher, see `run_facets`.
+    """
+	query = get_parser(field).parse(query_str)
+	result = drill_down(isearcher, facet_states.get(isearcher.getIndexReader()), facet_config, query, path, top_n)
+	return {"path": path, "total": result["total"], "counts": [{"label": label, "count": count} for label, count in result["counts"]]}
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+	"""
+	Handles GET /search and /facets requests.
+	"""
+
+	def do_GET(self) -> None:
+		url = urllib.parse.urlsplit(self.path)
+		if url.path == "/stats":
+			self.send_json(200, cache.stats())
+			return
+		if url.path != "/search" and url.path != "/facets":
+			self.send_json(404, {"error": "not found"})
+			return
+		params = urllib.parse.parse_qs(url.query)
+		query_str = params.get("q", [""])[0]
+		if query_str == "":
+			self.send_json(400, {"error": "missing parameter q"})
+			return
+		if url.path == "/facets":
+			self.send_facets(query_str, params)
+			return
+		try:
+			limit = int(params.get("limit", ["10"])[0])
+		except ValueError:
+			self.send_json(400, {"error": "limit must be an integer"})
+			return
+		field = params.get("field", ["title"])[0]
+		fields = tuple(name for name in params.get("fields", ["title,link"])[0].split(",") if name != "")
+		start = time.perf_counter()
+		try:
+			result = run_query(query_str, field, limit, fields)
+		except lucene.JavaError as error:
+			self.send_json(400, {"error": str(error.getJavaException())})
+			return
+		self.send_json(200, {"query": query_str, "took_ms": round((time.perf_counter() - start) * 1000, 3), **result})
+
+	def send_facets(self, query_str: str, params: dict) -> None:
+		try:
+			top_n = int(params.get("top", ["10"])[0])
+		except ValueError:
+			self.send_json(400, {"error": "top must be an integer"})
+			return
+		field = params.get("field", ["title"])[0]
+		start = time.perf_counter()
+		try:
+			result = run_facets(query_str, params.get("path", [""])[0], field, top_n)
+		except lucene.JavaError as error:
+			self.send_json(400, {"error": str(error.getJavaException())})
+			return
+		self.send_json(200, {"query": query_str, "took_ms": round((time.perf_counter() - start) * 1000, 3), **result})
+
+	def send_json(self, status: int, data: dict) -> None:
+		body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args) -> None:
+		# Access logs of every request would dominate the cost of short queries
+		pass
+
+
+class PooledHTTPServer(HTTPServer):
+	"""
+	An HTTPServer that handles requests in a fixed pool of JVM-attached threads instead of a new thread per request.
+	"""
+
+	def __init__(self, address: tuple, threads: int):
+		super().__init__(address, SearchHandler)
+		self.pool = ThreadPoolExecutor(max_workers=threads, initializer=attach_thread)
+
+	def process_request(self, request, client_address) -> None:
+		self.pool.submit(self.process_request_thread, request, client_address)
+
+	def process_request_thread(self, request, client_address) -> None:
+		try:
+			self.finish_request(request, client_address)
+		except Exception:
+			self.handle_error(request, client_address)
+		finally:
+			self.shutdown_request(request)
+
+	def server_close(self) -> None:
+		super().server_close()
+		self.pool.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description="Serves searches over the index as JSON.")
+	arg_parser.add_argument("--index", default="dataIndex", help="index directory")
+	arg_parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+	arg_parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+	arg_parser.add_argument("--threads", type=int, default=8, help="number of request threads")
+	arg_parser.add_argument("--refresh", type=float, default=1.0, help="seconds between checks for index commits")
+	args = arg_parser.parse_args()
+
+	open_manager(args.index)
+	stop = threading.Event()
+	refresher = threading.Thread(target=refresh_loop, args=(args.refresh, stop), daemon=True)
+	refresher.start()
+	server = PooledHTTPServer((args.host, args.port), args.threads)
+	print(f"Serving {args.index} on http://{args.host}:{args.port}/search")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		stop.set()
+		server.server_close()
+		manager.close()
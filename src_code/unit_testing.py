@@ -1,6 +1,30 @@
-import unittest
+import unittest, os, re, sys, bz2, json, random, shutil, hashlib, tempfile, threading, time
+import lucene
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from unittest.mock import mock_open, patch
-from build_index import load_objects, extract_data, create_gazetteer, get_all_data
+import build_index
+from build_index import load_objects, load_vocabulary, extract_data, create_gazetteer, get_all_data, split_sections, load_state, save_state, diff_state, changed_pages, load_manifest, consume_manifest
+from page_store import PageStore, convert_data_dir, page_key
+from html_extract import parse_page
+from index_wiki import normalize_title, map_titles, match_title, join_records, merge_runs, stable_id
+from dump_extractor import read_index, extract_dump
+from load_test import percentile
+from query_cache import QueryCache
+from ground_truth import fetch_counts, save_fixture, load_fixture
+from benchmark import make_corpus, compare_runs
+from get_objects import heading_stats, write_vocabulary, count_headings
+from gazetteer_matcher import GazetteerMatcher, load_matcher
+from schema import Schema
+from geo_facets import geo_path, parse_path
+from org.apache.lucene import index
+from gazetteer_builder import GazetteerBuilder, normalize_name, read_stats, SOURCE_TITLE, SOURCE_BREADCRUMB
+
+# The crawler lives in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crawler_Zuzula
+from frontier import Frontier, ScalableBloomFilter
+from link_extractor import LinkExtractor, quote_url
 
 # Mocking the global 'all_objs' variable used in 'extract_data'
 all_objs_mock = ['Object1', 'Object2', 'Object3']
@@ -126,6 +150,692 @@ class TestExtractData(unittest.TestCase):
         self.assertEqual(result['title'], '')
         self.assertEqual(result['link'], '<span>...</span>')
 
+class TestSplitSections(unittest.TestCase):
+    """
+    Unit test class for testing the `split_sections` function against the per-heading regex loop it replaced in `extract_data`.
+
+    Methods:
+    - legacy_split: The regex loop `extract_data` used before, as the reference.
+    - test_wikivoyage_page: Tests a page laid out like a Wikivoyage article.
+    - test_edge_cases: Tests repeated headings, headings that end with a word of another heading and markers after non-word characters.
+    - test_random_pages: Tests random pages built from headings, markers and text fragments.
+    """
+
+    @staticmethod
+    def legacy_split(clean_html, objs):
+        paragraphs = {}
+        rest = clean_html
+        for obj in objs:
+            paragraph = re.findall(f"({obj}\\[edit\\].*?(?=\\w+\\[edit\\]))", clean_html, flags=re.DOTALL)
+            rest = re.sub(f"({obj}\\[edit\\].*?(?=\\w+\\[edit\\]))", "", rest, flags=re.DOTALL)
+            if len(paragraph) >= 1:
+                paragraphs[obj] = re.sub("\n+", "\n", paragraph[0])[:32000]
+        return paragraphs, rest
+
+    def test_wikivoyage_page(self):
+        """
+        Tests `split_sections` with a page laid out like a Wikivoyage article, with the headings in and out of page order.
+
+        Asserts:
+            - The paragraphs and the remaining text equal those of the regex loop.
+            - The sections of the wanted headings are found.
+        """
+        page = "Prague\nIntro text.\n\nUnderstand[edit]\nHistory.\nGet in[edit]\nBy plane[edit]\nAirport.\n\nBy train[edit]\nStation.\nSee[edit]\nCastle.\nDo[edit]\nWalk.\nGo next[edit]\nBrno.\n"
+        for objs in (["Understand", "Get in", "See", "Do", "Go next"], ["Go next", "Do", "By plane", "Understand", "Get in"]):
+            paragraphs, rest = split_sections(page, objs)
+            self.assertEqual((paragraphs, rest), self.legacy_split(page, objs))
+            self.assertEqual(paragraphs["Understand"], "Understand[edit]\nHistory.\nGet ")
+        self.assertEqual(split_sections(page, ["Eat"]), ({}, page))
+
+    def test_edge_cases(self):
+        """
+        Tests `split_sections` with repeated headings, a heading that ends with another heading and markers that follow a non-word character.
+
+        Asserts:
+            The paragraphs and the remaining text equal those of the regex loop.
+        """
+        pages = [
+            "To Do[edit]\na\nDo[edit]\nb\nDo[edit]\nc\nSee[edit]\nd",
+            "Do[edit]\n(x)[edit]\ny\n(z)[edit]See[edit]Do[edit]Do[edit]\n",
+            "Do[edit]Do[edit]Do[edit]\n\n\n",
+            "Do[edit]\nno next heading",
+            "",
+        ]
+        for page in pages:
+            for objs in (["Do", "See"], ["See", "Do", "Do"], ["To Do", "Do"]):
+                self.assertEqual(split_sections(page, objs), self.legacy_split(page, objs))
+
+    def test_random_pages(self):
+        """
+        Tests `split_sections` with random pages built from headings, markers and text fragments.
+
+        Asserts:
+            The paragraphs and the remaining text equal those of the regex loop.
+        """
+        fragments = ["[edit]", "Do", "See", "To Do", "Get in", "in", "\n", "\n\n", " ", "text", ")", "é", "_", "1"]
+        headings = ["Do", "See", "Get in", "Go next", "in"]
+        rng = random.Random(8)
+        for _ in range(2000):
+            page = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 30)))
+            objs = rng.sample(headings, rng.randint(1, len(headings)))
+            self.assertEqual(split_sections(page, objs), self.legacy_split(page, objs))
+
+class TestPageParser(unittest.TestCase):
+    """
+    Unit test class for testing the `PageParser` class through `parse_page`.
+
+    Methods:
+    - setUp: Initializes a page laid out like a Wikivoyage article.
+    - test_page_fields: Tests the extracted title, categories and headings.
+    - test_dropped_content: Tests that scripts, styles and navigation boxes are not in the text.
+    - test_same_text_as_tag_removal: Tests that the text of a page without such content equals the text left by removing the tags.
+    """
+
+    def setUp(self):
+        """
+        Sets up test data used in the test cases.
+        """
+        self.page = (
+            "https://en.wikivoyage.org/wiki/Prague\n<html><head><title>Prague &ndash; Travel guide</title>"
+            "<style>.x{color:red}</style><script>var RLCONF={};</script></head><body>\n"
+            "<span class=\"ext-geocrumbs-breadcrumbs\"><a href=\"/wiki/Europe\" title=\"Europe\">Europe</a> &gt; <a href=\"/wiki/Czechia\" title=\"Czechia\">Czechia</a> &gt; <bdi>Prague</bdi></span>\n"
+            "<h2><span class=\"mw-headline\">Get in</span><span class=\"mw-editsection\"><span>[</span><a href=\"#\">edit</a><span>]</span></span></h2>\n"
+            "<p>By train &amp; bus.</p>\n<div class=\"navbox hlist\"><div>Routes</div><table><tr><td>Brno</td></tr></table></div>\n"
+            "<h2><span class=\"mw-headline\">Go next</span><span class=\"mw-editsection\">[<a href=\"#\">edit</a>]</span></h2>\n<p>Kutna Hora.</p></body></html>"
+        )
+
+    def test_page_fields(self):
+        """
+        Tests the title, categories and headings extracted by `parse_page`.
+
+        Asserts:
+            - The title has its character references decoded.
+            - The categories are the link titles of the geocrumbs followed by the last <bdi>.
+            - The headings do not contain the edit links.
+        """
+        page = parse_page(self.page)
+        self.assertEqual(page.title, "Prague \u2013 Travel guide")
+        self.assertEqual(page.categories, ["Europe", "Czechia", "Prague"])
+        self.assertEqual(page.headings, ["Get in", "Go next"])
+
+    def test_dropped_content(self):
+        """
+        Tests that scripts, styles and navigation boxes are dropped from the text while the edit links stay.
+
+        Asserts:
+            The text is the content of the remaining text nodes.
+        """
+        text = "".join(parse_page(self.page).text)
+        self.assertEqual(text, "https://en.wikivoyage.org/wiki/Prague\nPrague \u2013 Travel guide\nEurope > Czechia > Prague\nGet in[edit]\nBy train & bus.\n\nGo next[edit]\nKutna Hora.")
+
+    def test_same_text_as_tag_removal(self):
+        """
+        Tests that for a page without scripts, styles, navigation boxes and character references, the text equals the text left by removing all tags with a regex.
+
+        Asserts:
+            The text equals the result of `re.sub('<.*?>', '', page)`.
+        """
+        page = "https://en.wikivoyage.org/wiki/Brno\n<html><body><p>Brno <b>is</b> big.</p>\n" + "<li><a href=\"/wiki/X\">X</a> y</li>\n" * 5000 + "</body></html>"
+        self.assertEqual("".join(parse_page(page).text), re.sub('<.*?>', '', page))
+
+class TestJoinRecords(unittest.TestCase):
+    """
+    Unit test class for testing how `index_wiki` joins Wikipedia infobox records with indexed documents by title.
+
+    Methods:
+    - test_normalize_title: Tests that Wikivoyage and Wikipedia titles of the same place get the same key.
+    - test_join_records: Tests the join of records against a title map.
+    - test_phrase_match: Tests exact and phrase matching of record titles.
+    - test_stable_id: Tests that ids of merged copies left by earlier versions map back to the page id.
+    """
+
+    def test_normalize_title(self):
+        """
+        Tests `normalize_title` with a Wikivoyage page title and Wikipedia titles.
+
+        Asserts:
+            The suffixes and punctuation are removed and the words lowercased.
+        """
+        self.assertEqual(normalize_title("Prague – Travel guide at Wikivoyage"), "prague")
+        self.assertEqual(normalize_title("Prague"), "prague")
+        self.assertEqual(normalize_title("São  Paulo (city)"), "são paulo")
+
+    def test_join_records(self):
+        """
+        Tests `join_records` and `merge_runs` with records that match one, several and no documents, with one run and with a run per match.
+
+        Asserts:
+            - Every matched document gets the infobox fields of its records, from the 'infobox' map or the older 'mod_key' and 'mod_val' arrays, with the first value of a key repeated across records.
+            - The documents are merged in document order, also with documents that only have to be rewritten.
+            - All records are counted.
+        """
+        title_map = {"prague": [3], "georgia": [1, 7]}
+        records = [
+            {"title": "Prague", "mod_key": ["population", "area"], "mod_val": ["1300000", "496"]},
+            {"title": "Georgia (country)", "infobox": {"capital": "Tbilisi"}},
+            {"title": "Georgia (U.S. state)", "mod_key": ["capital"], "mod_val": ["Atlanta"]},
+            {"title": "Brno", "mod_key": ["area"], "mod_val": ["230"]},
+        ]
+        for run_size in (100, 1):
+            with tempfile.TemporaryDirectory() as run_dir:
+                runs, num_records = join_records(records, title_map, run_dir, run_size=run_size)
+                self.assertEqual(len(runs), 1 if run_size == 100 else 5)
+                self.assertEqual(num_records, 4)
+                self.assertEqual(list(merge_runs(runs, [2])), [(1, {"capital": "Tbilisi"}), (2, {}), (3, {"population": "1300000", "area": "496"}), (7, {"capital": "Tbilisi"})])
+
+    def test_phrase_match(self):
+        """
+        Tests `match_title` on the title maps of `map_titles` with and without `phrase`.
+
+        Asserts:
+            - Exact matching only finds the page with the same normalized title.
+            - Phrase matching, the matching of earlier versions, also finds the pages whose title contains the record title, and no pages with the words in another order.
+        """
+        titles = [(3, "Prague – Travel guide at Wikivoyage"), (4, "Prague/Old Town – Travel guide at Wikivoyage"), (5, "Vienna to Prague – Travel guide at Wikivoyage"), (6, "Town Old – Travel guide at Wikivoyage"), (7, "Brno – Travel guide at Wikivoyage")]
+        self.assertEqual(match_title("Prague", map_titles(titles)), [3])
+        self.assertEqual(match_title("Old Town", map_titles(titles)), [])
+        self.assertEqual(sorted(match_title("Prague", map_titles(titles, phrase=True), phrase=True)), [3, 4, 5])
+        self.assertEqual(match_title("Old Town", map_titles(titles, phrase=True), phrase=True), [4])
+        self.assertEqual(match_title("Ostrava", map_titles(titles, phrase=True), phrase=True), [])
+
+    def test_stable_id(self):
+        """
+        Tests `stable_id` with page ids with and without '_' prefixes.
+
+        Asserts:
+            All prefixes are removed and other ids are unchanged.
+        """
+        key = page_key("https://en.wikivoyage.org/wiki/Prague")
+        self.assertEqual(stable_id(key), key)
+        self.assertEqual(stable_id("__" + key), key)
+
+class TestDumpExtractor(unittest.TestCase):
+    """
+    Unit test class for testing `dump_extractor` on a small synthetic multistream dump.
+
+    Methods:
+    - setUp: Writes a dump of three streams with an index in a temporary directory.
+    - tearDown: Removes the temporary directory.
+    - test_read_index: Tests that only the streams with gazetteer titles are selected.
+    - test_extract_dump: Tests the extracted records.
+    """
+
+    def setUp(self):
+        """
+        Writes a multistream dump with a header stream, three streams of two pages and a footer stream, and its bz2 compressed index.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dump_path = os.path.join(self.tmp_dir.name, "dump.xml.bz2")
+        self.index_path = os.path.join(self.tmp_dir.name, "index.txt.bz2")
+        streams = [
+            [("Prague", "{{Infobox settlement\n| name = Prague\n| population_total = 1,357,326\n| leader_name = [[Bohuslav Svoboda]]\n}}"), ("Zlin", "No infobox.")],
+            [("Brno", "{{Infobox settlement\n|name=Brno\n}}"), ("Plzen", "{{Infobox settlement\n|name=Plzen\n}}")],
+            [("AT&amp;T", "{{Infobox company\n|type=Public\n}}"), ("Ostrava", "Text")],
+        ]
+        index_lines = []
+        with open(self.dump_path, "wb") as dump_file:
+            dump_file.write(bz2.compress(b"<mediawiki>\n<siteinfo></siteinfo>\n"))
+            page_id = 1
+            for stream in streams:
+                offset = dump_file.tell()
+                pages = ""
+                for title, text in stream:
+                    pages += f"<page>\n<title>{title}</title>\n<id>{page_id}</id>\n<revision><text xml:space=\"preserve\">{text}</text></revision>\n</page>\n"
+                    index_lines.append(f"{offset}:{page_id}:{title}\n")
+                    page_id += 1
+                dump_file.write(bz2.compress(pages.encode("utf-8")))
+            dump_file.write(bz2.compress(b"</mediawiki>\n"))
+        with bz2.open(self.index_path, "wt", encoding="utf-8") as index_file:
+            index_file.writelines(index_lines)
+        self.offsets = sorted({int(line.split(":")[0]) for line in index_lines})
+
+    def tearDown(self):
+        """
+        Removes the temporary directory.
+        """
+        self.tmp_dir.cleanup()
+
+    def test_read_index(self):
+        """
+        Tests `read_index` with titles in the first and last stream.
+
+        Asserts:
+            The first and last streams are selected with their end offsets; the last one reads to the end of the file.
+        """
+        self.assertEqual(read_index(self.index_path, {"Prague", "AT&T", "Vienna"}), [(self.offsets[0], self.offsets[1]), (self.offsets[2], None)])
+        self.assertEqual(read_index(self.index_path, set()), [])
+
+    def test_extract_dump(self):
+        """
+        Tests `extract_dump` with gazetteer titles with and without an infobox.
+
+        Asserts:
+            - Pages without infobox fields and pages not in the gazetteer are skipped.
+            - Keys and values are cleaned and the records have the format of the Spark output.
+        """
+        output = os.path.join(self.tmp_dir.name, "spark_output")
+        self.assertEqual(extract_dump(self.dump_path, self.index_path, {"Prague", "Zlin", "AT&T"}, output, 2), 2)
+        with open(os.path.join(output, "part-00000.json"), "r", encoding="utf-8") as json_file:
+            records = [json.loads(line) for line in json_file]
+        self.assertEqual(records, [
+            {"title": "Prague", "infobox": {"name": "Prague", "population_total": "1,357,326", "leader_name": "Bohuslav Svoboda"}},
+            {"title": "AT&T", "infobox": {"type": "Public"}},
+        ])
+
+class TestPercentile(unittest.TestCase):
+    """
+    Unit test class for testing the `percentile` function of the load test.
+
+    Methods:
+    - test_nearest_rank: Tests percentiles of a list of latencies.
+    """
+
+    def test_nearest_rank(self):
+        """
+        Tests `percentile` with 100 sorted values and with no values.
+
+        Asserts:
+            The nearest-rank percentiles are returned and an empty list gives 0.
+        """
+        values = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 0.05)
+        self.assertEqual(percentile(values, 99), 0.099)
+        self.assertEqual(percentile(values, 100), 0.1)
+        self.assertEqual(percentile([0.2], 1), 0.2)
+        self.assertEqual(percentile([], 50), 0.0)
+
+class TestQueryCache(unittest.TestCase):
+    """
+    Unit test class for testing the `QueryCache` class.
+
+    Methods:
+    - test_hits_and_eviction: Tests cache hits, key normalization and LRU eviction.
+    - test_invalidation: Tests that a new index version empties the cache and an old one bypasses it.
+    """
+
+    def test_hits_and_eviction(self):
+        """
+        Tests repeated lookups in a cache of two entries.
+
+        Asserts:
+            - A repeated query, also with different spacing, is not computed again.
+            - The least recently used entry is evicted first.
+            - The stats count hits and misses.
+        """
+        cache = QueryCache(max_size=2)
+        calls = []
+        def lookup(query_str):
+            return cache.get_or_compute(1, QueryCache.make_key(query_str, 10), lambda: calls.append(query_str) or query_str.upper())
+        self.assertEqual(lookup("categories:Europe"), "CATEGORIES:EUROPE")
+        self.assertEqual(lookup("categories:Europe  "), "CATEGORIES:EUROPE")
+        lookup("capital:Prague")
+        lookup("categories:Europe")
+        lookup("title:Brno")
+        lookup("capital:Prague")
+        self.assertEqual(calls, ["categories:Europe", "capital:Prague", "title:Brno", "capital:Prague"])
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 4, "hit_rate": 0.333, "invalidations": 0, "size": 2})
+
+    def test_invalidation(self):
+        """
+        Tests lookups with a newer and an older index version.
+
+        Asserts:
+            - A newer version drops all entries.
+            - A lookup with an older version is computed and not cached.
+        """
+        cache = QueryCache()
+        key = QueryCache.make_key("title:Prague", 10, ("title",))
+        self.assertEqual(cache.get_or_compute(1, key, lambda: 1), 1)
+        self.assertEqual(cache.get_or_compute(1, key, lambda: 2), 1)
+        self.assertEqual(cache.get_or_compute(2, key, lambda: 3), 3)
+        self.assertEqual(cache.get_or_compute(1, key, lambda: 4), 4)
+        self.assertEqual(cache.get_or_compute(2, key, lambda: 5), 3)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+class TestGroundTruth(unittest.TestCase):
+    """
+    Unit test class for testing the ground-truth fixture of the evaluation.
+
+    Methods:
+    - test_refresh_and_load: Tests fetching counts from a stand-in server and reading them back from the fixture.
+    """
+
+    def test_refresh_and_load(self):
+        """
+        Tests `fetch_counts`, `save_fixture` and `load_fixture` against a local server answering like the Wikivoyage search.
+
+        Asserts:
+            - Totals with thousands separators are parsed and a page without a total counts 0.
+            - Keywords answered with an error are reported as failed.
+            - The fixture returns the counts in keyword order and is rejected for another keyword set.
+        """
+        totals = {"Prague": "1,234", "Brno": "12"}
+        class StandIn(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def do_GET(self):
+                title = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)["search"][0][len('intitle:"'):-1]
+                if title == "Broken":
+                    self.send_response(500)
+                    body = b""
+                else:
+                    self.send_response(200)
+                    body = (f'<div data-mw-num-results-total="{totals[title]}"></div>' if title in totals else "<p>No results</p>").encode("utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            counts, failed = fetch_counts(["Prague", "Brno", "Nowhere", "Broken"], base_url, threads=2)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(counts, {"Prague": 1234, "Brno": 12, "Nowhere": 0})
+        self.assertEqual(failed, ["Broken"])
+        keywords = ["Prague", "Brno", "Nowhere"]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "eval_ground_truth.json")
+            save_fixture(path, keywords, counts, base_url)
+            self.assertEqual(list(load_fixture(path, keywords).items()), [("Prague", 1234), ("Brno", 12), ("Nowhere", 0)])
+            with self.assertRaises(ValueError):
+                load_fixture(path, keywords + ["Broken"])
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Unit test class for testing the synthetic corpus and the run comparison of the benchmark.
+
+    Methods:
+    - test_corpus: Tests that the corpus is reproducible and parses like Wikivoyage pages.
+    - test_compare_runs: Tests the comparison of two runs.
+    """
+
+    def test_corpus(self):
+        """
+        Tests `make_corpus` with a fixed seed.
+
+        Asserts:
+            - The same seed gives the same pages and records.
+            - `extract_data` finds the title, the geocrumbs ending with the page and wanted sections.
+        """
+        pages, records = make_corpus(20, seed=3)
+        self.assertEqual((pages, records), make_corpus(20, seed=3))
+        self.assertEqual(len(pages), 20)
+        self.assertTrue(0 < len(records) < 20)
+        for url, page in pages:
+            ex_data = extract_data(page)
+            title = url.rsplit("/", 1)[1]
+            self.assertEqual(ex_data["title"], title + " \u2013 Travel guide at Wikivoyage")
+            self.assertEqual(ex_data["link"], url)
+            self.assertEqual(ex_data["categories"][-1], title)
+            self.assertNotEqual(ex_data["paragraphs"], {})
+
+    def test_compare_runs(self):
+        """
+        Tests `compare_runs` with and without a previous run.
+
+        Asserts:
+            The relative change of the throughput is reported only for stages of the previous run.
+        """
+        previous = {"commit": "abc123", "stages": {"links": {"items_per_s": 100.0}}}
+        current = {"commit": "def456", "stages": {"links": {"items_per_s": 150.0}, "search": {"items_per_s": 20.0}}}
+        lines = compare_runs(previous, current)
+        self.assertIn("(was 100.0 at abc123, +50.0 %)", lines[0])
+        self.assertNotIn("was", lines[1])
+        self.assertNotIn("was", compare_runs(None, current)[0])
+
+class TestHeadingStats(unittest.TestCase):
+    """
+    Unit test class for testing the heading statistics of `get_objects.py` and the vocabulary loading of `build_index`.
+
+    Methods:
+    - test_incremental_counts: Tests full and incremental counts over a page store.
+    - test_vocabulary_cutoff: Tests writing and loading the vocabulary with a minimal count.
+    """
+
+    def test_incremental_counts(self):
+        """
+        Tests `heading_stats` on a page store that gets a new page, a recrawled page and a page of another language.
+
+        Asserts:
+            - Headings are counted per occurrence, with character references decoded.
+            - Pages of other language wikis are not counted.
+            - An incremental run only reads new and changed pages and gives the same totals as a full run.
+        """
+        def heading(text):
+            return f'<h2><span class="mw-headline" id="x">{text}</span></h2>'
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "store")
+            state_path = os.path.join(tmp, "state.jsonl")
+            page_store = PageStore(path, "a")
+            page_store.write("https://en.wikivoyage.org/wiki/Prague", heading("Get in") + heading("Eat &amp; drink") + heading("Get in"))
+            page_store.write("https://pl.wikivoyage.org/wiki/Praga", heading("Dojazd"))
+            page_store.close()
+            counts = heading_stats(path, state_path=state_path)
+            self.assertEqual(counts, {"Get in": 2, "Eat & drink": 1})
+            page_store = PageStore(path, "a")
+            page_store.write("https://en.wikivoyage.org/wiki/Brno", heading("Get in") + heading("See"))
+            page_store.write("https://en.wikivoyage.org/wiki/Prague", heading("Get in"))
+            page_store.close()
+            with patch("get_objects.count_headings", wraps=count_headings) as counter:
+                counts = heading_stats(path, incremental=True, state_path=state_path)
+            self.assertEqual(counter.call_count, 2)
+            self.assertEqual(counts, {"Get in": 2, "See": 1})
+            self.assertEqual(counts, heading_stats(path, state_path=state_path))
+
+    def test_vocabulary_cutoff(self):
+        """
+        Tests `write_vocabulary` and `load_vocabulary` with minimal counts.
+
+        Asserts:
+            - Headings are written by descending count, equal counts alphabetically.
+            - Headings under the minimal count are left out when writing and when loading.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "headings.tsv")
+            self.assertEqual(write_vocabulary({"See": 5, "Do": 5, "Get in": 9, "Rare": 1}, path, min_count=2), 3)
+            with open(path, "r", encoding="utf-8") as vocabulary_file:
+                self.assertEqual(vocabulary_file.read(), "Get in\t9\nDo\t5\nSee\t5\n")
+            self.assertEqual(load_vocabulary(path), ["Get in", "Do", "See"])
+            self.assertEqual(load_vocabulary(path, min_count=6), ["Get in"])
+
+class TestGazetteerMatcher(unittest.TestCase):
+    """
+    Unit test class for testing the `GazetteerMatcher` class and its pickle.
+
+    Methods:
+    - test_find: Tests word boundaries, case folding and overlapping names.
+    - test_pickle_cache: Tests that the pickle is used until the gazetteer changes.
+    - test_foreign_pickle: Tests that pickles that cannot be loaded are rebuilt.
+    - test_extract_data_entities: Tests that `extract_data` tags entities only with a loaded matcher.
+    """
+
+    def test_find(self):
+        """
+        Tests `find` on a text with names in different case, inside other words and overlapping.
+
+        Asserts:
+            - Names are found case-insensitively and returned once in their gazetteer spelling.
+            - Names inside longer words are not found.
+            - Of overlapping names the longest one starting first is kept.
+        """
+        matcher = GazetteerMatcher(["York", "New York City", "New York", "Bern", "Ústí nad Labem", "ústí nad labem"])
+        self.assertEqual(len(matcher), 5)
+        text = "From NEW YORK CITY to York, not Berne or Bernese, then bern and ústí nad labem; York again."
+        self.assertEqual(matcher.find(text), ["New York City", "York", "Bern", "Ústí nad Labem"])
+        self.assertEqual(matcher.find("New Yorker"), [])
+        self.assertEqual(matcher.find(""), [])
+
+    def test_pickle_cache(self):
+        """
+        Tests `load_matcher` with an unchanged and a changed gazetteer.
+
+        Asserts:
+            - The second load returns the pickled automaton.
+            - A changed gazetteer is built again.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "gazetteer.txt")
+            with open(path, "w", encoding="utf-8") as gaz_file:
+                gaz_file.write("Prague\nBrno\n")
+            self.assertEqual(load_matcher(path).find("Brno and Prague"), ["Brno", "Prague"])
+            self.assertTrue(os.path.isfile(os.path.join(tmp, "gazetteer.pkl")))
+            with patch("gazetteer_matcher.build_matcher") as build:
+                self.assertEqual(len(load_matcher(path)), 2)
+                build.assert_not_called()
+            with open(path, "a", encoding="utf-8") as gaz_file:
+                gaz_file.write("Olomouc\n")
+            self.assertEqual(load_matcher(path).find("Olomouc"), ["Olomouc"])
+
+    def test_foreign_pickle(self):
+        """
+        Tests `load_matcher` with pickles it cannot load, such as one of an earlier version holding the class under another module path.
+
+        Asserts:
+            - The pickle does not refer to the module of the class.
+            - A pickle referring to a missing module, and a truncated one, are rebuilt.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "gazetteer.txt")
+            cache_path = os.path.join(tmp, "gazetteer.pkl")
+            with open(path, "w", encoding="utf-8") as gaz_file:
+                gaz_file.write("Prague\nBrno\n")
+            load_matcher(path)
+            with open(cache_path, "rb") as pickle_file:
+                self.assertNotIn(b"gazetteer_matcher", pickle_file.read())
+            for data in (b"\x80\x04cno_such_package.gazetteer_matcher\nGazetteerMatcher\n.", b"\x80\x04"):
+                with open(cache_path, "wb") as pickle_file:
+                    pickle_file.write(data)
+                self.assertEqual(load_matcher(path).find("Brno"), ["Brno"])
+
+    def test_extract_data_entities(self):
+        """
+        Tests `extract_data` with and without a matcher.
+
+        Asserts:
+            The 'entities' key is only present with a matcher and lists the names of the sections and the remaining text.
+        """
+        page = "https://en.wikivoyage.org/wiki/Prague\n<title>Prague</title><p>Trains to Brno.</p><h2><span class=\"mw-headline\">Object1</span>[edit]</h2><p>Buses to Vienna.</p><h2>Next[edit]</h2>"
+        with patch("build_index.all_objs", all_objs_mock):
+            self.assertNotIn("entities", extract_data(page))
+            with patch("build_index.matcher", GazetteerMatcher(["Brno", "Vienna", "Berlin"])):
+                self.assertEqual(extract_data(page)["entities"], ["Vienna", "Brno"])
+
+class TestGazetteerBuilder(unittest.TestCase):
+    """
+    Unit test class for testing the `GazetteerBuilder` class and `normalize_name`.
+
+    Methods:
+    - test_normalize_name: Tests that names are cut like with the old regex.
+    - test_merged_runs: Tests counts, sources and order of a build that spills runs to disk, and merging it into a later build.
+    """
+
+    def test_normalize_name(self):
+        """
+        Tests `normalize_name` against `re.sub` with the regex `get_all_data` used before.
+
+        Asserts:
+            The results are equal for titles with separators and newlines.
+        """
+        regex = r"( -.*)|( \(.*)|( \|.*)|( –.*)|( —.*)|(\n)"
+        for name in ["Prague \u2013 Travel guide", "Bratislava (city) - x", "A | B", "Line one -x\nline (two)", "New\nYork", "Plain", "", "x —y (z"]:
+            self.assertEqual(normalize_name(name), re.sub(regex, "", name))
+
+    def test_merged_runs(self):
+        """
+        Tests a build with two names per run and a second build seeded with the statistics of the first.
+
+        Asserts:
+            - The gazetteer is sorted and every name appears once.
+            - Frequencies are added up across runs and sources are combined.
+            - The seeded build adds its counts to those of the previous build.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "gazetteer.txt")
+            stats_path = os.path.join(tmp, "gazetteer.tsv")
+            builder = GazetteerBuilder(run_size=2, tmp_dir=tmp)
+            builder.add_entries([("Prague", SOURCE_TITLE), ("Europe", SOURCE_BREADCRUMB), ("Czechia", SOURCE_BREADCRUMB)])
+            builder.add_entries([("Brno", SOURCE_TITLE), ("Europe", SOURCE_BREADCRUMB), ("Czechia", SOURCE_BREADCRUMB), ("", SOURCE_TITLE)])
+            builder.add_entries([("Czechia", SOURCE_TITLE), ("Europe", SOURCE_BREADCRUMB)])
+            self.assertEqual(builder.finish(path, stats_path), 4)
+            with open(path, "r", encoding="utf-8") as gaz_file:
+                self.assertEqual(gaz_file.read(), "Brno\nCzechia\nEurope\nPrague\n")
+            with open(stats_path, "r", encoding="utf-8") as stats_file:
+                self.assertEqual(stats_file.read(), "Brno\t1\ttitle\nCzechia\t3\ttitle,breadcrumb\nEurope\t3\tbreadcrumb\nPrague\t1\ttitle\n")
+            self.assertEqual(sorted(os.listdir(tmp)), ["gazetteer.tsv", "gazetteer.txt"])
+            builder = GazetteerBuilder()
+            builder.add_sorted(read_stats(stats_path))
+            builder.add_entries([("Olomouc", SOURCE_TITLE), ("Europe", SOURCE_BREADCRUMB)])
+            self.assertEqual(builder.finish(path, stats_path), 5)
+            self.assertEqual(list(read_stats(stats_path))[2:4], [("Europe", 4, SOURCE_BREADCRUMB), ("Olomouc", 1, SOURCE_TITLE)])
+
+class TestSchema(unittest.TestCase):
+    """
+    Unit test class for testing the documents built by the `Schema` class.
+
+    Methods:
+    - test_index_only_text: Tests which fields are stored and which get doc values.
+    """
+
+    def test_index_only_text(self):
+        """
+        Tests `Schema.document` with stored and with index-only text.
+
+        Asserts:
+            - Sections and 'other' are stored only with `store_text`, the other fields always.
+            - 'categories' and 'num_cat' get doc values, and the geocrumbs the doc values of the 'geo' facet path.
+            - The field types are frozen.
+        """
+        assert lucene.getVMEnv() or lucene.initVM()
+        data = {"title": "Prague", "link": "https://en.wikivoyage.org/wiki/Prague", "num_cat": 1, "categories": ["Europe", "Czechia"], "paragraphs": {"See": "Castle"}, "other": "Text", "id": "k"}
+        for store_text in (True, False):
+            schema = Schema(store_text=store_text, best_compression=False)
+            doc = schema.document(data)
+            stored = {field.name() for field in doc.getFields() if field.fieldType().stored()}
+            expected = {"title", "link", "num_cat", "categories", "id"}
+            self.assertEqual(stored, expected | {"See", "other"} if store_text else expected)
+            doc_values = [field.name() for field in doc.getFields() if field.fieldType().docValuesType() != index.DocValuesType.NONE]
+            self.assertEqual(doc_values[:3], ["num_cat", "categories", "categories"])
+            self.assertEqual(set(doc_values[3:]), {"$facets"})
+            with self.assertRaises(lucene.JavaError):
+                schema.large_text.setStored(True)
+
+class TestGeoFacets(unittest.TestCase):
+    """
+    Unit test class for testing the 'geo' facet paths of geo_facets.py.
+
+    Methods:
+    - test_paths: Tests the facet path of the geocrumbs and of a drill-down path.
+    - test_facet_fields: Tests which documents get a facet path.
+    """
+
+    def test_paths(self):
+        """
+        Tests `geo_path` and `parse_path`.
+
+        Asserts:
+            - The geocrumbs keep their order and empty ones are skipped.
+            - A drill-down path is split at '/' and an empty path is the root.
+        """
+        self.assertEqual(geo_path(["Europe", " ", "Central Europe ", "Czechia"]), ["Europe", "Central Europe", "Czechia"])
+        self.assertEqual(parse_path("Europe / Czechia/"), ["Europe", "Czechia"])
+        self.assertEqual(parse_path(""), [])
+
+    def test_facet_fields(self):
+        """
+        Tests the facet fields of `Schema.document`.
+
+        Asserts:
+            - Pages without geocrumbs and indexes without doc values get no facet path.
+        """
+        assert lucene.getVMEnv() or lucene.initVM()
+        data = {"title": "Prague", "categories": ["Europe", "Czechia"], "id": "k"}
+        for schema, categories in ((Schema(best_compression=False), []), (Schema(doc_values=False, best_compression=False), ["Europe", "Czechia"])):
+            doc = schema.document({**data, "categories": categories})
+            self.assertNotIn("$facets", [field.name() for field in doc.getFields()])
+
 class TestCreateGazetteer(unittest.TestCase):
     """
     Unit test class for testing the `create_gazetteer` function.
@@ -206,5 +916,634 @@ class TestGetAllData(unittest.TestCase):
         result = get_all_data({})
         self.assertEqual(result, {})
 
+class TestPageStore(unittest.TestCase):
+    """
+    Unit test class for testing the `PageStore` class and `convert_data_dir`.
+
+    Methods:
+    - test_write_and_read: Tests lookups and sequential reading of written pages.
+    - test_rewrite_and_rollover: Tests that a rewritten page replaces the old version across segments.
+    - test_convert_data_dir: Tests conversion of a directory of crawled text files.
+    """
+
+    def setUp(self):
+        """
+        Creates a temporary directory for the store.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "store")
+
+    def tearDown(self):
+        """
+        Removes the temporary directory.
+        """
+        self.tmp_dir.cleanup()
+
+    def test_write_and_read(self):
+        """
+        Tests that written pages can be looked up by URL and read back in order, in the format of the old text files.
+
+        Asserts:
+            - `get` returns the URL on the first line followed by the content.
+            - Iteration yields every page once.
+        """
+        page_store = PageStore(self.path, "a")
+        page_store.write("https://en.wikivoyage.org/wiki/Prague", "<title>Prague</title>")
+        page_store.write("https://en.wikivoyage.org/wiki/Brno", "<title>Brno</title>")
+        page_store.close()
+        page_store = PageStore(self.path)
+        self.assertEqual(page_store.get("https://en.wikivoyage.org/wiki/Prague"), "https://en.wikivoyage.org/wiki/Prague\n<title>Prague</title>")
+        self.assertIsNone(page_store.get("https://en.wikivoyage.org/wiki/Vienna"))
+        self.assertEqual([text for _, text in page_store], ["https://en.wikivoyage.org/wiki/Prague\n<title>Prague</title>", "https://en.wikivoyage.org/wiki/Brno\n<title>Brno</title>"])
+        page_store.close()
+
+    def test_rewrite_and_rollover(self):
+        """
+        Tests that writing a page again supersedes the old record, also when the new record lands in a new segment.
+
+        Asserts:
+            - Only the latest version is returned.
+            - A second segment was created.
+        """
+        page_store = PageStore(self.path, "a", segment_size=10)
+        page_store.write("https://en.wikivoyage.org/wiki/Prague", "old")
+        page_store.write("https://en.wikivoyage.org/wiki/Prague", "new")
+        page_store.close()
+        page_store = PageStore(self.path)
+        self.assertEqual(len(page_store), 1)
+        self.assertEqual([text for _, text in page_store], ["https://en.wikivoyage.org/wiki/Prague\nnew"])
+        self.assertTrue(os.path.isfile(os.path.join(self.path, "segment-00001.warc.gz")))
+        page_store.close()
+
+    def test_convert_data_dir(self):
+        """
+        Tests that `convert_data_dir` stores each text file under its old file name, the MD5 of the URL.
+
+        Asserts:
+            - The converted page can be looked up by the name of its text file.
+        """
+        data_dir = os.path.join(self.tmp_dir.name, "data")
+        os.mkdir(data_dir)
+        with open(os.path.join(data_dir, page_key("https://en.wikivoyage.org/wiki/Prague") + ".txt"), "w", encoding="utf-8") as page_file:
+            page_file.write("https://en.wikivoyage.org/wiki/Prague\n<title>Prague</title>")
+        self.assertEqual(convert_data_dir(data_dir, self.path), 1)
+        page_store = PageStore(self.path)
+        self.assertEqual(page_store.get_by_key(page_key("https://en.wikivoyage.org/wiki/Prague")), "https://en.wikivoyage.org/wiki/Prague\n<title>Prague</title>")
+        page_store.close()
+
+class TestIndexState(unittest.TestCase):
+    """
+    Unit test class for testing how incremental builds find new, changed and removed pages (`diff_state`, `changed_pages`, `load_state` and `save_state`).
+
+    Methods:
+    - setUp: Creates a page store with two pages in a temporary directory.
+    - tearDown: Removes the temporary directory.
+    - test_state_round_trip: Tests that a saved state is read back unchanged.
+    - test_changed_and_removed_pages: Tests which pages an incremental build indexes and deletes.
+    - test_manifest: Tests reading and consuming the changed-pages manifest of a recrawl.
+    """
+
+    def setUp(self):
+        """
+        Creates a page store with two pages in a temporary directory.
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "store")
+        page_store = PageStore(self.path, "a")
+        page_store.write("https://en.wikivoyage.org/wiki/Prague", "<title>Prague</title>")
+        page_store.write("https://en.wikivoyage.org/wiki/Brno", "<title>Brno</title>")
+        page_store.close()
+
+    def tearDown(self):
+        """
+        Removes the temporary directory.
+        """
+        self.tmp_dir.cleanup()
+
+    def test_state_round_trip(self):
+        """
+        Tests that `load_state` reads back what `save_state` wrote and returns an empty state for a missing file.
+
+        Asserts:
+            - The loaded state equals the saved one.
+            - A missing state file gives an empty state.
+        """
+        state_path = os.path.join(self.tmp_dir.name, "state.tsv")
+        self.assertEqual(load_state(state_path), {})
+        state = {page_key("https://en.wikivoyage.org/wiki/Prague"): ("0:0", "a" * 40)}
+        save_state(state, state_path)
+        self.assertEqual(load_state(state_path), state)
+
+    def test_changed_and_removed_pages(self):
+        """
+        Tests that only new pages and pages with changed content are read for indexing, and that pages missing from the store are reported as removed.
+
+        Asserts:
+            - All pages are new for an empty state.
+            - Nothing changes when the store did not change.
+            - A page written again with the same content is skipped, one with new content is returned.
+            - An indexed page that is not in the store is removed.
+        """
+        state = {}
+        page_store = PageStore(self.path)
+        changed, removed = diff_state(page_store, state)
+        self.assertEqual(len([key for key, _ in changed_pages(page_store, changed, state)]), 2)
+        self.assertEqual(diff_state(page_store, state), ([], []))
+        page_store.close()
+        page_store = PageStore(self.path, "a")
+        page_store.write("https://en.wikivoyage.org/wiki/Prague", "<title>Prague</title>")
+        page_store.write("https://en.wikivoyage.org/wiki/Brno", "<title>Brno</title><p>New</p>")
+        state["0" * 32] = ("0:0", "0" * 40)
+        changed, removed = diff_state(page_store, state)
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(removed, ["0" * 32])
+        self.assertEqual([key for key, _ in changed_pages(page_store, changed, state)], [page_key("https://en.wikivoyage.org/wiki/Brno")])
+        page_store.close()
+
+    def test_manifest(self):
+        """
+        Tests `load_manifest` and `consume_manifest`.
+
+        Asserts:
+            - The keys are returned once each, in the order they were first written, without a line that is not complete yet.
+            - Consuming the manifest keeps the incomplete line and the lines appended after it was read.
+        """
+        manifest_path = os.path.join(self.tmp_dir.name, "changed_pages.tsv")
+        with open(manifest_path, "w", encoding="utf-8") as manifest_file:
+            manifest_file.write("b\thttps://en.wikivoyage.org/wiki/Brno\na\thttps://en.wikivoyage.org/wiki/Prague\nb\thttps://en.wikivoyage.org/wiki/Brno\nc\thttps://en.wiki")
+        keys, size = load_manifest(manifest_path)
+        self.assertEqual(keys, ["b", "a"])
+        with open(manifest_path, "a", encoding="utf-8") as manifest_file:
+            manifest_file.write("voyage.org/wiki/Ostrava\nd\thttps://en.wikivoyage.org/wiki/Olomouc\n")
+        consume_manifest(manifest_path, size)
+        self.assertEqual(load_manifest(manifest_path)[0], ["c", "d"])
+
+class TestLinkExtractor(unittest.TestCase):
+    """
+    Unit test class for testing the link canonicalization of link_extractor.py and the quoting of the crawler.
+
+    Methods:
+    - test_canonicalize: Tests the canonical form of links.
+    - test_filter_rules: Tests which links are dropped.
+    - test_quote_url: Tests the URLs the crawler fetches.
+    """
+
+    def test_canonicalize(self):
+        """
+        Tests `LinkExtractor.canonicalize` and `LinkExtractor.extract`.
+
+        Asserts:
+            - The scheme and host are lowercased, default ports and fragments are removed.
+            - The path is decoded except for %2F, %25, %3F and %23, and a bare '%' is encoded.
+            - Query escapes of unreserved characters are decoded and the others uppercased.
+            - Relative links are resolved against the page or its <base>, in document order without repetitions.
+        """
+        extractor = LinkExtractor()
+        self.assertEqual(extractor.canonicalize("HTTPS://En.Wikivoyage.org:443/wiki/Prague#See"), "https://en.wikivoyage.org/wiki/Prague")
+        self.assertEqual(extractor.canonicalize("http://example.org:80"), "http://example.org/")
+        self.assertEqual(extractor.canonicalize("http://example.org:8080/a"), "http://example.org:8080/a")
+        self.assertEqual(extractor.canonicalize("https://en.wikivoyage.org/wiki/Plze%C5%88"), "https://en.wikivoyage.org/wiki/Plzeň")
+        self.assertEqual(extractor.canonicalize("https://en.wikivoyage.org/wiki/AC%2fDC%25_100%%3f"), "https://en.wikivoyage.org/wiki/AC%2FDC%25_100%25%3F")
+        self.assertEqual(extractor.canonicalize("https://example.org/w/index.php?title=Praha&lang=%c3%a9&x=%7e"), "https://example.org/w/index.php?title=Praha&lang=%C3%A9&x=~")
+        page = '<a href="Brno#Get_in">1</a><a href="/wiki/Brno">2</a><base href="https://en.wikivoyage.org/wiki/Czechia/"><a href="Bohemia">3</a>'
+        self.assertEqual(extractor.extract("https://en.wikivoyage.org/wiki/Prague", page), ["https://en.wikivoyage.org/wiki/Brno", "https://en.wikivoyage.org/wiki/Czechia/Bohemia"])
+
+    def test_filter_rules(self):
+        """
+        Tests the links `LinkExtractor.canonicalize` drops.
+
+        Asserts:
+            - Edit forms, old revisions and diffs, excluded file types and hosts, and other schemes give an empty string.
+        """
+        extractor = LinkExtractor()
+        for url in ("https://en.wikivoyage.org/w/index.php?title=Prague&action=edit", "https://en.wikivoyage.org/w/index.php?title=Prague&oldid=42",
+                    "https://en.wikivoyage.org/w/index.php?diff=1", "https://en.wikivoyage.org/wiki/Map.PNG", "https://upload.wikimedia.org/a.html",
+                    "https://commons.upload.wikimedia.org/a", "mailto:info@example.org", "javascript:void(0)"):
+            self.assertEqual(extractor.canonicalize(url), "", url)
+        self.assertNotEqual(extractor.canonicalize("https://en.wikivoyage.org/w/index.php?title=Prague&transaction=1"), "")
+
+    def test_quote_url(self):
+        """
+        Tests `quote_url` on canonical URLs.
+
+        Asserts:
+            - The query keeps its '?', '&', '=' and escapes.
+            - The decoded path is encoded once, the escapes the canonical form keeps are kept, and quoting is idempotent.
+            - A URL without escapes and query quotes as `urllib.parse.quote(url, "<>=/:!")`, so page keys of older crawls stay the same.
+        """
+        url = "https://example.org/w/index.php?title=Praha&lang=%C3%A9"
+        self.assertEqual(quote_url(url), url)
+        self.assertEqual(quote_url("https://en.wikivoyage.org/wiki/Plzeň?q=a b"), "https://en.wikivoyage.org/wiki/Plze%C5%88?q=a%20b")
+        quoted = quote_url("https://en.wikivoyage.org/wiki/AC%2FDC%25 Is%3F")
+        self.assertEqual(quoted, "https://en.wikivoyage.org/wiki/AC%2FDC%25%20Is%3F")
+        self.assertEqual(quote_url(quoted), quoted)
+        url = "https://en.wikivoyage.org/wiki/Česko_(country)"
+        self.assertEqual(quote_url(url), urllib.parse.quote(url, "<>=/:!"))
+
+class TestScalableBloomFilter(unittest.TestCase):
+    """
+    Unit test class for testing the `ScalableBloomFilter` of frontier.py.
+
+    Methods:
+    - test_growth_and_error_rate: Tests the growth of the filter and its false positive rate.
+    """
+
+    def test_growth_and_error_rate(self):
+        """
+        Tests a filter with room for 1000 fingerprints after 10000 were added.
+
+        Asserts:
+            - Full filters are followed by ones of twice the capacity.
+            - Every added fingerprint is found.
+            - The false positive rate on fingerprints that were not added stays below `error_rate`.
+        """
+        rand = random.Random(1)
+        bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+        added = [rand.getrandbits(64) - (1 << 63) for _ in range(10000)]
+        for fp in added:
+            bloom.add(fp)
+        self.assertEqual([level["capacity"] for level in bloom.filters], [1000, 2000, 4000, 8000])
+        self.assertEqual(bloom.count, 10000)
+        self.assertTrue(all(fp in bloom for fp in added))
+        added_set = set(added)
+        probes = [fp for fp in (rand.getrandbits(64) - (1 << 63) for _ in range(50000)) if fp not in added_set]
+        false_positives = sum(1 for fp in probes if fp in bloom)
+        self.assertLess(false_positives / len(probes), 0.01)
+
+class TestFrontier(unittest.TestCase):
+    """
+    Unit test class for testing the SQLite crawl frontier of frontier.py.
+
+    Methods:
+    - test_queue_order: Tests that the queues are first in, first out.
+    - test_resume_after_reopen: Tests that queues, visited URLs and the seen-set survive closing and reopening the database.
+    """
+
+    def test_queue_order(self):
+        """
+        Tests `Frontier.add` and `Frontier.pop` within one session.
+
+        Asserts:
+            - Every queue returns its URLs in the order they were added, independently of the other queue.
+            - A URL added twice is queued once.
+            - An empty queue returns an empty string.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            frontier = Frontier(os.path.join(tmp, "frontier.db"))
+            self.assertTrue(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Prague"))
+            self.assertTrue(frontier.add("other", "https://example.org/"))
+            self.assertTrue(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Brno"))
+            self.assertFalse(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Prague"))
+            self.assertEqual(frontier.pop("wikivoyage"), "https://en.wikivoyage.org/wiki/Prague")
+            self.assertEqual(frontier.pop("wikivoyage"), "https://en.wikivoyage.org/wiki/Brno")
+            self.assertEqual(frontier.pop("wikivoyage"), "")
+            self.assertEqual(frontier.pop("other"), "https://example.org/")
+            self.assertEqual(frontier.stats()["visited"], 3)
+            frontier.close()
+
+    def test_resume_after_reopen(self):
+        """
+        Tests that a frontier reopened after `close`, or after only a `checkpoint` as after a crash, continues where it stopped.
+
+        Asserts:
+            - The remaining URLs are popped in their order and the counters are restored.
+            - URLs queued or visited before the restart are rejected as duplicates, also when the Bloom filter is rebuilt from the seen-set.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frontier.db")
+            frontier = Frontier(path)
+            for name in ("Prague", "Brno", "Ostrava"):
+                frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/" + name)
+            self.assertEqual(frontier.pop("wikivoyage"), "https://en.wikivoyage.org/wiki/Prague")
+            frontier.close()
+
+            frontier = Frontier(path)
+            self.assertFalse(frontier.is_empty())
+            self.assertEqual(frontier.stats()["wikivoyage"], 2)
+            self.assertEqual(frontier.stats()["visited"], 1)
+            self.assertFalse(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Prague"))
+            self.assertFalse(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Ostrava"))
+            self.assertTrue(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Olomouc"))
+            self.assertEqual(frontier.pop("wikivoyage"), "https://en.wikivoyage.org/wiki/Brno")
+            frontier.checkpoint()
+            frontier.db.close()
+
+            # The saved Bloom filter is stale now, so it is rebuilt from the seen-set
+            frontier = Frontier(path)
+            self.assertFalse(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Brno"))
+            self.assertFalse(frontier.add("wikivoyage", "https://en.wikivoyage.org/wiki/Olomouc"))
+            self.assertEqual(frontier.pop("wikivoyage"), "https://en.wikivoyage.org/wiki/Ostrava")
+            self.assertEqual(frontier.pop("wikivoyage"), "https://en.wikivoyage.org/wiki/Olomouc")
+            self.assertEqual(frontier.pop("wikivoyage"), "")
+            self.assertEqual(frontier.stats()["seen"], 4)
+            frontier.close()
+
+class RecordingWriter():
+    """
+    Stands in for the IndexWriter in the pipeline tests and records the ids of the added documents and the replacing documents.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.docs = []
+        self.commits = 0
+        self.rolled_back = False
+        self.lock = threading.Lock()
+
+    def addDocument(self, doc):
+        with self.lock:
+            self.ids.extend(field.stringValue() for field in doc.getFields() if field.name() == "id")
+
+    def updateDocument(self, term, doc):
+        with self.lock:
+            self.docs.append(doc)
+
+    def deleteDocuments(self, term):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rolled_back = True
+
+class TestIndexPipeline(unittest.TestCase):
+    """
+    Unit test class for testing the parse -> queue -> writer pipeline of `build_index.build_index`.
+
+    Methods:
+    - setUp: Creates a page store in a temporary directory and makes it the working directory.
+    - tearDown: Restores the working directory and the global writer and schema of build_index.
+    - test_parallel_build: Tests a build with parsing processes and several indexing threads.
+    - test_indexing_error: Tests that an error of an indexing thread stops the build.
+    - test_update_keeps_infobox: Tests that a replaced document keeps its infobox fields.
+    - test_incremental_gazetteer: Tests that incremental builds give the gazetteer of a full build.
+    """
+
+    def setUp(self):
+        """
+        Creates a page store with 300 pages in a temporary directory, which becomes the working directory, as the build writes the gazetteer there.
+        """
+        assert lucene.getVMEnv() or lucene.initVM()
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # The parsing processes load the headings when they import build_index
+        shutil.copy("res_mod.txt", self.tmp_dir.name)
+        os.chdir(self.tmp_dir.name)
+        page_store = PageStore("store", "a")
+        self.keys = [page_store.write(f"https://en.wikivoyage.org/wiki/Page_{i}", f"<html><title>Page {i}</title><body><p>Text {i}</p></body></html>") for i in range(300)]
+        page_store.close()
+        self.writer = RecordingWriter()
+        self.globals = (build_index.iwriter, build_index.schema, build_index.doc_counter)
+        build_index.iwriter = self.writer
+        build_index.schema = Schema(best_compression=False)
+
+    def tearDown(self):
+        """
+        Restores the working directory and the globals of build_index and removes the temporary directory.
+        """
+        build_index.iwriter, build_index.schema, build_index.doc_counter = self.globals
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_parallel_build(self):
+        """
+        Tests `build_index` with two parsing processes and two indexing threads.
+
+        Asserts:
+            - Every page is added once and the index is committed once.
+            - The list of indexed pages holds every page.
+        """
+        build_index.build_index("store", workers=2, index_threads=2, chunk_size=8, state_path="state.tsv")
+        self.assertEqual(sorted(self.writer.ids), sorted(self.keys))
+        self.assertEqual(self.writer.commits, 1)
+        self.assertEqual(sorted(load_state("state.tsv")), sorted(self.keys))
+
+    def test_indexing_error(self):
+        """
+        Tests `build_index` when adding documents fails, with more pages than the queue holds.
+
+        Asserts:
+            - The build does not hang and raises the error of the indexing thread.
+            - The writer is rolled back, nothing is committed and no list of indexed pages or gazetteer state is written.
+        """
+        with patch("build_index.insert_data", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                build_index.build_index("store", workers=1, index_threads=2, state_path="state.tsv")
+        self.assertTrue(self.writer.rolled_back)
+        self.assertEqual(self.writer.commits, 0)
+        self.assertFalse(os.path.isfile("state.tsv"))
+        self.assertEqual([file for file in os.listdir(".") if file.startswith("gazetteer")], [])
+
+    def test_update_keeps_infobox(self):
+        """
+        Tests `insert_data` with `update` and `infobox_fields`.
+
+        Asserts:
+            - The infobox fields of the stored document are added to the document replacing it.
+            - The fields built from the page and its sections are not taken as infobox fields.
+        """
+        data = {"title": "Prague", "link": "https://en.wikivoyage.org/wiki/Prague", "num_cat": 1, "categories": ["Europe"], "paragraphs": {"See": "Castle"}, "other": "Text", "id": "k"}
+        with patch("build_index.stored_infobox", return_value={"population": "1.3 million"}):
+            build_index.insert_data(dict(data), update=True)
+        new_doc = self.writer.docs[0]
+        self.assertIn(("population", "1.3 million"), [(field.name(), field.stringValue()) for field in new_doc.getFields()])
+        self.assertEqual(build_index.infobox_fields(new_doc, ["See", "Do"]), {"population": "1.3 million"})
+
+    def test_incremental_gazetteer(self):
+        """
+        Tests the gazetteer of incremental builds after a page is removed from the state, after nothing changed and after a page was renamed.
+
+        Asserts:
+            - Building again without changes does not add the names again.
+            - The names of a removed page and the old name of a renamed page are dropped.
+            - The gazetteer equals the one of a full build of the same pages.
+        """
+        build_index.build_index("store", state_path="state.tsv")
+        full = list(read_stats("gazetteer.tsv"))
+        # A page indexed by an earlier build that is no longer in the store
+        with open("state.tsv", "a", encoding="utf-8") as state_file:
+            state_file.write("0" * 32 + "\t0:0\t" + "0" * 40 + "\n")
+        with open("gazetteer_state.jsonl", "a", encoding="utf-8") as state_file:
+            state_file.write(json.dumps({"key": "0" * 32, "entries": [["Gone", SOURCE_TITLE]]}) + "\n")
+        with patch("build_index.stored_infobox", return_value={}):
+            build_index.build_index("store", incremental=True, state_path="state.tsv")
+            self.assertEqual(list(read_stats("gazetteer.tsv")), full)
+            page_store = PageStore("store", "a")
+            page_store.write("https://en.wikivoyage.org/wiki/Page_0", "<html><title>Renamed</title><body><p>Text</p></body></html>")
+            page_store.close()
+            build_index.build_index("store", incremental=True, state_path="state.tsv")
+        incremental = list(read_stats("gazetteer.tsv"))
+        self.assertNotIn("Page 0", [name for name, _, _ in incremental])
+        build_index.build_index("store", state_path="full.tsv", gazetteer_state_path="full.jsonl")
+        self.assertEqual(incremental, list(read_stats("gazetteer.tsv")))
+
+class TestRecrawl(unittest.TestCase):
+    """
+    Unit test class for testing the conditional recrawl mode of the crawler against a local stand-in server.
+
+    Methods:
+    - test_conditional_requests_and_manifest: Tests that a recrawl only stores and lists the pages that changed.
+    """
+
+    def test_conditional_requests_and_manifest(self):
+        """
+        Crawls three pages, changes one of them on the server and recrawls them with `Crawler.start_recrawl`.
+
+        Asserts:
+            - The recrawl sends the recorded ETags and the server answers 304 for the unchanged pages.
+            - Stored URLs are requested as they were stored, so a page whose name holds %2F is fetched under its own path.
+            - Only the changed page is written again and listed in the manifest.
+        """
+        pages = {"Prague": "old", "Brno": "old", "AC%2FDC": "old"}
+        requests = []
+        class StandIn(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def do_GET(self):
+                name = self.path.rsplit("/", 1)[-1]
+                requests.append((self.path, self.headers.get("If-None-Match")))
+                if name not in pages:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                links = "".join(f'<a href="{other}">{other}</a>' for other in pages)
+                body = f"<html><title>{name} {pages[name]}</title><body>{links}</body></html>".encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # The recrawl only refreshes Wikivoyage pages, so they are served under a path naming the host
+        base = f"http://127.0.0.1:{server.server_address[1]}/en.wikivoyage.org/wiki/"
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                frontier = Frontier()
+                frontier.add("wikivoyage", base + "Prague")
+                frontier.close()
+                crawler = crawler_Zuzula.Crawler()
+                crawler.delay_range = (0, 0)
+                crawler.run_crawler()
+                self.assertEqual(len(crawler.page_store), 3)
+                crawler.frontier.close()
+                crawler.page_store.close()
+
+                pages["Brno"] = "new"
+                del requests[:]
+                crawler = crawler_Zuzula.Crawler()
+                crawler.delay_range = (0, 0)
+                crawler.start_recrawl()
+                crawler.run_crawler()
+                crawler.finish_recrawl()
+                brno_url = base + "Brno"
+                self.assertIn("Brno new", crawler.page_store.get(brno_url))
+                self.assertEqual(sorted(path.rsplit("/", 1)[-1] for path, _ in requests), ["AC%2FDC", "Brno", "Prague"])
+                self.assertTrue(all(etag is not None for _, etag in requests))
+                with open("history/changed_pages.tsv", "r", encoding="utf-8") as manifest_file:
+                    self.assertEqual(manifest_file.read(), f"{page_key(brno_url)}\t{brno_url}\n")
+                self.assertIsNone(crawler.frontier.get_setting("recrawl"))
+                crawler.frontier.close()
+                crawler.page_store.close()
+            finally:
+                os.chdir(cwd)
+                server.shutdown()
+                server.server_close()
+
+class TestAsyncCrawler(unittest.TestCase):
+    """
+    Unit test class for testing the asynchronous mode of the crawler against local stand-in servers.
+
+    Methods:
+    - test_per_host_limit_and_resume: Tests the per-host limit and that a stopped crawl resumes without losing URLs.
+    """
+
+    def test_per_host_limit_and_resume(self):
+        """
+        Tests `Crawler.run_async_crawler` on two local hosts serving pages that link to each other. The crawl is stopped after a few pages and resumed.
+
+        Asserts:
+            - No host ever sees more than `per_host_limit` parallel requests.
+            - URLs parked in the per-host backlog or in flight when the crawl stops are queued again, so the resumed crawl stores every page.
+        """
+        num_pages = 6
+        lock = threading.Lock()
+        parallel = {}
+        max_parallel = {}
+        class StandIn(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def do_GET(self):
+                port = self.server.server_address[1]
+                with lock:
+                    parallel[port] = parallel.get(port, 0) + 1
+                    max_parallel[port] = max(max_parallel.get(port, 0), parallel[port])
+                time.sleep(0.02)
+                links = "".join(f'<a href="/page/{i}">{i}</a>' for i in range(num_pages))
+                links += "".join(f'<a href="{base}/page/{i}">{i}</a>' for base in bases for i in range(num_pages))
+                body = f"<html><title>{self.path}</title><body>{links}</body></html>".encode("utf-8")
+                with lock:
+                    parallel[port] -= 1
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+        servers = [ThreadingHTTPServer(("127.0.0.1", 0), StandIn) for _ in range(2)]
+        bases = [f"http://127.0.0.1:{server.server_address[1]}" for server in servers]
+        for server in servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                frontier = Frontier()
+                for base in bases:
+                    frontier.add("other", base + "/page/0")
+                frontier.close()
+
+                crawler = crawler_Zuzula.Crawler()
+                crawler.delay_range = (0, 0)
+                process_page = crawler.process_page
+                def stop_after_three(web_url, headers, content):
+                    process_page(web_url, headers, content)
+                    if len(crawler.page_store) == 3:
+                        crawler_Zuzula.exit_program = True
+                crawler.process_page = stop_after_three
+                try:
+                    crawler.run_async_crawler(concurrency=4, per_host_limit=1)
+                finally:
+                    crawler_Zuzula.exit_program = False
+                self.assertEqual(len(crawler.page_store), 3)
+                self.assertEqual(crawler.frontier.stats()["visited"], 3)
+                crawler.frontier.close()
+                crawler.page_store.close()
+
+                crawler = crawler_Zuzula.Crawler()
+                crawler.delay_range = (0, 0)
+                crawler.run_async_crawler(concurrency=4, per_host_limit=1)
+                self.assertEqual(sorted(crawler.page_store.urls.values()), sorted(f"{base}/page/{i}" for base in bases for i in range(num_pages)))
+                self.assertEqual(crawler.frontier.stats()["other"], 0)
+                crawler.frontier.close()
+                crawler.page_store.close()
+            finally:
+                os.chdir(cwd)
+                for server in servers:
+                    server.shutdown()
+                    server.server_close()
+        self.assertEqual(max(max_parallel.values()), 1)
+
+
 if __name__ == '__main__':
     unittest.main()